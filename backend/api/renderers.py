@@ -0,0 +1,29 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+from stimuli.exports import CSV_CONTENT_TYPE, EXPORT_FORMAT_CSV, EXPORT_FORMAT_NDJSON, NDJSON_CONTENT_TYPE
+
+
+class _StreamingExportRenderer(BaseRenderer):
+    """
+    Рендерер для потоковых выгрузок. Сами данные отдаются StreamingHttpResponse в обход
+    рендерера, он нужен для согласования формата (?format=...) и для ответов об ошибках.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data, ensure_ascii=False, cls=DjangoJSONEncoder).encode(self.charset)
+
+
+class CSVRenderer(_StreamingExportRenderer):
+    media_type = CSV_CONTENT_TYPE.split(';')[0]
+    format = EXPORT_FORMAT_CSV
+
+
+class NDJSONRenderer(_StreamingExportRenderer):
+    media_type = NDJSON_CONTENT_TYPE.split(';')[0]
+    format = EXPORT_FORMAT_NDJSON
@@ -0,0 +1,73 @@
+import json
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from one_time_payments.models import RequestCampaign
+from staffing.models import Division, Position
+from stimuli.models import Employee, StimulusRequest
+
+
+class RequestExportApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('admin', is_staff=True, is_superuser=True)
+        division = Division.objects.create(name='Кафедра')
+        position = Position.objects.create(name='Доцент', base_salary=Decimal('50000'))
+        employee = Employee.objects.create(
+            full_name='Иванов', division=division, position=position, category=Employee.Category.PPS,
+        )
+        campaign = RequestCampaign.objects.create(
+            name='Январь', status=RequestCampaign.Status.OPEN, opens_at=date(2026, 1, 1),
+        )
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.requests = [
+                StimulusRequest.objects.create(
+                    campaign=campaign,
+                    employee=employee,
+                    requested_by=cls.user,
+                    amount=Decimal(amount),
+                    justification='Обоснование',
+                    status=status,
+                )
+                for amount, status in ((100, StimulusRequest.Status.APPROVED), (70, StimulusRequest.Status.REJECTED))
+            ]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def export(self, **params):
+        response = self.client.get(reverse('api:request-export'), params)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, content.decode('utf-8')
+
+    def test_csv(self):
+        response, content = self.export()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        self.assertIn('.csv', response['Content-Disposition'])
+        lines = content.splitlines()
+        self.assertEqual(lines[0].split(',')[:4], ['ID', 'Создано', 'Обновлено', 'Сотрудник'])
+        self.assertEqual([line.split(',')[0] for line in lines[1:]], [str(obj.pk) for obj in self.requests])
+
+    def test_ndjson_with_outcome(self):
+        response, content = self.export(format='ndjson', outcome=StimulusRequest.Outcome.APPROVED)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['id'], self.requests[0].pk)
+        self.assertEqual(rows[0]['employee'], 'Иванов')
+        self.assertEqual(Decimal(rows[0]['amount']), Decimal('100'))
+
+    def test_unknown_outcome_is_rejected(self):
+        response, content = self.export(outcome='maybe')
+
+        self.assertEqual(response.status_code, 400)
+        # Ошибки рендерер выгрузки отдаёт в JSON
+        self.assertEqual(json.loads(content), {'outcome': ['maybe']})
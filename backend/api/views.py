@@ -1,12 +1,17 @@
-from django.db.models import Q
+from django.utils import timezone
 from rest_framework import permissions, viewsets, status
 from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
 from one_time_payments.models import RequestCampaign
+from stimuli.exports import REQUEST_EXPORT_COLUMNS, request_export_rows, stream_response
+from stimuli.filters import StimulusRequestFilter
 from stimuli.models import Employee, StimulusRequest
+from stimuli.search import search_employees
 
 from .permissions import IsRequestOwnerOrAdmin
+from .renderers import CSVRenderer, NDJSONRenderer
 from .serializers import (
     EmployeeSerializer,
     RequestCampaignSerializer,
@@ -20,17 +25,18 @@ class EmployeeViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        queryset = Employee.objects.select_related('division', 'position')
+        queryset = Employee.objects.select_related('division', 'position').with_compensation()
         search = self.request.query_params.get('search')
         category = self.request.query_params.get('category')
         division = self.request.query_params.get('division')
 
-        if search:
-            queryset = queryset.filter(Q(full_name__icontains=search) | Q(justification__icontains=search))
         if category:
             queryset = queryset.filter(category=category)
         if division:
             queryset = queryset.filter(division_id=division)
+        if search:
+            # Поисковый запрос сортирует по релевантности
+            return search_employees(queryset, search)
 
         return queryset.order_by('full_name')
 
@@ -63,6 +69,44 @@ class StimulusRequestViewSet(viewsets.ModelViewSet):
             data.pop('admin_comment', None)
         serializer.save()
 
+    @action(detail=False, methods=['get'], renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export(self, request):
+        """
+        Потоковая выгрузка заявок в CSV (по умолчанию) или NDJSON (?format=ndjson).
+        Фильтры те же, что в списке заявок (status, campaign, requested_by), плюс
+        outcome=approved|rejected с учётом архивных заявок.
+        """
+        params = request.query_params.copy()
+        # Статус фильтруется вручную, как и в списке заявок: MultipleChoiceFilter
+        # с lookup_expr='in' применяет условие к каждому значению по отдельности
+        statuses = params.pop('status', [])
+        invalid_statuses = [value for value in statuses if value not in StimulusRequest.Status.values]
+        if invalid_statuses:
+            raise ValidationError({'status': invalid_statuses})
+
+        filterset = StimulusRequestFilter(params, queryset=self.get_queryset(), request=request)
+        if not filterset.is_valid():
+            raise ValidationError(filterset.errors)
+        queryset = filterset.qs
+        if statuses:
+            queryset = queryset.filter(status__in=statuses)
+
+        outcome = request.query_params.get('outcome')
+        if outcome and outcome not in StimulusRequest.Outcome.values:
+            raise ValidationError({'outcome': [outcome]})
+        if outcome == StimulusRequest.Outcome.APPROVED:
+            queryset = queryset.approved()
+        elif outcome == StimulusRequest.Outcome.REJECTED:
+            queryset = queryset.rejected()
+
+        filename = f"stimulus_requests_{timezone.now().strftime('%Y%m%d_%H%M%S')}"
+        return stream_response(
+            request.accepted_renderer.format,
+            REQUEST_EXPORT_COLUMNS,
+            request_export_rows(queryset.order_by('pk')),
+            filename,
+        )
+
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def statuses(self, request_obj):
         statuses = [{'value': value, 'label': label} for value, label in StimulusRequest.Status.choices]
@@ -0,0 +1,290 @@
+"""
+Помесячные суммы выплат (MonthlyPaymentFact): месяц × подразделение × сотрудник × вид выплаты.
+
+Виды и источники:
+- постоянные выплаты — RecurringPayment, месяц начала периода;
+- разовые выплаты — OneTimePayment, месяц даты выплаты;
+- заявки — одобренные StimulusRequest, месяц создания (в часовом поясе проекта).
+
+Одиночные сохранения и удаления меняют строку факта на разницу сумм (apply_fact_delta,
+сигналы в dashboard.signals). Массовые изменения без сигналов (одобрение и архивирование
+заявок кампании, импорт сотрудников) пересчитывают факты затронутых сотрудников
+refresh_payment_facts или переносят их в новое подразделение sync_fact_divisions — по сигналам
+stimuli.hooks, которые stimuli отправляет после таких изменений.
+Полный пересчёт — команда rebuild_payment_facts.
+
+payment_totals собирает суммы за период фильтров дэшборда: полные месяцы берутся из фактов,
+неполные крайние месяцы диапазона дочитываются из исходных таблиц по точным датам.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.apps import apps as global_apps
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from stimuli.models import StimulusRequest
+
+from .models import MonthlyPaymentFact
+
+Kind = MonthlyPaymentFact.Kind
+
+# Размер пакета для фильтров employee_id__in и bulk_create
+FACT_BATCH_SIZE = 500
+
+# Вид -> (модель, путь к дате выплаты, условие попадания в факты)
+FACT_SOURCES = {
+    Kind.RECURRING: ('recurring_payments.RecurringPayment', 'period__start_date', {}),
+    Kind.ONE_TIME: ('one_time_payments.OneTimePayment', 'payment_date', {}),
+    Kind.REQUESTS: ('stimuli.StimulusRequest', 'created_at', {'status': StimulusRequest.Status.APPROVED}),
+}
+
+
+def month_of(value) -> Optional[date]:
+    """Первое число месяца для даты или даты-времени (в текущем часовом поясе)."""
+    if value is None:
+        return None
+    if hasattr(value, 'date'):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        value = value.date()
+    return value.replace(day=1)
+
+
+def _next_month(value: date) -> date:
+    return (value.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _source_queryset(kind):
+    model_label, _, conditions = FACT_SOURCES[kind]
+    return global_apps.get_model(model_label)._default_manager.filter(**conditions)
+
+
+def _date_lookup(kind) -> str:
+    _, date_path, _ = FACT_SOURCES[kind]
+    # Дата-время сравнивается по дате в часовом поясе проекта, как и месяц факта
+    return f'{date_path}__date' if date_path == 'created_at' else date_path
+
+
+def _chunks(values, size=FACT_BATCH_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+# --- Поддержка фактов ---------------------------------------------------------------------
+
+def fact_contribution(kind, instance) -> Optional[Tuple[date, int, Decimal]]:
+    """(месяц, сотрудник, сумма), которые объект вносит в факты, или None."""
+    _, date_path, conditions = FACT_SOURCES[kind]
+    if any(getattr(instance, field) != value for field, value in conditions.items()):
+        return None
+    value = instance
+    for part in date_path.split('__'):
+        value = getattr(value, part, None)
+        if value is None:
+            return None
+    return month_of(value), instance.employee_id, instance.amount or Decimal('0')
+
+
+def stored_fact_contribution(kind, pk) -> Optional[Tuple[date, int, Decimal]]:
+    """То же для сохранённой в БД версии объекта (до изменения)."""
+    _, date_path, conditions = FACT_SOURCES[kind]
+    model_label = FACT_SOURCES[kind][0]
+    row = (
+        global_apps.get_model(model_label)._default_manager.filter(pk=pk)
+        .values('employee_id', 'amount', date_path, *conditions)
+        .first()
+    )
+    if row is None or any(row[field] != value for field, value in conditions.items()) or row[date_path] is None:
+        return None
+    return month_of(row[date_path]), row['employee_id'], row['amount'] or Decimal('0')
+
+
+def apply_fact_delta(kind, month: date, employee_id: int, delta: Decimal) -> None:
+    """Прибавляет delta к факту (month, employee_id, kind); строка создаётся при первой выплате."""
+    if not delta:
+        return
+    Employee = global_apps.get_model('stimuli', 'Employee')
+    division_id = Employee.objects.filter(pk=employee_id).values_list('division_id', flat=True).first()
+    if division_id is None:
+        # Сотрудник удаляется вместе с выплатами, его факты удалит каскад
+        return
+
+    facts = MonthlyPaymentFact.objects.filter(month=month, employee_id=employee_id, kind=kind)
+    if facts.update(amount=F('amount') + delta) or delta < 0:
+        return
+    try:
+        with transaction.atomic():
+            MonthlyPaymentFact.objects.create(
+                month=month, employee_id=employee_id, division_id=division_id, kind=kind, amount=delta,
+            )
+    except IntegrityError:
+        # Строку успел создать параллельный запрос
+        facts.update(amount=F('amount') + delta)
+
+
+def apply_fact_change(kind, before, after) -> None:
+    """Переносит вклад объекта из состояния before в after (оба — результат fact_contribution)."""
+    if before == after:
+        return
+    if before and after and before[:2] == after[:2]:
+        apply_fact_delta(kind, after[0], after[1], after[2] - before[2])
+        return
+    if before:
+        apply_fact_delta(kind, before[0], before[1], -before[2])
+    if after:
+        apply_fact_delta(kind, after[0], after[1], after[2])
+
+
+def refresh_payment_facts(employee_ids: Optional[Iterable[int]] = None, kinds=None) -> int:
+    """
+    Пересчитывает факты из исходных таблиц для указанных сотрудников (None — для всех)
+    и видов выплат (None — для всех). Возвращает число созданных строк.
+    """
+    kinds = list(kinds or FACT_SOURCES)
+    if employee_ids is None:
+        batches = [None]
+    else:
+        batches = list(_chunks(sorted(set(employee_ids))))
+
+    created = 0
+    with transaction.atomic():
+        for batch in batches:
+            facts = MonthlyPaymentFact.objects.filter(kind__in=kinds)
+            if batch is not None:
+                facts = facts.filter(employee_id__in=batch)
+            facts.delete()
+
+            for kind in kinds:
+                _, date_path, _ = FACT_SOURCES[kind]
+                qs = _source_queryset(kind)
+                if batch is not None:
+                    qs = qs.filter(employee_id__in=batch)
+                rows = (
+                    qs.exclude(**{f'{date_path}__isnull': True})
+                    .annotate(month=TruncMonth(date_path))
+                    .order_by()
+                    .values('month', 'employee_id', 'employee__division_id')
+                    .annotate(total=Sum('amount'))
+                )
+                pending = []
+                for row in rows.iterator(chunk_size=FACT_BATCH_SIZE):
+                    pending.append(MonthlyPaymentFact(
+                        month=month_of(row['month']),
+                        employee_id=row['employee_id'],
+                        division_id=row['employee__division_id'],
+                        kind=kind,
+                        amount=row['total'] or Decimal('0'),
+                    ))
+                    if len(pending) >= FACT_BATCH_SIZE:
+                        MonthlyPaymentFact.objects.bulk_create(pending)
+                        created += len(pending)
+                        pending = []
+                if pending:
+                    MonthlyPaymentFact.objects.bulk_create(pending)
+                    created += len(pending)
+    return created
+
+
+def sync_fact_divisions(employee_ids: Optional[Iterable[int]] = None) -> int:
+    """Переносит факты сотрудников в их текущее подразделение (после смены подразделения)."""
+    Employee = global_apps.get_model('stimuli', 'Employee')
+    if employee_ids is None:
+        pairs = Employee.objects.values_list('pk', 'division_id')
+    else:
+        pairs = Employee.objects.filter(pk__in=list(employee_ids)).values_list('pk', 'division_id')
+    by_division = defaultdict(list)
+    for employee_id, division_id in pairs:
+        by_division[division_id].append(employee_id)
+
+    moved = 0
+    for division_id, ids in by_division.items():
+        for batch in _chunks(ids):
+            moved += (
+                MonthlyPaymentFact.objects.filter(employee_id__in=batch)
+                .exclude(division_id=division_id)
+                .update(division_id=division_id)
+            )
+    return moved
+
+
+# --- Чтение ---------------------------------------------------------------------------------
+
+# Группировка -> (поле факта, путь в исходной таблице)
+GROUPINGS = {
+    'month': ('month', None),
+    'division': ('division_id', 'employee__division_id'),
+    'employee': ('employee_id', 'employee_id'),
+}
+
+
+def _split_period(start: Optional[date], end: Optional[date]):
+    """
+    Делит период на полные месяцы [full_from, full_to) и неполные крайние отрезки.
+    None на месте full_from / full_to означает отсутствие границы.
+    """
+    edges = []
+    full_from = None
+    full_to = None
+    if start is not None:
+        full_from = month_of(start)
+        if start.day != 1:
+            full_from = _next_month(full_from)
+            edges.append((start, min(full_from - timedelta(days=1), end) if end else full_from - timedelta(days=1)))
+    if end is not None:
+        full_to = _next_month(month_of(end))
+        if _next_month(end.replace(day=1)) - timedelta(days=1) != end:
+            full_to = month_of(end)
+            tail_start = max(full_to, start) if start else full_to
+            if not edges or edges[0][1] < tail_start:
+                edges.append((tail_start, end))
+    return full_from, full_to, edges
+
+
+def payment_totals(filters, by: str) -> Dict[Tuple[object, str], Decimal]:
+    """
+    Суммы выплат по видам за период фильтров дэшборда: {(группа, вид): сумма}.
+    by — 'month', 'division' или 'employee'.
+    """
+    fact_field, source_field = GROUPINGS[by]
+    totals = defaultdict(Decimal)
+    full_from, full_to, edges = _split_period(filters.start_date, filters.end_date)
+
+    facts = MonthlyPaymentFact.objects.all()
+    if filters.division_id:
+        facts = facts.filter(division_id=filters.division_id)
+    if filters.employee_id:
+        facts = facts.filter(employee_id=filters.employee_id)
+    if full_from is not None:
+        facts = facts.filter(month__gte=full_from)
+    if full_to is not None:
+        facts = facts.filter(month__lt=full_to)
+    if full_from is None or full_to is None or full_from < full_to:
+        for row in facts.order_by().values(fact_field, 'kind').annotate(total=Sum('amount')):
+            totals[(row[fact_field], row['kind'])] += row['total'] or Decimal('0')
+
+    for edge_start, edge_end in edges:
+        for kind in FACT_SOURCES:
+            _, date_path, _ = FACT_SOURCES[kind]
+            lookup = _date_lookup(kind)
+            qs = _source_queryset(kind).filter(**{f'{lookup}__gte': edge_start, f'{lookup}__lte': edge_end})
+            if filters.division_id:
+                qs = qs.filter(employee__division_id=filters.division_id)
+            if filters.employee_id:
+                qs = qs.filter(employee_id=filters.employee_id)
+            if by == 'month':
+                # Отрезок лежит внутри одного месяца
+                total = qs.aggregate(total=Sum('amount'))['total']
+                if total is not None:
+                    totals[(month_of(edge_start), kind)] += total
+                continue
+            for row in qs.order_by().values(source_field).annotate(total=Sum('amount')):
+                totals[(row[source_field], kind)] += row['total'] or Decimal('0')
+    return dict(totals)
@@ -0,0 +1,35 @@
+"""
+Полный пересчёт помесячных сумм выплат (MonthlyPaymentFact) из исходных таблиц.
+Нужен после изменений данных в обход ORM (SQL, восстановление из копии) или для проверки.
+"""
+from django.core.management.base import BaseCommand
+
+from dashboard.facts import FACT_SOURCES, refresh_payment_facts
+from dashboard.models import MonthlyPaymentFact
+from dashboard.versioning import bump_data_version
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает помесячные суммы выплат для дэшборда'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--kind',
+            action='append',
+            choices=[str(kind) for kind in FACT_SOURCES],
+            help='Пересчитать только указанный вид выплат (можно указать несколько раз)',
+        )
+        parser.add_argument(
+            '--employee',
+            action='append',
+            type=int,
+            help='Пересчитать только указанного сотрудника по ID (можно указать несколько раз)',
+        )
+
+    def handle(self, *args, **options):
+        kinds = options['kind']
+        created = refresh_payment_facts(options['employee'], kinds=kinds)
+        bump_data_version()
+
+        labels = ', '.join(str(MonthlyPaymentFact.Kind(kind).label) for kind in kinds or FACT_SOURCES)
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано строк: {created} ({labels})'))
@@ -0,0 +1,82 @@
+# Generated manually
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+
+
+# Источники фактов на момент миграции: вид -> (модель, поле даты выплаты, условие)
+FACT_SOURCES = [
+    ('recurring', 'recurring_payments', 'RecurringPayment', 'period__start_date', {}),
+    ('one_time', 'one_time_payments', 'OneTimePayment', 'payment_date', {}),
+    ('requests', 'stimuli', 'StimulusRequest', 'created_at', {'status': 'approved'}),
+]
+
+
+def build_payment_facts(apps, schema_editor):
+    MonthlyPaymentFact = apps.get_model('dashboard', 'MonthlyPaymentFact')
+    for kind, app_label, model_name, date_field, conditions in FACT_SOURCES:
+        rows = (
+            apps.get_model(app_label, model_name).objects.filter(**conditions)
+            .exclude(**{f'{date_field}__isnull': True})
+            .annotate(month=TruncMonth(date_field))
+            .order_by()
+            .values('month', 'employee_id', 'employee__division_id')
+            .annotate(total=Sum('amount'))
+        )
+        batch = []
+        for row in rows.iterator(chunk_size=500):
+            month = row['month']
+            if hasattr(month, 'date'):
+                month = month.date()
+            batch.append(MonthlyPaymentFact(
+                month=month.replace(day=1),
+                employee_id=row['employee_id'],
+                division_id=row['employee__division_id'],
+                kind=kind,
+                amount=row['total'] or Decimal('0'),
+            ))
+            if len(batch) >= 500:
+                MonthlyPaymentFact.objects.bulk_create(batch)
+                batch = []
+        MonthlyPaymentFact.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_dataversion'),
+        ('staffing', '0003_division_position_updated_at'),
+        ('stimuli', '0016_employee_search_index'),
+        ('recurring_payments', '0002_remove_recurringpayment_unique_employee_payment_per_period_and_more'),
+        ('one_time_payments', '0002_alter_requestcampaign_auto_close_day_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyPaymentFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='Месяц')),
+                ('kind', models.CharField(choices=[('recurring', 'Постоянные выплаты'), ('one_time', 'Разовые выплаты'), ('requests', 'Заявки')], max_length=16, verbose_name='Вид выплаты')),
+                ('amount', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=16, verbose_name='Сумма')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+                ('division', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payment_facts', to='staffing.division', verbose_name='Подразделение')),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payment_facts', to='stimuli.employee', verbose_name='Сотрудник')),
+            ],
+            options={
+                'verbose_name': 'Помесячная сумма выплат',
+                'verbose_name_plural': 'Помесячные суммы выплат',
+                'constraints': [models.UniqueConstraint(fields=('month', 'employee', 'kind'), name='payment_fact_unique_month_employee_kind')],
+                'indexes': [
+                    models.Index(fields=['month', 'kind'], name='payment_fact_month_kind_idx'),
+                    models.Index(fields=['division', 'month'], name='payment_fact_division_idx'),
+                    models.Index(fields=['employee', 'month'], name='payment_fact_employee_idx'),
+                ],
+            },
+        ),
+        migrations.RunPython(build_payment_facts, migrations.RunPython.noop),
+    ]
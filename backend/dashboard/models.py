@@ -1,6 +1,8 @@
 from decimal import Decimal
 
 from django.db import models
+from django.db.models import F
+from django.utils import timezone
 
 
 class Setting(models.Model):
@@ -30,8 +32,74 @@ class Setting(models.Model):
 
     @classmethod
     def get_decimal(cls, key: str, default: Decimal) -> Decimal:
-        try:
-            setting = cls.objects.get(key=key)
-        except cls.DoesNotExist:
-            return default
-        return setting.decimal_value if setting.decimal_value is not None else default
+        """Читает значение из настроек в памяти процесса (dashboard.settings_store)."""
+        from .settings_store import setting_store
+
+        return setting_store.get_decimal(key, default)
+
+
+class DataVersion(models.Model):
+    """
+    Счётчик версии данных. Кеши, построенные по данным, включают версию в ключ,
+    поэтому увеличение счётчика инвалидирует их во всех процессах сразу.
+    """
+
+    key = models.CharField('Ключ', max_length=64, unique=True)
+    version = models.PositiveBigIntegerField('Версия', default=0)
+    updated_at = models.DateTimeField('Обновлено', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self) -> str:
+        return f'{self.key}: {self.version}'
+
+    @classmethod
+    def get_version(cls, key: str) -> int:
+        return cls.objects.filter(key=key).values_list('version', flat=True).first() or 0
+
+    @classmethod
+    def bump(cls, key: str) -> None:
+        updated = cls.objects.filter(key=key).update(version=F('version') + 1, updated_at=timezone.now())
+        if not updated:
+            cls.objects.get_or_create(key=key, defaults={'version': 1})
+
+
+class MonthlyPaymentFact(models.Model):
+    """
+    Сумма выплат сотрудника одного вида за месяц. Поддерживается приращениями при
+    сохранении и удалении выплат (dashboard.facts), полностью пересчитывается командой
+    rebuild_payment_facts.
+    """
+
+    class Kind(models.TextChoices):
+        RECURRING = 'recurring', 'Постоянные выплаты'
+        ONE_TIME = 'one_time', 'Разовые выплаты'
+        REQUESTS = 'requests', 'Заявки'
+
+    month = models.DateField('Месяц')
+    division = models.ForeignKey(
+        'staffing.Division', on_delete=models.CASCADE, related_name='payment_facts', verbose_name='Подразделение',
+    )
+    employee = models.ForeignKey(
+        'stimuli.Employee', on_delete=models.CASCADE, related_name='payment_facts', verbose_name='Сотрудник',
+    )
+    kind = models.CharField('Вид выплаты', max_length=16, choices=Kind.choices)
+    amount = models.DecimalField('Сумма', max_digits=16, decimal_places=2, default=Decimal('0'))
+    updated_at = models.DateTimeField('Обновлено', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Помесячная сумма выплат'
+        verbose_name_plural = 'Помесячные суммы выплат'
+        constraints = [
+            models.UniqueConstraint(fields=['month', 'employee', 'kind'], name='payment_fact_unique_month_employee_kind'),
+        ]
+        indexes = [
+            models.Index(fields=['month', 'kind'], name='payment_fact_month_kind_idx'),
+            models.Index(fields=['division', 'month'], name='payment_fact_division_idx'),
+            models.Index(fields=['employee', 'month'], name='payment_fact_employee_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.employee_id} {self.month:%m.%Y} {self.kind}: {self.amount}'
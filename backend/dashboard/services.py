@@ -1,20 +1,22 @@
 from __future__ import annotations
 
-from collections import defaultdict
-from dataclasses import dataclass
+from dataclasses import astuple, dataclass
 from datetime import date
 from decimal import Decimal
 from typing import Dict, List, Optional
 
-from django.db.models import Sum
-from django.db.models.functions import TruncMonth
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, ExpressionWrapper, F, Sum
 
 from budgeting.models import BudgetAllocation
-from one_time_payments.models import OneTimePayment
-from recurring_payments.models import RecurringPayment
-from stimuli.models import Employee, StimulusRequest
+from staffing.models import Division
+from stimuli.models import SALARY_OUTPUT_FIELD, Employee
 
-from .models import Setting
+from .facts import payment_totals
+from .models import MonthlyPaymentFact
+from .settings_store import setting_store
+from .versioning import get_data_version
 
 
 @dataclass
@@ -41,143 +43,119 @@ def _apply_employee_filters(qs, filters: DashboardFilters):
     return qs
 
 
-def _apply_payment_filters(qs, filters: DashboardFilters, date_field: str):
-    if filters.start_date:
-        qs = qs.filter(**{f'{date_field}__gte': filters.start_date})
-    if filters.end_date:
-        qs = qs.filter(**{f'{date_field}__lte': filters.end_date})
-    return qs
+PAYMENT_KINDS = {
+    'recurring': MonthlyPaymentFact.Kind.RECURRING,
+    'one_time': MonthlyPaymentFact.Kind.ONE_TIME,
+    'requests': MonthlyPaymentFact.Kind.REQUESTS,
+}
 
 
-def _normalize_month(value):
-    if value is None:
-        return None
-    if hasattr(value, 'date'):
-        return value.date()
-    return value
-
-
-def collect_dashboard_metrics(filters: DashboardFilters) -> Dict[str, object]:
-    employee_qs = Employee.objects.select_related('division', 'position').prefetch_related('assignments__position')
-    employee_qs = _apply_employee_filters(employee_qs, filters)
-    employees: List[Employee] = list(employee_qs)
-    employee_ids = [employee.id for employee in employees]
-
-    recurring_qs = RecurringPayment.objects.select_related('employee__division', 'period')
-    if employee_ids:
-        recurring_qs = recurring_qs.filter(employee_id__in=employee_ids)
-    recurring_qs = _apply_payment_filters(recurring_qs, filters, 'period__start_date')
-
-    onetime_qs = OneTimePayment.objects.select_related('employee__division', 'campaign')
-    if employee_ids:
-        onetime_qs = onetime_qs.filter(employee_id__in=employee_ids)
-    onetime_qs = _apply_payment_filters(onetime_qs, filters, 'payment_date')
-
-    requests_qs = StimulusRequest.objects.filter(status=StimulusRequest.Status.APPROVED)
-    if employee_ids:
-        requests_qs = requests_qs.filter(employee_id__in=employee_ids)
-    requests_qs = _apply_payment_filters(requests_qs, filters, 'created_at')
-
-    monthly_totals = defaultdict(lambda: {
-        'month': None,
-        'recurring': Decimal('0'),
-        'one_time': Decimal('0'),
-        'requests': Decimal('0'),
-    })
-
-    recurring_by_month = recurring_qs.annotate(month=TruncMonth('period__start_date')).values('month').annotate(total=Sum('amount'))
-    for entry in recurring_by_month:
-        month = _normalize_month(entry['month'])
-        bucket = monthly_totals[month]
-        bucket['month'] = month
-        bucket['recurring'] += _as_decimal(entry['total'])
-
-    onetime_by_month = onetime_qs.annotate(month=TruncMonth('payment_date')).values('month').annotate(total=Sum('amount'))
-    for entry in onetime_by_month:
-        month = _normalize_month(entry['month'])
-        bucket = monthly_totals[month]
-        bucket['month'] = month
-        bucket['one_time'] += _as_decimal(entry['total'])
-
-    request_by_month = requests_qs.annotate(month=TruncMonth('created_at')).values('month').annotate(total=Sum('amount'))
-    for entry in request_by_month:
-        month = _normalize_month(entry['month'])
-        bucket = monthly_totals[month]
-        bucket['month'] = month
-        bucket['requests'] += _as_decimal(entry['total'])
+def _dashboard_employees(filters: DashboardFilters):
+    """Сотрудники с аннотациями dashboard_salary (оклад с совмещениями) и dashboard_allowances."""
+    qs = _apply_employee_filters(Employee.objects.all(), filters)
+    return qs.with_compensation('salary', 'assignments_salary', 'allowance_total').annotate(
+        dashboard_salary=ExpressionWrapper(
+            F('annotated_salary_amount') + F('annotated_assignments_salary_amount'),
+            output_field=SALARY_OUTPUT_FIELD,
+        ),
+        dashboard_allowances=F('annotated_allowance_total'),
+    )
 
-    monthly_totals_list = sorted(monthly_totals.values(), key=lambda item: item['month'] or date.min)
 
-    recurring_by_employee = {
-        item['employee_id']: _as_decimal(item['total'])
-        for item in recurring_qs.values('employee_id').annotate(total=Sum('amount'))
+def _summary(salary, allowances, payments: Dict[tuple, Decimal], group) -> Dict[str, Decimal]:
+    """Строка сводки: оклады, надбавки и выплаты группы; заявки в итог не входят."""
+    row = {
+        'total_salary': _as_decimal(salary),
+        'allowances': _as_decimal(allowances),
     }
-    onetime_by_employee = {
-        item['employee_id']: _as_decimal(item['total'])
-        for item in onetime_qs.values('employee_id').annotate(total=Sum('amount'))
-    }
-    requests_by_employee = {
-        item['employee_id']: _as_decimal(item['total'])
-        for item in requests_qs.values('employee_id').annotate(total=Sum('amount'))
+    for key, kind in PAYMENT_KINDS.items():
+        row[key] = payments.get((group, kind), Decimal('0'))
+    row['total'] = row['total_salary'] + row['allowances'] + row['recurring'] + row['one_time']
+    return row
+
+
+def collect_monthly_panel(filters: DashboardFilters) -> Dict[str, object]:
+    """Помесячные суммы выплат по видам и итоги за период (из dashboard.facts)."""
+    monthly_totals = {}
+    for (month, kind), total in payment_totals(filters, 'month').items():
+        bucket = monthly_totals.setdefault(month, {
+            'month': month,
+            'recurring': Decimal('0'),
+            'one_time': Decimal('0'),
+            'requests': Decimal('0'),
+        })
+        bucket[kind] += total
+    monthly_totals_list = sorted(monthly_totals.values(), key=lambda item: item['month'] or date.min)
+    return {
+        'monthly_totals': monthly_totals_list,
+        'totals': {
+            key: sum((entry[key] for entry in monthly_totals_list), Decimal('0'))
+            for key in PAYMENT_KINDS
+        },
     }
 
-    division_stats = {}
-    employee_stats: List[Dict[str, object]] = []
-
-    category_sums = defaultdict(Decimal)
-    category_counts = defaultdict(int)
 
-    for employee in employees:
-        base_salary = _as_decimal(employee.salary_amount)
-        assignments_salary = _as_decimal(employee.assignments_salary_amount)
-        allowances = _as_decimal(employee.allowance_total)
-        recurring_amount = recurring_by_employee.get(employee.id, Decimal('0'))
-        onetime_amount = onetime_by_employee.get(employee.id, Decimal('0'))
-        request_amount = requests_by_employee.get(employee.id, Decimal('0'))
+def collect_division_panel(filters: DashboardFilters) -> Dict[str, object]:
+    """Оклады, надбавки и выплаты по подразделениям; employees_total — итог по всем сотрудникам."""
+    division_payments = payment_totals(filters, 'division')
+    division_rows = list(
+        _dashboard_employees(filters).order_by().values('division_id').annotate(
+            total_salary=Sum('dashboard_salary'),
+            allowances=Sum('dashboard_allowances'),
+        )
+    )
+    divisions = Division.objects.in_bulk([row['division_id'] for row in division_rows])
+    division_stats_list = []
+    for row in division_rows:
+        entry = {'division': divisions.get(row['division_id'])}
+        entry.update(_summary(row['total_salary'], row['allowances'], division_payments, row['division_id']))
+        division_stats_list.append(entry)
+    division_stats_list.sort(key=lambda item: item['division'].name if item['division'] else '')
+    return {
+        'division_stats': division_stats_list,
+        'employees_total': sum((item['total'] for item in division_stats_list), Decimal('0')),
+    }
 
-        total_salary = base_salary + assignments_salary
-        total_payments = total_salary + allowances + recurring_amount + onetime_amount
 
+def collect_employee_panel(filters: DashboardFilters) -> Dict[str, object]:
+    """Таблица сотрудников: оклад и надбавки из аннотаций, выплаты — из помесячных сумм."""
+    employee_payments = payment_totals(filters, 'employee')
+    employee_stats: List[Dict[str, object]] = []
+    employees = _dashboard_employees(filters).select_related('division').order_by('full_name')
+    for employee in employees:
+        row = _summary(employee.dashboard_salary, employee.dashboard_allowances, employee_payments, employee.pk)
         employee_stats.append({
             'employee': employee,
             'division': employee.division,
-            'base_salary': total_salary,
-            'allowances': allowances,
-            'recurring': recurring_amount,
-            'one_time': onetime_amount,
-            'requests': request_amount,
-            'total': total_payments,
-        })
-
-        division_entry = division_stats.setdefault(employee.division_id, {
-            'division': employee.division,
-            'total_salary': Decimal('0'),
-            'allowances': Decimal('0'),
-            'recurring': Decimal('0'),
-            'one_time': Decimal('0'),
-            'requests': Decimal('0'),
-            'total': Decimal('0'),
+            'base_salary': row['total_salary'],
+            'allowances': row['allowances'],
+            'recurring': row['recurring'],
+            'one_time': row['one_time'],
+            'requests': row['requests'],
+            'total': row['total'],
         })
-        division_entry['total_salary'] += total_salary
-        division_entry['allowances'] += allowances
-        division_entry['recurring'] += recurring_amount
-        division_entry['one_time'] += onetime_amount
-        division_entry['requests'] += request_amount
-        division_entry['total'] += total_payments
+    return {'employee_stats': employee_stats}
 
-        category_sums[employee.category] += total_salary
-        category_counts[employee.category] += 1
 
-    division_stats_list = sorted(division_stats.values(), key=lambda item: item['division'].name if item['division'] else '')
-    employee_stats.sort(key=lambda item: item['employee'].full_name)
+def collect_benchmark_panel(filters: DashboardFilters) -> Dict[str, object]:
+    """Средний оклад по категориям в сравнении с целевыми значениями из настроек."""
+    category_sums = {}
+    category_counts = {}
+    category_rows = _dashboard_employees(filters).order_by().values('category').annotate(
+        total_salary=Sum('dashboard_salary'),
+        employees=Count('pk'),
+    )
+    for row in category_rows:
+        category_sums[row['category']] = _as_decimal(row['total_salary'])
+        category_counts[row['category']] = row['employees']
 
     def _avg(category_key: str) -> Decimal:
         total = category_sums.get(category_key, Decimal('0'))
         count = category_counts.get(category_key, 0)
         return (total / count) if count else Decimal('0')
 
-    pps_target = Setting.get_decimal('pps_target_salary', Decimal('0'))
-    aup_target = Setting.get_decimal('aup_target_salary', Decimal('61000'))
+    pps_target = setting_store.get_decimal('pps_target_salary', Decimal('0'))
+    aup_target = setting_store.get_decimal('aup_target_salary', Decimal('61000'))
 
     benchmarks = [
         {
@@ -193,22 +171,46 @@ def collect_dashboard_metrics(filters: DashboardFilters) -> Dict[str, object]:
             'delta': _avg(Employee.Category.AUP) - aup_target,
         },
     ]
-
-    totals = {
-        'recurring': sum(entry['recurring'] for entry in monthly_totals_list),
-        'one_time': sum(entry['one_time'] for entry in monthly_totals_list),
-        'requests': sum(entry['requests'] for entry in monthly_totals_list),
-        'employees': sum(item['total'] for item in employee_stats),
-    }
-
-    allocations = BudgetAllocation.objects.select_related('budget').order_by('-created_at')[:20]
-
-    return {
-        'filters': filters,
-        'monthly_totals': monthly_totals_list,
-        'division_stats': division_stats_list,
-        'employee_stats': employee_stats,
-        'benchmarks': benchmarks,
-        'totals': totals,
-        'budget_allocations': allocations,
-    }
+    return {'benchmarks': benchmarks}
+
+
+def collect_allocation_panel(filters: DashboardFilters) -> Dict[str, object]:
+    """Последние выделения бюджета (от фильтров не зависят)."""
+    allocations = list(
+        BudgetAllocation.objects.select_related('budget', 'recurring_period', 'campaign').order_by('-created_at')[:20]
+    )
+    return {'budget_allocations': allocations}
+
+
+# Панель дэшборда -> функция расчёта. Каждая панель считается и кешируется отдельно,
+# чтобы тяжёлая таблица сотрудников не задерживала графики.
+DASHBOARD_PANELS = {
+    'monthly': collect_monthly_panel,
+    'divisions': collect_division_panel,
+    'employees': collect_employee_panel,
+    'benchmarks': collect_benchmark_panel,
+    'allocations': collect_allocation_panel,
+}
+
+
+def _panel_cache_key(panel: str, filters: DashboardFilters, version: int) -> str:
+    # Версия настроек — та, что видит этот процесс: пока его копия настроек не обновилась,
+    # результат не попадёт под ключ процессов, которые уже видят новые значения
+    parts = ['' if value is None else str(value) for value in astuple(filters)]
+    return ':'.join(['dashboard-panel', panel, str(version), str(setting_store.version), *parts])
+
+
+def get_dashboard_panel(panel: str, filters: DashboardFilters, version: Optional[int] = None) -> Dict[str, object]:
+    """
+    Данные панели DASHBOARD_PANELS с кешем по фильтрам и версии данных (dashboard.versioning).
+    Версия читается до расчёта: если данные изменятся во время расчёта, результат
+    сохранится под устаревшей версией и больше не будет прочитан.
+    """
+    if version is None:
+        version = get_data_version()
+    key = _panel_cache_key(panel, filters, version)
+    data = cache.get(key)
+    if data is None:
+        data = DASHBOARD_PANELS[panel](filters)
+        cache.set(key, data, settings.DASHBOARD_CACHE_TIMEOUT)
+    return data
@@ -0,0 +1,97 @@
+"""
+Настройки (Setting) в памяти процесса.
+
+Все строки Setting загружаются одним запросом и читаются из памяти. Актуальность
+проверяется по версии SETTINGS_DATA_KEY (dashboard.versioning): не чаще раза в
+SETTINGS_STORE_CHECK_INTERVAL секунд процесс читает номер версии и перезагружает
+настройки, только если он изменился. Сохранение или удаление Setting увеличивает версию
+после фиксации транзакции (dashboard.signals), а процесс, который сохранял, сбрасывает
+свою копию сразу. Другие воркеры увидят изменение не позже чем через интервал проверки.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from decimal import Decimal
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+
+from .models import Setting
+from .versioning import get_data_version
+
+SETTINGS_DATA_KEY = 'settings'
+
+
+class SettingStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (версия, {ключ: (decimal_value, text_value)}) — заменяется целиком
+        self._snapshot: Optional[Tuple[int, Dict[str, Tuple[Optional[Decimal], str]]]] = None
+        self._checked_at = 0.0
+
+    def invalidate(self) -> None:
+        """Сбрасывает копию: следующее чтение загрузит настройки заново."""
+        with self._lock:
+            self._snapshot = None
+
+    @property
+    def version(self) -> int:
+        """Версия настроек, которые сейчас видит процесс (для ключей кеша, зависящих от настроек)."""
+        return self._fresh_snapshot()[0]
+
+    def _fresh_snapshot(self):
+        snapshot = self._snapshot
+        interval = getattr(settings, 'SETTINGS_STORE_CHECK_INTERVAL', 5)
+        if snapshot is not None and time.monotonic() - self._checked_at < interval:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and time.monotonic() - self._checked_at < interval:
+                return snapshot
+            # Версия читается до строк: запись, зафиксированная между запросами, увеличит
+            # версию, и при следующей проверке настройки перезагрузятся
+            version = get_data_version(SETTINGS_DATA_KEY)
+            if snapshot is None or snapshot[0] != version:
+                values = {
+                    key: (decimal_value, text_value)
+                    for key, decimal_value, text_value in Setting.objects.values_list(
+                        'key', 'decimal_value', 'text_value'
+                    )
+                }
+                snapshot = self._snapshot = (version, values)
+            self._checked_at = time.monotonic()
+            return snapshot
+
+    def _get(self, key: str) -> Tuple[Optional[Decimal], str]:
+        return self._fresh_snapshot()[1].get(key, (None, ''))
+
+    def get_value(self, key: str, default=None):
+        """Значение как Setting.value: число, если задано, иначе непустой текст."""
+        decimal_value, text_value = self._get(key)
+        if decimal_value is not None:
+            return decimal_value
+        return text_value or default
+
+    def get_decimal(self, key: str, default: Decimal) -> Decimal:
+        decimal_value, _ = self._get(key)
+        return decimal_value if decimal_value is not None else default
+
+    def get_int(self, key: str, default: int) -> int:
+        decimal_value, _ = self._get(key)
+        return int(decimal_value) if decimal_value is not None else default
+
+    def get_text(self, key: str, default: str = '') -> str:
+        _, text_value = self._get(key)
+        return text_value or default
+
+    def get_bool(self, key: str, default: bool = False) -> bool:
+        decimal_value, text_value = self._get(key)
+        if decimal_value is not None:
+            return decimal_value != 0
+        if text_value:
+            return text_value.strip().lower() in ('1', 'true', 'yes', 'да')
+        return default
+
+
+setting_store = SettingStore()
@@ -0,0 +1,137 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+
+from budgeting.models import Budget, BudgetAllocation
+from one_time_payments.models import OneTimePayment, RequestCampaign
+from recurring_payments.models import RecurringPayment, RecurringPeriod
+from staffing.models import Division, Position
+from stimuli.hooks import employees_bulk_updated, requests_bulk_updated
+from stimuli.models import Employee, InternalAssignment, StimulusRequest
+
+from . import facts
+from .models import MonthlyPaymentFact, Setting
+from .settings_store import SETTINGS_DATA_KEY, setting_store
+from .versioning import bump_data_version
+
+# Модели, из которых собираются сводки дэшборда (суммы, подписи, целевые значения)
+DASHBOARD_SOURCE_MODELS = (
+    Employee,
+    InternalAssignment,
+    StimulusRequest,
+    RecurringPayment,
+    RecurringPeriod,
+    OneTimePayment,
+    RequestCampaign,
+    Budget,
+    BudgetAllocation,
+    Division,
+    Position,
+    Setting,
+)
+
+
+def handle_source_change(sender, **kwargs):
+    bump_data_version()
+
+
+for model in DASHBOARD_SOURCE_MODELS:
+    uid = f'dashboard-data-version-{model._meta.label_lower}'
+    post_save.connect(handle_source_change, sender=model, dispatch_uid=uid)
+    post_delete.connect(handle_source_change, sender=model, dispatch_uid=uid)
+
+
+def handle_setting_change(sender, **kwargs):
+    bump_data_version(SETTINGS_DATA_KEY)
+    # Свою копию процесс сбрасывает сразу после фиксации, не дожидаясь проверки версии
+    transaction.on_commit(setting_store.invalidate)
+
+
+post_save.connect(handle_setting_change, sender=Setting, dispatch_uid='dashboard-settings-version')
+post_delete.connect(handle_setting_change, sender=Setting, dispatch_uid='dashboard-settings-version')
+
+# --- Помесячные суммы выплат (dashboard.facts) --------------------------------------------
+
+# Модель -> (вид факта, поля, от которых зависит вклад в факты)
+PAYMENT_FACT_MODELS = {
+    RecurringPayment: (MonthlyPaymentFact.Kind.RECURRING, {'period', 'employee', 'amount'}),
+    OneTimePayment: (MonthlyPaymentFact.Kind.ONE_TIME, {'payment_date', 'employee', 'amount'}),
+    StimulusRequest: (MonthlyPaymentFact.Kind.REQUESTS, {'status', 'created_at', 'employee', 'amount'}),
+}
+
+
+def _tracks_fact_fields(sender, update_fields) -> bool:
+    _, fields = PAYMENT_FACT_MODELS[sender]
+    return update_fields is None or bool(fields & set(update_fields))
+
+
+def remember_payment_fact(sender, instance, update_fields=None, **kwargs):
+    kind, _ = PAYMENT_FACT_MODELS[sender]
+    instance._payment_fact_before = None
+    if instance.pk is not None and not instance._state.adding and _tracks_fact_fields(sender, update_fields):
+        instance._payment_fact_before = facts.stored_fact_contribution(kind, instance.pk)
+
+
+def update_payment_fact(sender, instance, created=False, update_fields=None, **kwargs):
+    if not created and not _tracks_fact_fields(sender, update_fields):
+        return
+    kind, _ = PAYMENT_FACT_MODELS[sender]
+    before = getattr(instance, '_payment_fact_before', None)
+    instance._payment_fact_before = None
+    facts.apply_fact_change(kind, before, facts.fact_contribution(kind, instance))
+
+
+def remember_deleted_payment_fact(sender, instance, **kwargs):
+    # При каскадном удалении связанный период уже может быть удалён к post_delete
+    kind, _ = PAYMENT_FACT_MODELS[sender]
+    instance._payment_fact_before = facts.stored_fact_contribution(kind, instance.pk)
+
+
+def remove_payment_fact(sender, instance, **kwargs):
+    kind, _ = PAYMENT_FACT_MODELS[sender]
+    facts.apply_fact_change(kind, getattr(instance, '_payment_fact_before', None), None)
+
+
+def sync_employee_fact_division(sender, instance, created=False, update_fields=None, **kwargs):
+    if created or (update_fields is not None and 'division' not in update_fields):
+        return
+    facts.sync_fact_divisions([instance.pk])
+
+
+def remember_period_start(sender, instance, **kwargs):
+    instance._payment_fact_start = None
+    if instance.pk is not None and not instance._state.adding:
+        instance._payment_fact_start = (
+            RecurringPeriod.objects.filter(pk=instance.pk).values_list('start_date', flat=True).first()
+        )
+
+
+def refresh_period_facts(sender, instance, created=False, **kwargs):
+    if created or getattr(instance, '_payment_fact_start', None) in (None, instance.start_date):
+        return
+    employee_ids = instance.payments.values_list('employee_id', flat=True)
+    facts.refresh_payment_facts(employee_ids, kinds=[MonthlyPaymentFact.Kind.RECURRING])
+
+
+def refresh_request_facts(sender, employee_ids, **kwargs):
+    facts.refresh_payment_facts(employee_ids, kinds=[MonthlyPaymentFact.Kind.REQUESTS])
+    bump_data_version()
+
+
+def sync_imported_employee_facts(sender, employee_ids, **kwargs):
+    if employee_ids:
+        facts.sync_fact_divisions(employee_ids)
+    bump_data_version()
+
+
+for model in PAYMENT_FACT_MODELS:
+    uid = f'dashboard-payment-facts-{model._meta.label_lower}'
+    pre_save.connect(remember_payment_fact, sender=model, dispatch_uid=uid)
+    post_save.connect(update_payment_fact, sender=model, dispatch_uid=uid)
+    pre_delete.connect(remember_deleted_payment_fact, sender=model, dispatch_uid=uid)
+    post_delete.connect(remove_payment_fact, sender=model, dispatch_uid=uid)
+
+post_save.connect(sync_employee_fact_division, sender=Employee, dispatch_uid='dashboard-payment-facts-employee')
+pre_save.connect(remember_period_start, sender=RecurringPeriod, dispatch_uid='dashboard-payment-facts-period')
+post_save.connect(refresh_period_facts, sender=RecurringPeriod, dispatch_uid='dashboard-payment-facts-period')
+requests_bulk_updated.connect(refresh_request_facts, dispatch_uid='dashboard-payment-facts-requests')
+employees_bulk_updated.connect(sync_imported_employee_facts, dispatch_uid='dashboard-payment-facts-employees')
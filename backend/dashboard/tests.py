@@ -1,3 +1,341 @@
-from django.test import TestCase
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from one_time_payments.models import OneTimePayment, RequestCampaign
+from recurring_payments.models import RecurringPayment, RecurringPeriod
+from staffing.models import Division, Position
+from stimuli.hooks import employees_bulk_updated
+from stimuli.models import Employee, StimulusRequest
+from stimuli.services import approve_pending_requests
+
+from .facts import month_of, payment_totals, refresh_payment_facts
+from .models import DataVersion, MonthlyPaymentFact, Setting
+from .services import DASHBOARD_PANELS, DashboardFilters, get_dashboard_panel
+from .settings_store import SETTINGS_DATA_KEY, SettingStore, setting_store
+from .versioning import bump_data_version, get_data_version
+
+Kind = MonthlyPaymentFact.Kind
+
+
+def local_datetime(*args):
+    return timezone.make_aware(datetime(*args))
+
+
+class DataVersionTests(TestCase):
+    def test_bumps_are_coalesced_per_transaction(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            bump_data_version()
+            with transaction.atomic():
+                bump_data_version()
+                bump_data_version('other')
+            bump_data_version()
+            self.assertEqual(get_data_version(), 0)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual((get_data_version(), get_data_version('other')), (1, 1))
+
+    def test_rolled_back_bump_is_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                bump_data_version('other')
+                raise RuntimeError
+            bump_data_version()
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual((get_data_version(), get_data_version('other')), (1, 0))
+
+
+class PaymentFactsTestMixin:
+    @classmethod
+    def setUpTestData(cls):
+        # Отложенные пересчёты и версии данных фиксируются здесь, а не остаются в транзакции класса
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.user = get_user_model().objects.create_user('manager')
+            position = Position.objects.create(name='Доцент', base_salary=Decimal('50000'))
+            cls.divisions = [Division.objects.create(name=name) for name in ('Кафедра А', 'Кафедра Б')]
+            cls.employees = [
+                Employee.objects.create(
+                    full_name=f'Сотрудник {index}',
+                    division=cls.divisions[index % 2],
+                    position=position,
+                    category=Employee.Category.PPS,
+                )
+                for index in range(4)
+            ]
+            for start, end in ((date(2026, 1, 1), date(2026, 1, 31)), (date(2026, 3, 1), date(2026, 3, 31))):
+                period = RecurringPeriod.objects.create(name=f'{start:%m.%Y}', start_date=start, end_date=end)
+                for index, employee in enumerate(cls.employees):
+                    RecurringPayment.objects.create(period=period, employee=employee, amount=Decimal(1000 + index))
+            one_time_dates = [date(2026, 1, 15), date(2026, 1, 31), date(2026, 2, 1), date(2026, 2, 20), date(2026, 4, 10)]
+            for index, payment_date in enumerate(one_time_dates):
+                OneTimePayment.objects.create(
+                    employee=cls.employees[index % 4], amount=Decimal(300 + index), payment_date=payment_date,
+                )
+            # Конец марта и начало апреля по Москве: в UTC обе даты ещё 31 марта
+            request_times = [
+                (local_datetime(2026, 2, 10, 12), StimulusRequest.Status.APPROVED),
+                (local_datetime(2026, 3, 31, 23, 30), StimulusRequest.Status.APPROVED),
+                (local_datetime(2026, 4, 1, 0, 30), StimulusRequest.Status.APPROVED),
+                (local_datetime(2026, 4, 15, 9), StimulusRequest.Status.PENDING),
+            ]
+            for index, (created_at, status) in enumerate(request_times):
+                request = StimulusRequest.objects.create(
+                    employee=cls.employees[index % 4],
+                    requested_by=cls.user,
+                    amount=Decimal(500 + index),
+                    justification='Обоснование',
+                    status=status,
+                )
+                StimulusRequest.objects.filter(pk=request.pk).update(created_at=created_at)
+            # created_at задан через UPDATE в обход сигналов
+            refresh_payment_facts(kinds=[Kind.REQUESTS])
+
+    def expected_totals(self, filters, by):
+        """Суммы напрямую по исходным строкам с точными датами."""
+        sources = [
+            (Kind.RECURRING, RecurringPayment.objects.select_related('employee', 'period'),
+             lambda obj: obj.period.start_date),
+            (Kind.ONE_TIME, OneTimePayment.objects.select_related('employee'), lambda obj: obj.payment_date),
+            (Kind.REQUESTS, StimulusRequest.objects.filter(status=StimulusRequest.Status.APPROVED)
+             .select_related('employee'), lambda obj: timezone.localdate(obj.created_at)),
+        ]
+        totals = defaultdict(Decimal)
+        for kind, queryset, date_of in sources:
+            for obj in queryset:
+                value = date_of(obj)
+                if filters.start_date and value < filters.start_date:
+                    continue
+                if filters.end_date and value > filters.end_date:
+                    continue
+                if filters.division_id and obj.employee.division_id != filters.division_id:
+                    continue
+                group = {
+                    'month': month_of(value),
+                    'division': obj.employee.division_id,
+                    'employee': obj.employee_id,
+                }[by]
+                totals[(group, kind)] += obj.amount
+        return dict(totals)
+
+    def fact_rows(self):
+        return sorted(
+            MonthlyPaymentFact.objects.exclude(amount=0)
+            .values_list('month', 'employee_id', 'division_id', 'kind', 'amount')
+        )
+
+
+class PaymentTotalsTests(PaymentFactsTestMixin, TestCase):
+    def test_ranges_match_direct_totals(self):
+        ranges = [
+            (None, None),
+            (date(2026, 1, 1), date(2026, 3, 31)),   # только полные месяцы
+            (date(2026, 1, 16), date(2026, 2, 28)),  # неполный первый месяц
+            (date(2026, 1, 1), date(2026, 2, 19)),   # неполный последний месяц
+            (date(2026, 1, 20), date(2026, 2, 10)),  # оба края неполные, полных месяцев нет
+            (date(2026, 2, 5), date(2026, 2, 25)),   # внутри одного месяца
+            (date(2026, 3, 31), date(2026, 3, 31)),  # один день: граница суток по Москве
+            (date(2026, 1, 31), None),
+            (None, date(2026, 2, 1)),
+            (date(2026, 5, 1), date(2026, 4, 1)),    # пустой диапазон
+        ]
+        for start, end in ranges:
+            for division_id in (None, self.divisions[1].pk):
+                filters = DashboardFilters(start_date=start, end_date=end, division_id=division_id)
+                for by in ('month', 'division', 'employee'):
+                    with self.subTest(start=start, end=end, division=division_id, by=by):
+                        self.assertEqual(payment_totals(filters, by), self.expected_totals(filters, by))
+
+    def test_request_month_uses_project_time_zone(self):
+        totals = payment_totals(DashboardFilters(), 'month')
+        self.assertEqual(totals[(date(2026, 3, 1), Kind.REQUESTS)], Decimal('501'))
+        self.assertEqual(totals[(date(2026, 4, 1), Kind.REQUESTS)], Decimal('502'))
+
+
+class PaymentFactMaintenanceTests(PaymentFactsTestMixin, TestCase):
+    def assertFactsMatchRebuild(self):
+        maintained = self.fact_rows()
+        refresh_payment_facts()
+        self.assertEqual(maintained, self.fact_rows())
+
+    def test_initial_facts_match_rebuild(self):
+        self.assertFactsMatchRebuild()
+
+    def test_saves_and_deletes_apply_deltas(self):
+        payment = OneTimePayment.objects.order_by('pk').first()
+        payment.amount += Decimal('11.50')
+        payment.payment_date = date(2026, 5, 3)
+        payment.save()
+        OneTimePayment.objects.create(employee=self.employees[2], amount=Decimal('40'), payment_date=date(2026, 2, 2))
+        OneTimePayment.objects.order_by('-pk').first().delete()
+
+        recurring = RecurringPayment.objects.order_by('pk').first()
+        recurring.amount = Decimal('5000')
+        recurring.save(update_fields=['amount'])
+        RecurringPayment.objects.order_by('-pk').first().delete()
+
+        request = StimulusRequest.objects.filter(status=StimulusRequest.Status.PENDING).get()
+        request.status = StimulusRequest.Status.APPROVED
+        request.save()
+        approved = StimulusRequest.objects.filter(status=StimulusRequest.Status.APPROVED).order_by('pk').first()
+        approved.status = StimulusRequest.Status.REJECTED
+        approved.save()
+
+        self.assertFactsMatchRebuild()
+
+    def test_period_and_division_changes_move_facts(self):
+        period = RecurringPeriod.objects.order_by('start_date').first()
+        period.start_date = date(2026, 2, 1)
+        period.save()
+
+        employee = self.employees[0]
+        employee.division = self.divisions[1]
+        employee.save()
+
+        self.assertFactsMatchRebuild()
+        self.assertFalse(
+            MonthlyPaymentFact.objects.filter(employee=employee).exclude(division=self.divisions[1]).exists()
+        )
+
+    def test_bulk_approval_refreshes_request_facts(self):
+        version = get_data_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            campaign = RequestCampaign.objects.create(
+                name='Апрель', status=RequestCampaign.Status.OPEN, opens_at=date(2026, 4, 1),
+            )
+            StimulusRequest.objects.filter(status=StimulusRequest.Status.PENDING).update(campaign=campaign)
+            self.assertEqual(approve_pending_requests(campaign), 1)
+
+        # Сохранение кампании и одобрение в одной транзакции дают одно увеличение версии
+        self.assertEqual(get_data_version(), version + 1)
+        self.assertEqual(
+            payment_totals(DashboardFilters(), 'month')[(date(2026, 4, 1), Kind.REQUESTS)], Decimal('502') + Decimal('503'),
+        )
+        self.assertFactsMatchRebuild()
+
+    def test_campaign_archive_refreshes_request_facts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            campaign = RequestCampaign.objects.create(
+                name='Март', status=RequestCampaign.Status.CLOSED, opens_at=date(2026, 3, 1),
+            )
+            StimulusRequest.objects.filter(status=StimulusRequest.Status.APPROVED).update(campaign=campaign)
+            campaign.archive()
+
+        self.assertFalse(MonthlyPaymentFact.objects.filter(kind=Kind.REQUESTS).exclude(amount=0).exists())
+        self.assertFactsMatchRebuild()
+
+    def test_bulk_employee_update_moves_facts(self):
+        employee = self.employees[0]
+        version = get_data_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            Employee.objects.filter(pk=employee.pk).update(division=self.divisions[1])
+            employees_bulk_updated.send(sender=Employee, employee_ids=[employee.pk])
+
+        self.assertEqual(get_data_version(), version + 1)
+        self.assertFalse(
+            MonthlyPaymentFact.objects.filter(employee=employee).exclude(division=self.divisions[1]).exists()
+        )
+        self.assertFactsMatchRebuild()
+
+
+class DashboardPanelCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('admin', is_staff=True, is_superuser=True)
+
+    def setUp(self):
+        cache.clear()
+        setting_store.invalidate()
+        self.collect = mock.Mock(wraps=DASHBOARD_PANELS['monthly'])
+        patcher = mock.patch.dict(DASHBOARD_PANELS, {'monthly': self.collect})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cached_until_data_version_changes(self):
+        filters = DashboardFilters()
+        get_dashboard_panel('monthly', filters)
+        get_dashboard_panel('monthly', filters)
+        self.assertEqual(self.collect.call_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_data_version()
+
+        get_dashboard_panel('monthly', filters)
+        self.assertEqual(self.collect.call_count, 2)
+
+    def test_panel_etag_follows_data_version(self):
+        self.client.force_login(self.user)
+        url = reverse('dashboard:panel', args=['monthly'])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_data_version()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.collect.call_count, 2)
+
+    def test_setting_change_invalidates_panel_cache(self):
+        filters = DashboardFilters()
+        get_dashboard_panel('monthly', filters)
+
+        settings_version = setting_store.version
+        with self.captureOnCommitCallbacks(execute=True):
+            Setting.objects.create(key='salary_fund_share', decimal_value=Decimal('0.3'))
+
+        # Процесс, сохранивший настройку, видит её сразу, не дожидаясь интервала проверки
+        self.assertEqual(Setting.get_decimal('salary_fund_share', Decimal('0')), Decimal('0.3'))
+        self.assertEqual(setting_store.version, settings_version + 1)
+        get_dashboard_panel('monthly', filters)
+        self.assertEqual(self.collect.call_count, 2)
+
+
+@override_settings(SETTINGS_STORE_CHECK_INTERVAL=5)
+class SettingStoreTests(TestCase):
+    def setUp(self):
+        Setting.objects.create(key='limit', decimal_value=Decimal('10'))
+        self.store = SettingStore()
+        self.now = 1000.0
+        patcher = mock.patch('dashboard.settings_store.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def change_in_other_process(self, value):
+        # Другой воркер: строка и версия меняются в БД, память этого процесса не трогается
+        Setting.objects.filter(key='limit').update(decimal_value=value)
+        DataVersion.bump(SETTINGS_DATA_KEY)
+
+    def test_reloads_after_check_interval(self):
+        self.assertEqual(self.store.get_decimal('limit', Decimal('0')), Decimal('10'))
+        self.change_in_other_process(Decimal('20'))
+
+        self.now += 4
+        with self.assertNumQueries(0):
+            self.assertEqual(self.store.get_decimal('limit', Decimal('0')), Decimal('10'))
+
+        self.now += 2
+        self.assertEqual(self.store.get_decimal('limit', Decimal('0')), Decimal('20'))
+
+    def test_unchanged_version_skips_reload(self):
+        self.store.get_decimal('limit', Decimal('0'))
+        self.now += 10
+        # Только чтение номера версии
+        with self.assertNumQueries(1):
+            self.assertEqual(self.store.get_decimal('limit', Decimal('0')), Decimal('10'))
+
+    def test_invalidate_reloads_immediately(self):
+        self.store.get_decimal('limit', Decimal('0'))
+        self.change_in_other_process(Decimal('30'))
+        self.store.invalidate()
+        self.assertEqual(self.store.get_decimal('limit', Decimal('0')), Decimal('30'))
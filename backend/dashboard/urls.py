@@ -6,5 +6,6 @@ app_name = 'dashboard'
 
 urlpatterns = [
     path('', views.DashboardView.as_view(), name='overview'),
+    path('panels/<slug:panel>/', views.DashboardPanelView.as_view(), name='panel'),
     path('export/', views.DashboardExportView.as_view(), name='export'),
 ]
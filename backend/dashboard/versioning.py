@@ -0,0 +1,26 @@
+"""
+Версия данных дэшборда.
+
+Сигналы (dashboard.signals) и пути, меняющие данные массовым UPDATE или bulk_create,
+вызывают bump_data_version(). Внутри транзакции все вызовы объединяются в одно увеличение
+счётчика после фиксации (stimul_ico.transactions.defer_until_commit): читатели не увидят новую
+версию раньше новых данных, а длинная транзакция не держит блокировку строки счётчика.
+"""
+from stimul_ico.transactions import defer_until_commit
+
+from .models import DataVersion
+
+DASHBOARD_DATA_KEY = 'dashboard'
+
+
+def _bump_versions(keys: set[str]) -> None:
+    for key in sorted(keys):
+        DataVersion.bump(key)
+
+
+def bump_data_version(key: str = DASHBOARD_DATA_KEY) -> None:
+    defer_until_commit('data-version-bump', [key], _bump_versions)
+
+
+def get_data_version(key: str = DASHBOARD_DATA_KEY) -> int:
+    return DataVersion.get_version(key)
@@ -1,178 +1,251 @@
 import csv
-import json
 from datetime import datetime
-from decimal import Decimal
 
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse, JsonResponse
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.formats import date_format, localize
+from django.utils.http import quote_etag
 from django.views import View, generic
 
 from .forms import DashboardFilterForm
-from .services import DashboardFilters, collect_dashboard_metrics
+from .services import DASHBOARD_PANELS, DashboardFilters, get_dashboard_panel
+from .settings_store import setting_store
+from .versioning import get_data_version
 
 
-class DashboardView(LoginRequiredMixin, PermissionRequiredMixin, generic.TemplateView):
+class DashboardFiltersMixin:
+    """Фильтры дэшборда из GET-параметров; при ошибках в форме — без фильтров."""
+
+    def get_filter_form(self):
+        return DashboardFilterForm(self.request.GET or None)
+
+    def get_filters(self, form=None):
+        form = form or self.get_filter_form()
+        if not form.is_valid():
+            return DashboardFilters()
+        return DashboardFilters(
+            start_date=form.cleaned_data.get('start_date'),
+            end_date=form.cleaned_data.get('end_date'),
+            division_id=form.cleaned_data.get('division').id if form.cleaned_data.get('division') else None,
+            employee_id=form.cleaned_data.get('employee').id if form.cleaned_data.get('employee') else None,
+        )
+
+
+class DashboardView(LoginRequiredMixin, PermissionRequiredMixin, DashboardFiltersMixin, generic.TemplateView):
+    """
+    Каркас страницы: форма фильтров и пустые панели. Данные панелей страница загружает
+    параллельно из DashboardPanelView, поэтому отдаётся без расчётов.
+    """
+
     template_name = 'dashboard/dashboard_overview.html'
     permission_required = 'dashboard.view_dashboard'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        form = DashboardFilterForm(self.request.GET or None)
-        if form.is_valid():
-            filters = DashboardFilters(
-                start_date=form.cleaned_data.get('start_date'),
-                end_date=form.cleaned_data.get('end_date'),
-                division_id=form.cleaned_data.get('division').id if form.cleaned_data.get('division') else None,
-                employee_id=form.cleaned_data.get('employee').id if form.cleaned_data.get('employee') else None,
-            )
-        else:
-            filters = DashboardFilters()
-        metrics = collect_dashboard_metrics(filters)
-        context.update(metrics)
-
-        chart_data = self._build_chart_data(metrics)
-        context['chart_data_json'] = json.dumps(chart_data, ensure_ascii=False)
-        context['filter_form'] = form
+        context['filter_form'] = self.get_filter_form()
         context['export_url'] = reverse('dashboard:export')
+        context['panel_urls'] = {panel: reverse('dashboard:panel', args=[panel]) for panel in DASHBOARD_PANELS}
         return context
 
-    @staticmethod
-    def _build_chart_data(metrics):
-        def to_float(value):
-            if isinstance(value, Decimal):
-                return float(value)
-            if value is None:
-                return 0.0
-            return float(value)
-
-        def to_text(value):
-            if value is None:
-                return ''
-            return str(value)
-
-        monthly_labels = []
-        monthly_recurring = []
-        monthly_one_time = []
-        monthly_requests = []
-
-        for row in metrics.get('monthly_totals', []):
-            month = row.get('month')
-            label = month.strftime('%Y-%m') if month else 'Без даты'
-            monthly_labels.append(label)
-            monthly_recurring.append(to_float(row.get('recurring', 0)))
-            monthly_one_time.append(to_float(row.get('one_time', 0)))
-            monthly_requests.append(to_float(row.get('requests', 0)))
-
-        def aggregate_entries(entries, limit, keys):
-            if not entries:
-                return entries
-            entries = sorted(entries, key=lambda item: item.get('total', 0), reverse=True)
-            if len(entries) <= limit:
-                return entries
-            top = entries[:limit]
-            rest = entries[limit:]
-            aggregated = {'label': 'Прочие', 'total': 0}
-            for key in keys:
-                aggregated[key] = 0
-            for entry in rest:
-                aggregated['total'] += entry.get('total', 0)
-                for key in keys:
-                    aggregated[key] += entry.get(key, 0)
-            return top + [aggregated]
-
-        division_entries = []
-        for entry in metrics.get('division_stats', []):
-            division = entry.get('division')
-            division_entries.append({
-                'label': to_text(getattr(division, 'name', 'Без подразделения')),
-                'total': to_float(entry.get('total', 0)),
-                'base': to_float(entry.get('total_salary', 0)),
-                'allowances': to_float(entry.get('allowances', 0)),
-                'recurring': to_float(entry.get('recurring', 0)),
-                'one_time': to_float(entry.get('one_time', 0)),
-                'requests': to_float(entry.get('requests', 0)),
-            })
-
-        division_entries = aggregate_entries(division_entries, limit=6, keys=['base', 'allowances', 'recurring', 'one_time', 'requests'])
-        division_labels = [entry['label'] for entry in division_entries]
-        division_totals = [entry['total'] for entry in division_entries]
-
-        employee_entries = []
-        for entry in metrics.get('employee_stats', []):
-            employee_entries.append({
-                'label': to_text(entry['employee'].full_name),
-                'total': to_float(entry.get('total', 0)),
-            })
-        employee_entries = aggregate_entries(employee_entries, limit=8, keys=[])
-        employee_labels = [entry['label'] for entry in employee_entries]
-        employee_totals = [entry['total'] for entry in employee_entries]
-
-        category_labels = []
-        category_average = []
-        category_target = []
-        for bench in metrics.get('benchmarks', []):
-            category_labels.append(to_text(bench.get('category')))
-            category_average.append(to_float(bench.get('average', 0)))
-            category_target.append(to_float(bench.get('target', 0)))
-
-        totals = metrics.get('totals', {})
-        totals_breakdown_values = [
-            to_float(totals.get('recurring', 0)),
-            to_float(totals.get('one_time', 0)),
-            to_float(totals.get('requests', 0)),
-        ]
-
-        return {
-            'monthly': {
-                'labels': monthly_labels,
-                'recurring': monthly_recurring,
-                'one_time': monthly_one_time,
-                'requests': monthly_requests,
-            },
-            'division': {
-                'labels': division_labels,
-                'totals': division_totals,
-            },
-            'employees': {
-                'labels': employee_labels,
-                'totals': employee_totals,
-            },
-            'division_breakdown': {
-                'labels': [entry['label'] for entry in division_entries],
-                'base': [entry.get('base', 0) for entry in division_entries],
-                'allowances': [entry.get('allowances', 0) for entry in division_entries],
-                'recurring': [entry.get('recurring', 0) for entry in division_entries],
-                'one_time': [entry.get('one_time', 0) for entry in division_entries],
-                'requests': [entry.get('requests', 0) for entry in division_entries],
-            },
-            'category': {
-                'labels': category_labels,
-                'average': category_average,
-                'target': category_target,
-            },
+
+def _to_float(value):
+    if value is None:
+        return 0.0
+    return float(value)
+
+
+def _to_text(value):
+    # Так же, как значение выводится в шаблоне ({{ value }})
+    if value is None:
+        return ''
+    return str(localize(value))
+
+
+def _aggregate_entries(entries, limit, keys):
+    if not entries:
+        return entries
+    entries = sorted(entries, key=lambda item: item.get('total', 0), reverse=True)
+    if len(entries) <= limit:
+        return entries
+    top = entries[:limit]
+    rest = entries[limit:]
+    aggregated = {'label': 'Прочие', 'total': 0}
+    for key in keys:
+        aggregated[key] = 0
+    for entry in rest:
+        aggregated['total'] += entry.get('total', 0)
+        for key in keys:
+            aggregated[key] += entry.get(key, 0)
+    return top + [aggregated]
+
+
+def _monthly_payload(data):
+    rows = []
+    chart = {'labels': [], 'recurring': [], 'one_time': [], 'requests': []}
+    for row in data['monthly_totals']:
+        month = row.get('month')
+        rows.append({
+            'month': date_format(month, 'Y-m') if month else '—',
+            'recurring': _to_text(row['recurring']),
+            'one_time': _to_text(row['one_time']),
+            'requests': _to_text(row['requests']),
+        })
+        chart['labels'].append(month.strftime('%Y-%m') if month else 'Без даты')
+        for key in ('recurring', 'one_time', 'requests'):
+            chart[key].append(_to_float(row[key]))
+
+    totals = data['totals']
+    return {
+        'rows': rows,
+        'totals': {key: _to_text(value) for key, value in totals.items()},
+        'charts': {
+            'monthly': chart,
             'totals_breakdown': {
                 'labels': ['Постоянные', 'Разовые', 'Заявки'],
-                'values': totals_breakdown_values,
+                'values': [_to_float(totals[key]) for key in ('recurring', 'one_time', 'requests')],
             },
-        }
+        },
+    }
+
 
+def _division_payload(data):
+    keys = ['base', 'allowances', 'recurring', 'one_time', 'requests']
+    rows = []
+    entries = []
+    for entry in data['division_stats']:
+        division = entry.get('division')
+        rows.append({
+            'division': division.name if division else '',
+            **{key: _to_text(entry[key]) for key in ('total_salary', 'allowances', 'recurring', 'one_time', 'requests', 'total')},
+        })
+        entries.append({
+            'label': str(getattr(division, 'name', 'Без подразделения')),
+            'total': _to_float(entry['total']),
+            'base': _to_float(entry['total_salary']),
+            **{key: _to_float(entry[key]) for key in keys[1:]},
+        })
+    entries = _aggregate_entries(entries, limit=6, keys=keys)
+    labels = [entry['label'] for entry in entries]
+    return {
+        'rows': rows,
+        'totals': {'employees': _to_text(data['employees_total'])},
+        'charts': {
+            'division': {'labels': labels, 'totals': [entry['total'] for entry in entries]},
+            'division_breakdown': {'labels': labels, **{key: [entry.get(key, 0) for entry in entries] for key in keys}},
+        },
+    }
 
-class DashboardExportView(LoginRequiredMixin, PermissionRequiredMixin, View):
+
+def _employee_payload(data):
+    rows = []
+    entries = []
+    for entry in data['employee_stats']:
+        division = entry.get('division')
+        rows.append({
+            'employee': entry['employee'].full_name,
+            'division': division.name if division else '',
+            **{key: _to_text(entry[key]) for key in ('base_salary', 'allowances', 'recurring', 'one_time', 'requests', 'total')},
+        })
+        entries.append({'label': entry['employee'].full_name, 'total': _to_float(entry['total'])})
+    entries = _aggregate_entries(entries, limit=8, keys=[])
+    return {
+        'rows': rows,
+        'charts': {
+            'employees': {
+                'labels': [entry['label'] for entry in entries],
+                'totals': [entry['total'] for entry in entries],
+            },
+        },
+    }
+
+
+def _benchmark_payload(data):
+    rows = []
+    chart = {'labels': [], 'average': [], 'target': []}
+    for bench in data['benchmarks']:
+        rows.append({
+            'category': str(bench['category']),
+            'average': _to_text(bench['average']),
+            'target': _to_text(bench['target']),
+            'delta': ('+' if bench['delta'] >= 0 else '') + _to_text(bench['delta']),
+        })
+        chart['labels'].append(str(bench['category']))
+        chart['average'].append(_to_float(bench['average']))
+        chart['target'].append(_to_float(bench['target']))
+    return {'rows': rows, 'charts': {'category': chart}}
+
+
+def _allocation_payload(data):
+    rows = []
+    for allocation in data['budget_allocations']:
+        if allocation.recurring_period_id:
+            target = {
+                'label': str(allocation.recurring_period),
+                'url': reverse('recurring_payments:period-detail', args=[allocation.recurring_period_id]),
+            }
+        elif allocation.campaign_id:
+            target = {
+                'label': allocation.campaign.name,
+                'url': reverse('one_time_payments:campaign-detail', args=[allocation.campaign_id]),
+            }
+        else:
+            target = {'label': '—', 'url': ''}
+        rows.append({
+            'created_at': date_format(timezone.localtime(allocation.created_at), 'd.m.Y'),
+            'budget': str(allocation.budget),
+            'target': target,
+            'allocated_amount': _to_text(allocation.allocated_amount),
+            'reserved_amount': _to_text(allocation.reserved_amount),
+            'spent_amount': _to_text(allocation.spent_amount),
+        })
+    return {'rows': rows}
+
+
+# Панель -> функция, превращающая данные панели в JSON для страницы
+PANEL_PAYLOADS = {
+    'monthly': _monthly_payload,
+    'divisions': _division_payload,
+    'employees': _employee_payload,
+    'benchmarks': _benchmark_payload,
+    'allocations': _allocation_payload,
+}
+
+
+class DashboardPanelView(LoginRequiredMixin, PermissionRequiredMixin, DashboardFiltersMixin, View):
+    """
+    JSON одной панели дэшборда. ETag — версии данных дэшборда и настроек: пока они не менялись,
+    повторный запрос с теми же фильтрами получает 304 без обращения к кешу и расчётов.
+    """
+
+    permission_required = 'dashboard.view_dashboard'
+
+    def get(self, request, panel, *args, **kwargs):
+        if panel not in DASHBOARD_PANELS:
+            raise Http404('Неизвестная панель дэшборда')
+        version = get_data_version()
+        etag = quote_etag(f'{panel}-{version}-{setting_store.version}')
+
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            not_modified['ETag'] = etag
+            return not_modified
+
+        data = get_dashboard_panel(panel, self.get_filters(), version=version)
+        response = JsonResponse(PANEL_PAYLOADS[panel](data), json_dumps_params={'ensure_ascii': False})
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Cookie'])
+        return response
+
+
+class DashboardExportView(LoginRequiredMixin, PermissionRequiredMixin, DashboardFiltersMixin, View):
     permission_required = 'dashboard.view_dashboard'
 
     def get(self, request, *args, **kwargs):
-        form = DashboardFilterForm(request.GET or None)
-        if form.is_valid():
-            filters = DashboardFilters(
-                start_date=form.cleaned_data.get('start_date'),
-                end_date=form.cleaned_data.get('end_date'),
-                division_id=form.cleaned_data.get('division').id if form.cleaned_data.get('division') else None,
-                employee_id=form.cleaned_data.get('employee').id if form.cleaned_data.get('employee') else None,
-            )
-        else:
-            filters = DashboardFilters()
-        metrics = collect_dashboard_metrics(filters)
+        metrics = get_dashboard_panel('monthly', self.get_filters())
 
         response = HttpResponse(content_type='text/csv; charset=utf-8')
         timestamp = datetime.now().strftime('%Y%m%d_%H%M')
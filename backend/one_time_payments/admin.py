@@ -2,6 +2,8 @@ from django.contrib import admin
 from django.contrib import messages
 from django.db import transaction
 
+from stimuli.search import EmployeeSearchAdminMixin
+
 from .models import OneTimePayment, RequestCampaign
 
 
@@ -82,9 +84,10 @@ class RequestCampaignAdmin(admin.ModelAdmin):
 
 
 @admin.register(OneTimePayment)
-class OneTimePaymentAdmin(admin.ModelAdmin):
+class OneTimePaymentAdmin(EmployeeSearchAdminMixin, admin.ModelAdmin):
     list_display = ('employee', 'amount', 'payment_date', 'campaign', 'created_by')
     list_filter = ('payment_date', 'campaign')
-    search_fields = ('employee__full_name', 'justification')
+    search_fields = ('justification',)
+    employee_search_path = 'employee'
     autocomplete_fields = ('employee', 'campaign', 'created_by')
     readonly_fields = ('created_at', 'updated_at')
@@ -1,11 +1,13 @@
 from __future__ import annotations
 
 from datetime import date
+from decimal import Decimal
 from typing import Optional
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import models, transaction
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 
@@ -24,6 +26,34 @@ class RequestCampaignQuerySet(models.QuerySet):
         """
         return self.active().order_by('-opens_at', 'name').first()
 
+    def with_request_summary(self) -> 'RequestCampaignQuerySet':
+        """
+        Аннотирует каждую кампанию количеством и суммой заявок по корзинам статусов
+        (requests_<корзина>_count / requests_<корзина>_amount) и числом разовых выплат.
+        """
+        from stimuli.models import StimulusRequest
+
+        annotations = {}
+        for bucket, condition in StimulusRequest.objects.summary_conditions('stimulus_requests__').items():
+            annotations[f'requests_{bucket}_count'] = models.Count('stimulus_requests', filter=condition)
+            annotations[f'requests_{bucket}_amount'] = Coalesce(
+                models.Sum('stimulus_requests__amount', filter=condition),
+                models.Value(Decimal('0')),
+                output_field=models.DecimalField(max_digits=14, decimal_places=2),
+            )
+        manual_payments_count = (
+            OneTimePayment.objects.filter(campaign=models.OuterRef('pk'))
+            .order_by()
+            .values('campaign')
+            .annotate(total=models.Count('pk'))
+            .values('total')
+        )
+        annotations['manual_payments_count'] = Coalesce(
+            models.Subquery(manual_payments_count, output_field=models.IntegerField()),
+            models.Value(0),
+        )
+        return self.annotate(**annotations)
+
 
 class RequestCampaign(models.Model):
     class Status(models.TextChoices):
@@ -111,78 +141,72 @@ class RequestCampaign(models.Model):
             raise ValidationError('В архив можно отправить только закрытую кампанию.')
         
         with transaction.atomic():
-            from stimuli.models import StimulusRequest  # локальный импорт во избежание циклов
+            # локальный импорт во избежание циклов
+            from stimuli.hooks import requests_bulk_updated
+            from stimuli.models import StimulusRequest
+            from stimuli.services import schedule_employee_totals_recompute
+
             base_qs = StimulusRequest.objects.filter(campaign=self)
             
             # Проверяем, что все заявки рассмотрены (одобрены или отклонены)
-            pending_requests = base_qs.filter(status=StimulusRequest.Status.PENDING)
-            if pending_requests.exists():
+            pending_count = base_qs.filter(status=StimulusRequest.Status.PENDING).count()
+            if pending_count:
                 raise ValidationError(
                     f'Нельзя архивировать кампанию: есть нерассмотренные заявки '
-                    f'({pending_requests.count()} шт.). Все заявки должны быть одобрены или отклонены.'
+                    f'({pending_count} шт.). Все заявки должны быть одобрены или отклонены.'
                 )
             
-            # Сохраняем итоговый статус для каждой заявки при архивировании
-            for request in base_qs:
-                final_status = f"{request.get_status_display()} (Архив)"
-                request.final_status = final_status
-                request.status = StimulusRequest.Status.ARCHIVED
-                request.archived_at = timezone.now()
-                request.save(update_fields=['final_status', 'status', 'archived_at'])
-            
+            # Сохраняем итоговый статус всех заявок одним UPDATE
+            active_qs = base_qs.exclude(status=StimulusRequest.Status.ARCHIVED)
+            employee_ids = set(active_qs.order_by().values_list('employee_id', flat=True).distinct())
+            final_status = models.Case(
+                *[
+                    models.When(status=value, then=models.Value(f'{label} (Архив)'))
+                    for value, label in StimulusRequest.Status.choices
+                    if value != StimulusRequest.Status.ARCHIVED
+                ],
+                default=models.F('final_status'),
+                output_field=models.CharField(),
+            )
+            final_outcome = models.Case(
+                models.When(status=StimulusRequest.Status.APPROVED, then=models.Value(StimulusRequest.Outcome.APPROVED)),
+                models.When(status=StimulusRequest.Status.REJECTED, then=models.Value(StimulusRequest.Outcome.REJECTED)),
+                default=models.Value(''),
+                output_field=models.CharField(),
+            )
+            now = timezone.now()
+            active_qs.update(
+                final_status=final_status,
+                final_outcome=final_outcome,
+                status=StimulusRequest.Status.ARCHIVED,
+                archived_at=now,
+            )
+            # UPDATE не отправляет post_save заявок: итоги пересчитываются здесь,
+            # факты и версия данных дэшборда — подписчиками requests_bulk_updated
+            schedule_employee_totals_recompute(employee_ids)
+            requests_bulk_updated.send(sender=StimulusRequest, employee_ids=employee_ids)
+
             # Архивируем саму кампанию
             self.status = self.Status.ARCHIVED
-            self.archived_at = timezone.now()
+            self.archived_at = now
             self.save(update_fields=['status', 'archived_at'])
 
     def get_requested_amounts_summary(self) -> dict:
         """
         Возвращает сводку по запрошенным средствам в разрезе статусов.
+        Использует аннотации with_request_summary(), если они есть, иначе один aggregate().
         """
-        from decimal import Decimal
-        from django.db.models import Sum, Q
         from stimuli.models import StimulusRequest
-        
-        base_qs = StimulusRequest.objects.filter(campaign=self)
-        
-        # Подсчитываем суммы по каждому статусу
-        pending_sum = base_qs.filter(status=StimulusRequest.Status.PENDING).aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0')
-        
-        # Для одобренных: включаем и текущие approved, и архивированные с пометкой "Одобрено"
-        approved_sum = base_qs.filter(
-            Q(status=StimulusRequest.Status.APPROVED) |
-            Q(status=StimulusRequest.Status.ARCHIVED, final_status__icontains='Одобрено')
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
-        
-        # Для отклоненных: включаем и текущие rejected, и архивированные с пометкой "Отклонено"
-        rejected_sum = base_qs.filter(
-            Q(status=StimulusRequest.Status.REJECTED) |
-            Q(status=StimulusRequest.Status.ARCHIVED, final_status__icontains='Отклонено')
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
-        
-        # Общая сумма всех заявок
-        total_sum = base_qs.aggregate(total=Sum('amount'))['total'] or Decimal('0')
-        
-        # Считаем количество заявок по статусам
-        pending_count = base_qs.filter(status=StimulusRequest.Status.PENDING).count()
-        approved_count = base_qs.filter(
-            Q(status=StimulusRequest.Status.APPROVED) |
-            Q(status=StimulusRequest.Status.ARCHIVED, final_status__icontains='Одобрено')
-        ).count()
-        rejected_count = base_qs.filter(
-            Q(status=StimulusRequest.Status.REJECTED) |
-            Q(status=StimulusRequest.Status.ARCHIVED, final_status__icontains='Отклонено')
-        ).count()
-        total_count = base_qs.count()
-        
-        return {
-            'pending': {'amount': pending_sum, 'count': pending_count},
-            'approved': {'amount': approved_sum, 'count': approved_count},
-            'rejected': {'amount': rejected_sum, 'count': rejected_count},
-            'total': {'amount': total_sum, 'count': total_count},
-        }
+
+        if hasattr(self, 'requests_total_count'):
+            return {
+                bucket: {
+                    'amount': getattr(self, f'requests_{bucket}_amount'),
+                    'count': getattr(self, f'requests_{bucket}_count'),
+                }
+                for bucket in StimulusRequest.objects.summary_conditions()
+            }
+        return StimulusRequest.objects.filter(campaign=self).amounts_summary()
 
 
 class OneTimePayment(models.Model):
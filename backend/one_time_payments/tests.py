@@ -1,3 +1,85 @@
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
 from django.test import TestCase
 
-# Create your tests here.
+from staffing.models import Division, Position
+from stimuli.models import Employee, StimulusRequest
+
+from .models import RequestCampaign
+
+
+class CampaignArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('manager')
+        division = Division.objects.create(name='Кафедра')
+        position = Position.objects.create(name='Доцент', base_salary=Decimal('50000'))
+        cls.employees = [
+            Employee.objects.create(
+                full_name=full_name, division=division, position=position, category=Employee.Category.PPS,
+            )
+            for full_name in ('Иванов', 'Петров')
+        ]
+        cls.campaign = RequestCampaign.objects.create(
+            name='Январь', status=RequestCampaign.Status.CLOSED, opens_at=date(2026, 1, 1),
+        )
+        # Отложенные пересчёты выполняются здесь, а не остаются в транзакции класса до конца тестов
+        with cls.captureOnCommitCallbacks(execute=True):
+            for employee, amount, status in (
+                (cls.employees[0], 100, StimulusRequest.Status.APPROVED),
+                (cls.employees[0], 20, StimulusRequest.Status.REJECTED),
+                (cls.employees[1], 70, StimulusRequest.Status.APPROVED),
+            ):
+                StimulusRequest.objects.create(
+                    campaign=cls.campaign,
+                    employee=employee,
+                    requested_by=cls.user,
+                    amount=Decimal(amount),
+                    justification='Обоснование',
+                    status=status,
+                )
+
+    def test_archive_moves_requests_and_recomputes_totals(self):
+        self.assertEqual(Employee.objects.get(full_name='Иванов').payment, Decimal('100'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.campaign.archive()
+
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.status, RequestCampaign.Status.ARCHIVED)
+        requests = self.campaign.stimulus_requests.order_by('amount')
+        self.assertEqual(
+            list(requests.values_list('status', 'final_status')),
+            [
+                (StimulusRequest.Status.ARCHIVED, 'Отклонено (Архив)'),
+                (StimulusRequest.Status.ARCHIVED, 'Одобрено (Архив)'),
+                (StimulusRequest.Status.ARCHIVED, 'Одобрено (Архив)'),
+            ],
+        )
+        self.assertFalse(requests.filter(archived_at__isnull=True).exists())
+        # Архивные заявки не входят в текущие выплаты сотрудников
+        self.assertEqual(set(Employee.objects.values_list('payment', flat=True)), {Decimal('0')})
+
+    def test_archive_sets_final_outcome(self):
+        self.campaign.archive()
+
+        outcomes = sorted(self.campaign.stimulus_requests.values_list('amount', 'final_outcome'))
+        self.assertEqual(outcomes, [
+            (Decimal('20'), StimulusRequest.Outcome.REJECTED),
+            (Decimal('70'), StimulusRequest.Outcome.APPROVED),
+            (Decimal('100'), StimulusRequest.Outcome.APPROVED),
+        ])
+        requests = StimulusRequest.objects.for_campaign(self.campaign.pk)
+        self.assertEqual(requests.approved().count(), 2)
+        self.assertEqual(requests.rejected().count(), 1)
+
+    def test_pending_requests_block_archive(self):
+        StimulusRequest.objects.filter(amount=Decimal('20')).update(status=StimulusRequest.Status.PENDING)
+        with self.assertRaises(ValidationError):
+            self.campaign.archive()
+        self.assertFalse(self.campaign.stimulus_requests.archived().exists())
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.status, RequestCampaign.Status.CLOSED)
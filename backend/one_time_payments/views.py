@@ -6,21 +6,18 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.core.exceptions import ValidationError
 from django.db import transaction
-from django.db.models import Prefetch, Q, Sum
-from django.http import HttpResponse
+from django.db.models import Prefetch
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse, reverse_lazy
 from django.utils import timezone
 from django.views import View, generic
-from openpyxl import Workbook
-from openpyxl.styles import Alignment, Font, PatternFill
-from openpyxl.utils import get_column_letter
 
 from stimuli.models import StimulusRequest, Employee
-from stimuli.views import SortingMixin, resolve_sorting
+from stimuli.views import SortingMixin, resolve_sorting_params
 from stimuli.forms import StimulusRequestStatusForm
 from stimuli.filters import CampaignStimulusRequestFilter
-from stimuli.services import recompute_employee_totals
+from stimuli.exports import ExportPlan, filterset_rows, get_export_format, iterate_queryset
+from stimuli.services import approve_pending_requests, schedule_employee_totals_recompute
 from staffing.models import Division
 
 from .forms import OneTimePaymentForm, RequestCampaignForm, RequestCampaignStatusForm
@@ -35,7 +32,7 @@ class RequestCampaignListView(LoginRequiredMixin, PermissionRequiredMixin, gener
     permission_required = 'one_time_payments.view_requestcampaign'
 
     def get_queryset(self):
-        queryset = RequestCampaign.objects.all().order_by('-opens_at', 'name')
+        queryset = RequestCampaign.objects.with_request_summary().order_by('-opens_at', 'name')
         status = self.request.GET.get('status')
         if status:
             queryset = queryset.filter(status=status)
@@ -86,10 +83,7 @@ def aggregate_approved_requests(
     if qs is None:
         qs = StimulusRequest.objects.filter(campaign=campaign)
     qs = qs.select_related('employee', 'employee__division', 'employee__position', 'requested_by')
-    approved_qs = qs.filter(
-        Q(status=StimulusRequest.Status.APPROVED) |
-        Q(status=StimulusRequest.Status.ARCHIVED, final_status__icontains='Одобрено')
-    )
+    approved_qs = qs.approved()
     if employee_ids:
         approved_qs = approved_qs.filter(employee_id__in=employee_ids)
     if division_ids:
@@ -107,7 +101,7 @@ def aggregate_approved_requests(
         'earliest_created_at': None,
     })
 
-    for request in approved_qs:
+    for request in iterate_queryset(approved_qs):
         employee_id = request.employee.id
         grouped_requests[employee_id]['employee'] = request.employee
         grouped_requests[employee_id]['total_amount'] += request.amount
@@ -363,10 +357,7 @@ class RequestCampaignDetailView(SortingMixin, LoginRequiredMixin, PermissionRequ
         context['approved_requests'] = approved_requests
         
         # Формируем списки опций для фильтров одобренных заявок (только из одобренных)
-        approved_only_qs = base_requests_qs.filter(
-            Q(status=StimulusRequest.Status.APPROVED) |
-            Q(status=StimulusRequest.Status.ARCHIVED, final_status__icontains='Одобрено')
-        )
+        approved_only_qs = base_requests_qs.approved()
         
         # Опции сотрудников для фильтра одобренных заявок
         approved_employee_ids_for_options = [
@@ -442,29 +433,8 @@ class RequestCampaignDetailView(SortingMixin, LoginRequiredMixin, PermissionRequ
         context['approved_reset_url'] = self._build_query(exclude=['approved_employees', 'approved_divisions', 'approved_responsible'])
         
         # Добавляем сводку по запрошенным средствам, чувствительную к текущим фильтрам
-        # Считаем по уже отфильтрованному набору заявок (filtered_requests)
-        pending_qs = filtered_requests.filter(status=StimulusRequest.Status.PENDING)
-        approved_qs = filtered_requests.filter(
-            Q(status=StimulusRequest.Status.APPROVED) |
-            Q(status=StimulusRequest.Status.ARCHIVED, final_status__icontains='Одобрено')
-        )
-        rejected_qs = filtered_requests.filter(
-            Q(status=StimulusRequest.Status.REJECTED) |
-            Q(status=StimulusRequest.Status.ARCHIVED, final_status__icontains='Отклонено')
-        )
-        total_qs = filtered_requests
-
-        pending_sum = pending_qs.aggregate(total=Sum('amount'))['total'] or 0
-        approved_sum = approved_qs.aggregate(total=Sum('amount'))['total'] or 0
-        rejected_sum = rejected_qs.aggregate(total=Sum('amount'))['total'] or 0
-        total_sum = total_qs.aggregate(total=Sum('amount'))['total'] or 0
-
-        context['amounts_summary'] = {
-            'pending': {'amount': pending_sum, 'count': pending_qs.count()},
-            'approved': {'amount': approved_sum, 'count': approved_qs.count()},
-            'rejected': {'amount': rejected_sum, 'count': rejected_qs.count()},
-            'total': {'amount': total_sum, 'count': total_qs.count()},
-        }
+        # Считаем по уже отфильтрованному набору заявок (filtered_requests) одним запросом
+        context['amounts_summary'] = filtered_requests.amounts_summary()
 
         return context
 
@@ -507,10 +477,10 @@ class ManualStimulusStatusUpdateView(LoginRequiredMixin, PermissionRequiredMixin
         form = StimulusRequestStatusForm(request.POST, instance=stimulus)
         if form.is_valid():
             previous_employee_id = stimulus.employee_id
-            updated_request = form.save()
-            recompute_employee_totals(updated_request.employee_id)
-            if previous_employee_id != updated_request.employee_id:
-                recompute_employee_totals(previous_employee_id)
+            with transaction.atomic():
+                updated_request = form.save()
+                if previous_employee_id != updated_request.employee_id:
+                    schedule_employee_totals_recompute([previous_employee_id])
             messages.success(request, 'Статус заявки обновлён.')
         else:
             messages.error(request, 'Не удалось обновить заявку.')
@@ -522,30 +492,12 @@ class CampaignApprovePendingRequestsView(LoginRequiredMixin, PermissionRequiredM
 
     def post(self, request, *args, **kwargs):
         campaign = get_object_or_404(RequestCampaign, pk=kwargs['pk'])
-        pending_requests = StimulusRequest.objects.filter(
-            campaign=campaign,
-            status=StimulusRequest.Status.PENDING,
-        ).select_related('employee')
+        updated_count = approve_pending_requests(campaign)
 
-        if not pending_requests.exists():
+        if not updated_count:
             messages.info(request, 'Нет заявок на рассмотрении для одобрения.')
             return redirect('one_time_payments:campaign-detail', pk=campaign.pk)
 
-        updated_count = 0
-        affected_employee_ids = set()
-
-        with transaction.atomic():
-            for stimulus in pending_requests:
-                if stimulus.status != StimulusRequest.Status.PENDING:
-                    continue
-                stimulus.status = StimulusRequest.Status.APPROVED
-                stimulus.save(update_fields=['status', 'updated_at'])
-                affected_employee_ids.add(stimulus.employee_id)
-                updated_count += 1
-
-        for employee_id in affected_employee_ids:
-            recompute_employee_totals(employee_id)
-
         messages.success(request, f'Одобрено заявок: {updated_count}.')
         return redirect('one_time_payments:campaign-detail', pk=campaign.pk)
 
@@ -649,18 +601,30 @@ class ManualPaymentDeleteView(LoginRequiredMixin, PermissionRequiredMixin, gener
 
 
 class CampaignApprovedRequestsExportView(LoginRequiredMixin, PermissionRequiredMixin, View):
-    """Экспорт одобренных заявок кампании в Excel"""
+    """Экспорт одобренных заявок кампании в Excel, CSV или NDJSON (параметр ?format=)"""
     permission_required = 'one_time_payments.view_requestcampaign'
 
-    def get(self, request, *args, **kwargs):
+    columns = [
+        ('employee', 'ФИО сотрудника'),
+        ('division', 'Подразделение'),
+        ('position', 'Должность'),
+        ('total_amount', 'Итоговая сумма'),
+        ('justification', 'Обоснование'),
+        ('requesters', 'Ответственные'),
+        ('admin_comment', 'Комментарий'),
+        ('created_at', 'Дата создания'),
+    ]
+
+    @classmethod
+    def build_export(cls, user, params, object_id=None):
         campaign = get_object_or_404(
             RequestCampaign,
-            pk=kwargs['pk']
+            pk=object_id
         )
-        
+
         # Получаем одобренные заявки кампании
         # Включаем как текущие одобренные, так и одобренные до архивирования
-        approved_employee_values = request.GET.getlist('approved_employees')
+        approved_employee_values = params.getlist('approved_employees')
         approved_employee_ids = []
         for value in approved_employee_values:
             if value == '__all__':
@@ -670,7 +634,7 @@ class CampaignApprovedRequestsExportView(LoginRequiredMixin, PermissionRequiredM
             except (TypeError, ValueError):
                 continue
 
-        approved_division_values = request.GET.getlist('approved_divisions')
+        approved_division_values = params.getlist('approved_divisions')
         approved_division_ids = []
         for value in approved_division_values:
             if value == '__all__':
@@ -680,7 +644,7 @@ class CampaignApprovedRequestsExportView(LoginRequiredMixin, PermissionRequiredM
             except (TypeError, ValueError):
                 continue
 
-        approved_responsible_values = request.GET.getlist('approved_responsible')
+        approved_responsible_values = params.getlist('approved_responsible')
         approved_responsible_ids = []
         for value in approved_responsible_values:
             if value == '__all__':
@@ -706,117 +670,80 @@ class CampaignApprovedRequestsExportView(LoginRequiredMixin, PermissionRequiredM
             responsible_ids=approved_responsible_ids,
         )
 
-        # Создаем Excel файл
-        workbook = Workbook()
-        sheet = workbook.active
-        sheet.title = 'Одобренные заявки'
-        
-        # Заголовки
-        headers = [
-            'ФИО сотрудника',
-            'Подразделение',
-            'Должность',
-            'Итоговая сумма',
-            'Обоснование',
-            'Ответственные',
-            'Комментарий',
-            'Дата создания'
-        ]
-        sheet.append(headers)
-        
-        # Стили для заголовков
-        from openpyxl.styles import Font, PatternFill
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        
-        for cell in sheet[1]:
-            cell.font = header_font
-            cell.fill = header_fill
-        
-        # Данные
-        for item in approved_requests_grouped:
-            sheet.append([
+        rows = (
+            [
                 item['employee'].full_name,
                 item['employee'].division.name if item['employee'].division else '',
                 item['employee'].position.name if item['employee'].position else '',
-                float(item['total_amount']),
+                item['total_amount'],
                 item['justification'],
                 item['requesters'],
                 item['admin_comment'] or '',
-                item['created_at'].strftime('%d.%m.%Y %H:%M')
-            ])
-        
-        # Автоматическая ширина столбцов
-        for idx, column in enumerate(sheet.columns, start=1):
-            max_length = max(
-                len(str(cell.value)) if cell.value is not None else 0 
-                for cell in column
-            )
-            adjusted_width = max(10, min(max_length + 2, 50))
-            sheet.column_dimensions[get_column_letter(idx)].width = adjusted_width
-        sheet.auto_filter.ref = sheet.dimensions
-        sheet.freeze_panes = 'A2'
-
-        UserModel = get_user_model()
-        if approved_responsible_ids:
-            responsible_names = [
-                user.get_full_name() or user.username
-                for user in UserModel.objects.filter(id__in=approved_responsible_ids).order_by('last_name', 'first_name', 'username')
+                item['created_at'],
             ]
-        else:
-            responsible_names = []
-
-        if approved_employee_ids or approved_division_ids or approved_responsible_ids:
-            filters_sheet = workbook.create_sheet('Фильтры')
-            headers = ['Поле', 'Значение']
-            filters_sheet.append(headers)
-            header_font = Font(bold=True, color="FFFFFF")
-            header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-            for cell in filters_sheet[1]:
-                cell.font = header_font
-                cell.fill = header_fill
-                cell.alignment = Alignment(horizontal="center", vertical="center")
+            for item in approved_requests_grouped
+        )
+        timestamp = timezone.now().strftime('%Y%m%d_%H%M')
+        campaign_name_clean = "".join(c for c in campaign.name if c.isalnum() or c in (' ', '-', '_')).rstrip()
+        filename = f'campaign_{campaign_name_clean}_{timestamp}'
 
+        def filter_rows():
             if approved_employee_ids:
                 employee_names = list(
                     Employee.objects.filter(id__in=approved_employee_ids).order_by('full_name').values_list('full_name', flat=True)
                 )
-                filters_sheet.append(['Сотрудники', ', '.join(employee_names)])
+                yield ['Сотрудники', ', '.join(employee_names)]
             if approved_division_ids:
                 division_names = list(
                     Division.objects.filter(id__in=approved_division_ids).order_by('name').values_list('name', flat=True)
                 )
-                filters_sheet.append(['Подразделения', ', '.join(division_names)])
-            if responsible_names:
-                filters_sheet.append(['Ответственные', ', '.join(responsible_names)])
-
-            for column_cells in filters_sheet.columns:
-                max_length = max(len(str(cell.value)) if cell.value else 0 for cell in column_cells)
-                column_letter = get_column_letter(column_cells[0].column)
-                filters_sheet.column_dimensions[column_letter].width = min(max_length + 2, 50)
-        
-        # Сохраняем файл в ответ
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+                yield ['Подразделения', ', '.join(division_names)]
+            if approved_responsible_ids:
+                UserModel = get_user_model()
+                responsible_names = [
+                    user.get_full_name() or user.username
+                    for user in UserModel.objects.filter(id__in=approved_responsible_ids).order_by('last_name', 'first_name', 'username')
+                ]
+                if responsible_names:
+                    yield ['Ответственные', ', '.join(responsible_names)]
+
+        return ExportPlan(
+            filename,
+            cls.columns,
+            rows,
+            sheet_title='Одобренные заявки',
+            header_color='4472C4',
+            sheet_options={'min_width': 10, 'max_width': 50, 'freeze_header': True, 'auto_filter': True},
+            filter_rows=filter_rows,
+            filters_max_width=50,
         )
-        timestamp = timezone.now().strftime('%Y%m%d_%H%M')
-        campaign_name_clean = "".join(c for c in campaign.name if c.isalnum() or c in (' ', '-', '_')).rstrip()
-        response['Content-Disposition'] = f'attachment; filename="campaign_{campaign_name_clean}_{timestamp}.xlsx"'
-        
-        workbook.save(response)
-        return response
+
+    def get(self, request, *args, **kwargs):
+        return self.build_export(request.user, request.GET, kwargs['pk']).response(get_export_format(request))
 
 
 class CampaignRequestsExportView(LoginRequiredMixin, PermissionRequiredMixin, View):
-    """Экспорт всех заявок кампании в Excel."""
+    """Экспорт всех заявок кампании в Excel, CSV или NDJSON (параметр ?format=)."""
     permission_required = 'one_time_payments.view_requestcampaign'
 
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-    header_alignment = Alignment(horizontal="center", vertical="center")
-
-    def get(self, request, *args, **kwargs):
-        campaign = get_object_or_404(RequestCampaign, pk=kwargs['pk'])
+    columns = [
+        ('id', 'ID'),
+        ('created_at', 'Создано'),
+        ('employee', 'Сотрудник'),
+        ('division', 'Подразделение'),
+        ('position', 'Должность'),
+        ('amount', 'Размер выплаты'),
+        ('status', 'Статус'),
+        ('final_status', 'Итоговый статус'),
+        ('requested_by', 'Ответственный'),
+        ('justification', 'Обоснование'),
+        ('admin_comment', 'Комментарий администратора'),
+        ('archived_at', 'Дата архивации'),
+    ]
+
+    @classmethod
+    def build_export(cls, user, params, object_id=None):
+        campaign = get_object_or_404(RequestCampaign, pk=object_id)
         base_qs = StimulusRequest.objects.filter(campaign=campaign).select_related(
             'employee',
             'employee__division',
@@ -824,7 +751,9 @@ class CampaignRequestsExportView(LoginRequiredMixin, PermissionRequiredMixin, Vi
             'requested_by',
         )
 
-        params = request.GET.copy()
+        source_params = params
+        params = params.copy()
+        params.pop('format', None)
         for key in ('status', 'requested_by'):
             values = [value for value in params.getlist(key) if value != '__all__']
             if values:
@@ -834,7 +763,7 @@ class CampaignRequestsExportView(LoginRequiredMixin, PermissionRequiredMixin, Vi
 
         filterset = CampaignStimulusRequestFilter(params or None, queryset=base_qs)
         filtered_qs = filterset.qs
-        employee_values = request.GET.getlist('employees')
+        employee_values = source_params.getlist('employees')
         employee_filter_ids = []
         for value in employee_values:
             try:
@@ -844,7 +773,7 @@ class CampaignRequestsExportView(LoginRequiredMixin, PermissionRequiredMixin, Vi
         if employee_filter_ids:
             filtered_qs = filtered_qs.filter(employee_id__in=employee_filter_ids)
 
-        division_values = request.GET.getlist('divisions')
+        division_values = source_params.getlist('divisions')
         division_filter_ids = []
         for value in division_values:
             try:
@@ -863,116 +792,78 @@ class CampaignRequestsExportView(LoginRequiredMixin, PermissionRequiredMixin, Vi
                 responsible_filter_ids.append(int(value))
             except (TypeError, ValueError):
                 continue
-        _, _, ordering = resolve_sorting(
-            request,
+        _, _, ordering = resolve_sorting_params(
+            source_params,
             RequestCampaignDetailView.SORTABLE_FIELDS,
             RequestCampaignDetailView.DEFAULT_SORT_FIELD,
             RequestCampaignDetailView.DEFAULT_SORT_DIRECTION,
         )
         stimulus_requests = filtered_qs.order_by(*ordering)
 
-        workbook = Workbook()
-        sheet = workbook.active
-        sheet.title = 'Заявки кампании'
-
-        headers = [
-            'ID',
-            'Создано',
-            'Сотрудник',
-            'Подразделение',
-            'Должность',
-            'Размер выплаты',
-            'Статус',
-            'Итоговый статус',
-            'Ответственный',
-            'Обоснование',
-            'Комментарий администратора',
-            'Дата архивации',
-        ]
-        sheet.append(headers)
+        timestamp = timezone.now().strftime('%Y%m%d_%H%M')
+        campaign_name_clean = "".join(
+            c for c in campaign.name if c.isalnum() or c in (' ', '-', '_')
+        ).strip()
+        filename = f'campaign_{campaign_name_clean}_requests_{timestamp}'
 
-        for cell in sheet[1]:
-            cell.font = self.header_font
-            cell.fill = self.header_fill
-            cell.alignment = self.header_alignment
+        def filter_rows():
+            if not params:
+                return []
+            extra_filter_rows = []
+            if employee_filter_ids:
+                employee_names = list(
+                    Employee.objects.filter(id__in=employee_filter_ids).order_by('full_name').values_list('full_name', flat=True)
+                )
+                extra_filter_rows.append(('Сотрудники', ', '.join(employee_names)))
+            if division_filter_ids:
+                division_names = list(
+                    Division.objects.filter(id__in=division_filter_ids).order_by('name').values_list('name', flat=True)
+                )
+                extra_filter_rows.append(('Подразделения', ', '.join(division_names)))
+
+            if status_filter_values:
+                extra_filter_rows.append(('Статусы', ', '.join(str(status_map[value]) for value in status_filter_values)))
+            if responsible_filter_ids:
+                UserModel = get_user_model()
+                responsible_names = [
+                    user.get_full_name() or user.username
+                    for user in UserModel.objects.filter(id__in=responsible_filter_ids).order_by('last_name', 'first_name', 'username')
+                ]
+                extra_filter_rows.append(('Ответственные', ', '.join(responsible_names)))
+
+            rows = list(filterset_rows(filterset))
+            if extra_filter_rows:
+                rows.append(('', ''))
+                rows.extend(extra_filter_rows)
+            return rows
+
+        return ExportPlan(
+            filename,
+            cls.columns,
+            cls._iter_rows(stimulus_requests),
+            sheet_title='Заявки кампании',
+            header_color='4472C4',
+            sheet_options={'freeze_header': True, 'auto_filter': True},
+            filter_rows=filter_rows,
+        )
 
-        for stimulus in stimulus_requests:
-            sheet.append([
+    def get(self, request, *args, **kwargs):
+        return self.build_export(request.user, request.GET, kwargs['pk']).response(get_export_format(request))
+
+    @staticmethod
+    def _iter_rows(stimulus_requests):
+        for stimulus in iterate_queryset(stimulus_requests):
+            yield [
                 stimulus.pk,
-                stimulus.created_at.strftime('%d.%m.%Y %H:%M') if stimulus.created_at else '',
+                stimulus.created_at,
                 stimulus.employee.full_name,
                 stimulus.employee.division.name if stimulus.employee and stimulus.employee.division else '',
                 stimulus.employee.position.name if stimulus.employee and stimulus.employee.position else '',
-                float(stimulus.amount) if stimulus.amount is not None else '',
+                stimulus.amount,
                 stimulus.get_status_display(),
                 stimulus.final_status or '',
                 stimulus.requested_by.get_full_name() or stimulus.requested_by.username,
                 stimulus.justification,
                 stimulus.admin_comment,
-                stimulus.archived_at.strftime('%d.%m.%Y %H:%M') if stimulus.archived_at else '',
-            ])
-
-        self._autosize_columns(sheet)
-        sheet.auto_filter.ref = sheet.dimensions
-        sheet.freeze_panes = 'A2'
-
-        extra_filter_rows = []
-        if employee_filter_ids:
-            employee_names = list(
-                Employee.objects.filter(id__in=employee_filter_ids).order_by('full_name').values_list('full_name', flat=True)
-            )
-            extra_filter_rows.append(('Сотрудники', ', '.join(employee_names)))
-        if division_filter_ids:
-            division_names = list(
-                Division.objects.filter(id__in=division_filter_ids).order_by('name').values_list('name', flat=True)
-            )
-            extra_filter_rows.append(('Подразделения', ', '.join(division_names)))
-
-        if status_filter_values:
-            extra_filter_rows.append(('Статусы', ', '.join(status_map[value] for value in status_filter_values)))
-        if responsible_filter_ids:
-            UserModel = get_user_model()
-            responsible_names = [
-                user.get_full_name() or user.username
-                for user in UserModel.objects.filter(id__in=responsible_filter_ids).order_by('last_name', 'first_name', 'username')
+                stimulus.archived_at,
             ]
-            extra_filter_rows.append(('Ответственные', ', '.join(responsible_names)))
-
-        if filterset is not None and params:
-            filters_sheet = workbook.create_sheet("Фильтры")
-            self._write_filters_sheet(filters_sheet, filterset)
-            if extra_filter_rows:
-                filters_sheet.append(['', ''])
-                for label, value in extra_filter_rows:
-                    filters_sheet.append([label, value])
-                self._autosize_columns(filters_sheet)
-
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        timestamp = timezone.now().strftime('%Y%m%d_%H%M')
-        campaign_name_clean = "".join(
-            c for c in campaign.name if c.isalnum() or c in (' ', '-', '_')
-        ).strip()
-        response['Content-Disposition'] = (
-            f'attachment; filename="campaign_{campaign_name_clean}_requests_{timestamp}.xlsx"'
-        )
-
-        workbook.save(response)
-        return response
-
-    def _autosize_columns(self, worksheet):
-        for column_cells in worksheet.columns:
-            max_length = 0
-            column_letter = get_column_letter(column_cells[0].column)
-            for cell in column_cells:
-                value = cell.value
-                if value is None:
-                    continue
-                try:
-                    length = len(str(value))
-                except (TypeError, ValueError):
-                    length = 0
-                if length > max_length:
-                    max_length = length
-            worksheet.column_dimensions[column_letter].width = min(max_length + 2, 60)
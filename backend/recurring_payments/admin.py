@@ -1,5 +1,7 @@
 from django.contrib import admin
 
+from stimuli.search import EmployeeSearchAdminMixin
+
 from .models import RecurringPayment, RecurringPaymentLog, RecurringPeriod
 
 
@@ -27,19 +29,21 @@ class RecurringPaymentLogInline(admin.TabularInline):
 
 
 @admin.register(RecurringPayment)
-class RecurringPaymentAdmin(admin.ModelAdmin):
+class RecurringPaymentAdmin(EmployeeSearchAdminMixin, admin.ModelAdmin):
     list_display = ('period', 'employee', 'amount', 'reason', 'is_locked', 'updated_at')
     list_filter = ('period__status', 'is_locked')
-    search_fields = ('employee__full_name', 'reason', 'description')
+    search_fields = ('reason', 'description')
+    employee_search_path = 'employee'
     autocomplete_fields = ('period', 'employee')
     inlines = [RecurringPaymentLogInline]
     readonly_fields = ('created_at', 'updated_at')
 
 
 @admin.register(RecurringPaymentLog)
-class RecurringPaymentLogAdmin(admin.ModelAdmin):
+class RecurringPaymentLogAdmin(EmployeeSearchAdminMixin, admin.ModelAdmin):
     list_display = ('payment', 'changed_at', 'changed_by', 'previous_amount', 'new_amount')
     list_filter = ('changed_at', 'changed_by')
-    search_fields = ('payment__employee__full_name', 'reason')
+    search_fields = ('reason',)
+    employee_search_path = 'payment__employee'
     autocomplete_fields = ('payment', 'changed_by')
     readonly_fields = ('changed_at',)
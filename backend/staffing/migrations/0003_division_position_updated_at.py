@@ -0,0 +1,26 @@
+# Generated manually
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("staffing", "0002_positionquota_occupied_fte_positionquota_vacant_fte_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="division",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name="Обновлено"),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="position",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name="Обновлено"),
+            preserve_default=False,
+        ),
+    ]
@@ -6,6 +6,7 @@ from django.db import models
 
 class Division(models.Model):
     name = models.CharField('Название подразделения', max_length=255, unique=True)
+    updated_at = models.DateTimeField('Обновлено', auto_now=True)
 
     class Meta:
         ordering = ['name']
@@ -19,6 +20,7 @@ class Division(models.Model):
 class Position(models.Model):
     name = models.CharField('Название должности', max_length=255, unique=True)
     base_salary = models.DecimalField('Оклад', max_digits=12, decimal_places=2, default=Decimal('0'))
+    updated_at = models.DateTimeField('Обновлено', auto_now=True)
 
     class Meta:
         ordering = ['name']
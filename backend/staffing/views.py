@@ -1,15 +1,14 @@
-from openpyxl import Workbook
-from openpyxl.utils import get_column_letter
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.db import transaction
 from django.db.models import Prefetch
-from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse, reverse_lazy
 from django.utils import timezone
 from django.views import generic, View
 
+from stimuli.exports import EXPORT_FORMAT_XLSX, ExportPlan
+
 from .forms import PositionQuotaForm, PositionQuotaVersionForm
 from .models import Division, PositionQuota, PositionQuotaVersion
 
@@ -132,39 +131,39 @@ class PositionQuotaDeleteView(LoginRequiredMixin, PermissionRequiredMixin, gener
 class PositionQuotaExportView(LoginRequiredMixin, PermissionRequiredMixin, View):
     permission_required = 'staffing.view_positionquota'
 
-    def get(self, request, *args, **kwargs):
-        workbook = Workbook()
-        sheet = workbook.active
-        sheet.title = 'Штатное расписание'
-        header = ['Подразделение', 'Должность', 'Всего ставок', 'Занятые', 'Вакантные', 'Комментарий', 'Дата актуальности']
-        sheet.append(header)
+    columns = ['Подразделение', 'Должность', 'Всего ставок', 'Занятые', 'Вакантные', 'Комментарий', 'Дата актуальности']
 
+    @classmethod
+    def build_export(cls, user, params, object_id=None):
         version_prefetch = Prefetch(
             'versions',
             queryset=PositionQuotaVersion.objects.order_by('-effective_from', '-created_at')
         )
         quotas_qs = PositionQuota.objects.select_related('position', 'division').prefetch_related(version_prefetch).order_by('division__name', 'position__name')
 
-        for quota in quotas_qs:
-            versions = list(quota.versions.all())
-            latest_version = versions[0] if versions else None
-            effective_from = latest_version.effective_from if latest_version else None
-            sheet.append([
-                quota.division.name,
-                quota.position.name,
-                float(quota.total_fte),
-                float(quota.occupied_fte),
-                float(quota.vacant_fte),
-                quota.comment or '',
-                effective_from.strftime('%d.%m.%Y') if effective_from else '',
-            ])
-
-        for idx, column in enumerate(sheet.columns, start=1):
-            max_length = max(len(str(cell.value)) if cell.value is not None else 0 for cell in column)
-            sheet.column_dimensions[get_column_letter(idx)].width = max(15, max_length + 2)
-
-        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        def rows():
+            for quota in quotas_qs:
+                versions = list(quota.versions.all())
+                latest_version = versions[0] if versions else None
+                yield [
+                    quota.division.name,
+                    quota.position.name,
+                    float(quota.total_fte),
+                    float(quota.occupied_fte),
+                    float(quota.vacant_fte),
+                    quota.comment or '',
+                    latest_version.effective_from if latest_version else None,
+                ]
+
         timestamp = timezone.now().strftime('%Y%m%d_%H%M')
-        response['Content-Disposition'] = f'attachment; filename="position_quota_{timestamp}.xlsx"'
-        workbook.save(response)
-        return response
+        return ExportPlan(
+            f'position_quota_{timestamp}',
+            cls.columns,
+            rows(),
+            sheet_title='Штатное расписание',
+            header_color=None,
+            sheet_options={'min_width': 15, 'max_width': None},
+        )
+
+    def get(self, request, *args, **kwargs):
+        return self.build_export(request.user, request.GET).response(EXPORT_FORMAT_XLSX)
@@ -0,0 +1,89 @@
+(function () {
+    if (typeof document === 'undefined' || typeof window.fetch !== 'function') {
+        return;
+    }
+
+    const POLL_INTERVAL = 1000;
+
+    const getCookie = (name) => {
+        const match = document.cookie.match(new RegExp('(?:^|; )' + name + '=([^;]*)'));
+        return match ? decodeURIComponent(match[1]) : '';
+    };
+
+    const setLabel = (link, text) => {
+        link.textContent = text;
+    };
+
+    const startExport = (link) => {
+        const originalLabel = link.textContent;
+        const href = new URL(link.href, window.location.href);
+        const body = new FormData();
+        body.append('kind', link.dataset.exportJob);
+        body.append('format', link.dataset.exportFormat || 'xlsx');
+        body.append('query', href.search.replace(/^\?/, ''));
+        if (link.dataset.exportObject) {
+            body.append('object_id', link.dataset.exportObject);
+        }
+
+        const restore = () => {
+            link.classList.remove('is-loading');
+            link.removeAttribute('aria-busy');
+            setLabel(link, originalLabel);
+        };
+
+        // Если фоновая выгрузка недоступна, скачиваем файл обычным запросом
+        const fallback = () => {
+            restore();
+            window.location.href = link.href;
+        };
+
+        const handleState = (state) => {
+            if (state.status === 'done' && state.download_url) {
+                restore();
+                window.location.href = state.download_url;
+                return;
+            }
+            if (state.status === 'failed') {
+                restore();
+                window.alert('Не удалось подготовить выгрузку: ' + (state.error || 'неизвестная ошибка'));
+                return;
+            }
+            setLabel(link, 'Готовится… ' + (state.percent || 0) + '%');
+            window.setTimeout(() => {
+                fetch(state.status_url, { credentials: 'same-origin' })
+                    .then((response) => (response.ok ? response.json() : Promise.reject(response)))
+                    .then(handleState)
+                    .catch(fallback);
+            }, POLL_INTERVAL);
+        };
+
+        link.classList.add('is-loading');
+        link.setAttribute('aria-busy', 'true');
+        setLabel(link, 'Готовится…');
+
+        fetch(link.dataset.exportJobUrl, {
+            method: 'POST',
+            body: body,
+            credentials: 'same-origin',
+            headers: { 'X-CSRFToken': getCookie('csrftoken') },
+        })
+            .then((response) => (response.ok ? response.json() : Promise.reject(response)))
+            .then(handleState)
+            .catch(fallback);
+    };
+
+    document.addEventListener('click', (event) => {
+        const link = event.target.closest('a[data-export-job]');
+        if (!link || !link.dataset.exportJobUrl) {
+            return;
+        }
+        if (event.ctrlKey || event.metaKey || event.shiftKey || event.button !== 0) {
+            return;
+        }
+        event.preventDefault();
+        if (link.getAttribute('aria-busy') === 'true') {
+            return;
+        }
+        startExport(link);
+    });
+})();
@@ -162,6 +162,30 @@ FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10 MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024   # 10 MB
 FILE_UPLOAD_PERMISSIONS = 0o644
 
+MEDIA_ROOT = Path(os.environ.get('DJANGO_MEDIA_ROOT', BASE_DIR / 'media'))
+
+# Фоновые выгрузки (stimuli.ExportJob)
+# Сколько минут хранится готовый файл; повторный запрос с теми же фильтрами отдаёт его сразу
+EXPORT_JOB_TTL_MINUTES = int(os.environ.get('EXPORT_JOB_TTL_MINUTES', '60'))
+# Выполнять задания в пуле потоков веб-процесса; при 0 их обрабатывает команда run_export_jobs
+EXPORT_JOBS_RUN_IN_PROCESS = os.environ.get('EXPORT_JOBS_RUN_IN_PROCESS', '1') == '1'
+EXPORT_JOBS_MAX_WORKERS = int(os.environ.get('EXPORT_JOBS_MAX_WORKERS', '1'))
+
+# Кеш. По умолчанию — в памяти процесса; с REDIS_URL (нужен пакет redis) кеш общий для всех
+# воркеров. Кеши по данным (дэшборд) инвалидируются версией в БД, так что корректны в обоих случаях.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+# Сколько секунд хранится рассчитанная сводка дэшборда для одной версии данных
+DASHBOARD_CACHE_TIMEOUT = int(os.environ.get('DASHBOARD_CACHE_TIMEOUT', '3600'))
+# Как часто (в секундах) процесс сверяет версию настроек (dashboard.Setting) с БД
+SETTINGS_STORE_CHECK_INTERVAL = float(os.environ.get('SETTINGS_STORE_CHECK_INTERVAL', '5'))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_URL = 'login'
@@ -0,0 +1,65 @@
+"""
+Объединение отложенной работы в пределах транзакции.
+
+defer_until_commit(name, items, flush) накапливает элементы и вызывает flush(items) один раз
+после фиксации текущей транзакции: transaction.on_commit регистрируется только при первом
+вызове, последующие вызовы лишь дополняют набор. Вне транзакции flush вызывается сразу.
+
+Накопленный набор живёт, пока Django хранит его колбэк: на него держится только слабая ссылка,
+поэтому при откате транзакции или точки сохранения, где колбэк был зарегистрирован, Django
+отбрасывает колбэк вместе с набором, и следующий вызов начинает новый.
+"""
+import threading
+import weakref
+from typing import Callable, Hashable, Iterable, Optional
+
+from django.db import transaction
+
+_local = threading.local()
+
+
+class _PendingBatch:
+    def __init__(self, key, flush: Callable[[set], None]):
+        self.key = key
+        self.flush = flush
+        self.items: set = set()
+
+    def run(self) -> None:
+        pending = _pending_batches()
+        ref = pending.get(self.key)
+        if ref is not None and ref() is self:
+            del pending[self.key]
+        self.flush(self.items)
+
+
+def _pending_batches() -> dict:
+    if not hasattr(_local, 'batches'):
+        _local.batches = {}
+    return _local.batches
+
+
+def defer_until_commit(
+    name: str,
+    items: Iterable[Hashable],
+    flush: Callable[[set], None],
+    using: Optional[str] = None,
+) -> None:
+    """Добавляет items в набор name и планирует один вызов flush(набор) после фиксации."""
+    items = set(items)
+    if not items:
+        return
+
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        flush(items)
+        return
+
+    key = (connection.alias, name)
+    pending_batches = _pending_batches()
+    ref = pending_batches.get(key)
+    pending = ref() if ref is not None else None
+    if pending is None:
+        pending = _PendingBatch(key, flush)
+        pending_batches[key] = weakref.ref(pending)
+        transaction.on_commit(pending.run, using=connection.alias)
+    pending.items.update(items)
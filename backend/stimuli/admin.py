@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from .models import Employee, InternalAssignment, StimulusRequest, UserDivision
+from .models import Employee, EmployeeImport, ExportJob, InternalAssignment, StimulusRequest, UserDivision
+from .search import EmployeeSearchAdminMixin
 
 
 class InternalAssignmentInline(admin.TabularInline):
@@ -10,7 +11,7 @@ class InternalAssignmentInline(admin.TabularInline):
 
 
 @admin.register(Employee)
-class EmployeeAdmin(admin.ModelAdmin):
+class EmployeeAdmin(EmployeeSearchAdminMixin, admin.ModelAdmin):
     list_display = (
         'full_name',
         'user',
@@ -23,29 +24,34 @@ class EmployeeAdmin(admin.ModelAdmin):
         'payment',
     )
     list_filter = ('category', 'division', 'position')
-    search_fields = ('full_name', 'user__username', 'division__name', 'position__name')
+    # ФИО ищется через stimuli.search (EmployeeSearchAdminMixin)
+    search_fields = ('user__username', 'division__name', 'position__name')
     autocomplete_fields = ('user', 'division', 'position')
     inlines = [InternalAssignmentInline]
 
-    @admin.display(description='Расчётный оклад')
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_compensation()
+
+    @admin.display(description='Расчётный оклад', ordering='annotated_salary_amount')
     def salary_display(self, obj):
         return obj.salary_amount
 
-    @admin.display(description='Надбавка')
+    @admin.display(description='Надбавка', ordering='annotated_allowance_total')
     def allowance_amount_display(self, obj):
         return obj.allowance_total
 
 
 @admin.register(InternalAssignment)
-class InternalAssignmentAdmin(admin.ModelAdmin):
+class InternalAssignmentAdmin(EmployeeSearchAdminMixin, admin.ModelAdmin):
     list_display = ('employee', 'position', 'rate', 'allowance_amount', 'allowance_until')
-    search_fields = ('employee__full_name', 'position__name')
+    search_fields = ('position__name',)
+    employee_search_path = 'employee'
     list_filter = ('position',)
     autocomplete_fields = ('employee', 'position')
 
 
 @admin.register(StimulusRequest)
-class StimulusRequestAdmin(admin.ModelAdmin):
+class StimulusRequestAdmin(EmployeeSearchAdminMixin, admin.ModelAdmin):
     list_display = (
         'employee',
         'campaign',
@@ -55,10 +61,11 @@ class StimulusRequestAdmin(admin.ModelAdmin):
         'created_at',
         'archived_at',
     )
-    list_filter = ('status', 'campaign', 'created_at')
-    search_fields = ('employee__full_name', 'requested_by__username', 'campaign__name')
+    list_filter = ('status', 'final_outcome', 'campaign', 'created_at')
+    search_fields = ('requested_by__username', 'campaign__name')
+    employee_search_path = 'employee'
     autocomplete_fields = ('employee', 'requested_by', 'campaign')
-    readonly_fields = ('created_at', 'updated_at', 'archived_at')
+    readonly_fields = ('created_at', 'updated_at', 'archived_at', 'final_outcome')
 
     @admin.display(description='Статус')
     def status_display(self, obj):
@@ -72,3 +79,42 @@ class UserDivisionAdmin(admin.ModelAdmin):
     autocomplete_fields = ('user', 'division')
     list_editable = ('can_view_all', 'can_view_own_requests')
     list_filter = ('can_view_all', 'can_view_own_requests', 'division')
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'export_format', 'requested_by', 'status', 'progress', 'total', 'created_at', 'expires_at')
+    list_filter = ('kind', 'status', 'export_format')
+    search_fields = ('requested_by__username', 'filename')
+    readonly_fields = (
+        'kind',
+        'export_format',
+        'object_id',
+        'query_string',
+        'params_hash',
+        'requested_by',
+        'status',
+        'progress',
+        'total',
+        'file',
+        'filename',
+        'error',
+        'created_at',
+        'started_at',
+        'finished_at',
+        'expires_at',
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(EmployeeImport)
+class EmployeeImportAdmin(admin.ModelAdmin):
+    list_display = ('id', 'filename', 'uploaded_by', 'full_sync', 'status', 'created_count', 'updated_count', 'deleted_count', 'created_at')
+    list_filter = ('status', 'full_sync')
+    search_fields = ('uploaded_by__username', 'filename')
+    readonly_fields = [field.name for field in EmployeeImport._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
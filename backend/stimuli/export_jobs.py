@@ -0,0 +1,238 @@
+"""
+Фоновые выгрузки.
+
+Задание (ExportJob) хранит тип выгрузки, формат и строку параметров фильтров. Обработчик
+строит выгрузку тем же методом build_export представления, что и синхронный запрос, от имени
+автора задания, поэтому фильтры и сортировка остаются в одном месте. Готовый файл
+сохраняется в хранилище по умолчанию и живёт EXPORT_JOB_TTL_MINUTES; повторный запрос с теми
+же параметрами возвращает уже существующее задание, пока не изменились данные (версия
+данных дэшборда входит в ключ задания).
+
+Задания выполняются в пуле потоков веб-процесса (EXPORT_JOBS_RUN_IN_PROCESS) или командой
+run_export_jobs. Захват задания — условный UPDATE по статусу, так что оба способа можно
+совмещать без двойной обработки.
+"""
+import hashlib
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.core.files import File
+from django.db import close_old_connections, transaction
+from django.http import QueryDict
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from .exports import EXPORT_FORMAT_XLSX, EXPORT_FORMATS, report_progress
+from .models import ExportJob
+
+logger = logging.getLogger(__name__)
+
+# Тип выгрузки -> (имя URL представления, нужен ли object_id, допустимые форматы)
+EXPORT_JOB_TARGETS = {
+    ExportJob.Kind.REQUESTS: ('request-export', False, EXPORT_FORMATS),
+    ExportJob.Kind.CAMPAIGN_REQUESTS: ('one_time_payments:campaign-requests-export', True, EXPORT_FORMATS),
+    ExportJob.Kind.CAMPAIGN_APPROVED: ('one_time_payments:campaign-approved-export', True, EXPORT_FORMATS),
+    ExportJob.Kind.POSITION_QUOTAS: ('staffing:quota-export', False, (EXPORT_FORMAT_XLSX,)),
+}
+
+# Параметры, не влияющие на содержимое выгрузки
+IGNORED_QUERY_PARAMS = {'format', 'page', 'after', 'before', 'csrfmiddlewaretoken'}
+
+# Как часто (в строках) сохранять прогресс в БД
+PROGRESS_SAVE_STEP = 1000
+
+_executor = None
+
+
+class ExportJobError(Exception):
+    pass
+
+
+def normalize_query_string(query_string):
+    """Убирает служебные параметры и упорядочивает остальные, чтобы одинаковые фильтры давали один ключ."""
+    params = QueryDict(query_string or '', mutable=True)
+    for key in IGNORED_QUERY_PARAMS:
+        params.pop(key, None)
+    normalized = QueryDict(mutable=True)
+    for key in sorted(params.keys()):
+        normalized.setlist(key, sorted(params.getlist(key)))
+    return normalized.urlencode()
+
+
+def _params_hash(user, kind, export_format, object_id, query_string):
+    # Версия данных в ключе: после изменения заявок или выплат готовый файл не переиспользуется
+    from dashboard.versioning import get_data_version
+
+    key = f'{user.pk}|{kind}|{export_format}|{object_id or ""}|{query_string}|{get_data_version()}'
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def export_view_class(kind, object_id=None):
+    url_name, needs_object, _ = EXPORT_JOB_TARGETS[kind]
+    path = reverse(url_name, kwargs={'pk': object_id} if needs_object else {})
+    return resolve(path).func.view_class
+
+
+def user_can_run_export(user, kind, object_id=None):
+    """Проверяет права пользователя так же, как их проверит представление выгрузки."""
+    view_class = export_view_class(kind, object_id)
+    permission_required = getattr(view_class, 'permission_required', None)
+    if not permission_required:
+        return user.is_authenticated
+    if isinstance(permission_required, str):
+        permission_required = (permission_required,)
+    return user.has_perms(permission_required)
+
+
+def submit_export_job(user, kind, export_format=EXPORT_FORMAT_XLSX, object_id=None, query_string=''):
+    """
+    Возвращает (job, created): существующее задание с теми же параметрами, пока оно в работе
+    или его файл не истёк, либо новое задание, поставленное в очередь.
+    """
+    if kind not in EXPORT_JOB_TARGETS:
+        raise ExportJobError('Неизвестный тип выгрузки.')
+    _, needs_object, formats = EXPORT_JOB_TARGETS[kind]
+    if export_format not in formats:
+        raise ExportJobError('Формат недоступен для этой выгрузки.')
+    if needs_object and not object_id:
+        raise ExportJobError('Не указан объект выгрузки.')
+    if not needs_object:
+        object_id = None
+    if not user_can_run_export(user, kind, object_id):
+        raise PermissionDenied('Недостаточно прав для выгрузки.')
+
+    query_string = normalize_query_string(query_string)
+    params_hash = _params_hash(user, kind, export_format, object_id, query_string)
+
+    existing = ExportJob.objects.reusable().filter(params_hash=params_hash).order_by('-created_at').first()
+    if existing is not None:
+        if existing.status == ExportJob.Status.PENDING:
+            # Задание могло остаться в очереди после перезапуска процесса — ставим ещё раз,
+            # захват по статусу не даст выполнить его дважды
+            _enqueue(existing.pk)
+        return existing, False
+
+    job = ExportJob.objects.create(
+        kind=kind,
+        export_format=export_format,
+        object_id=object_id,
+        query_string=query_string,
+        params_hash=params_hash,
+        requested_by=user,
+    )
+    _enqueue(job.pk)
+    return job, True
+
+
+def _enqueue(job_id):
+    if settings.EXPORT_JOBS_RUN_IN_PROCESS:
+        transaction.on_commit(lambda: _get_executor().submit(_run_in_thread, job_id))
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.EXPORT_JOBS_MAX_WORKERS,
+            thread_name_prefix='export-job',
+        )
+    return _executor
+
+
+def _run_in_thread(job_id):
+    close_old_connections()
+    try:
+        run_export_job(job_id)
+        purge_expired_export_jobs()
+    except Exception:
+        logger.exception('Ошибка обработчика фоновых выгрузок')
+    finally:
+        close_old_connections()
+
+
+def claim_export_job(job_id):
+    """Переводит задание из очереди в работу; False, если его уже взял другой обработчик."""
+    return bool(
+        ExportJob.objects.filter(pk=job_id, status=ExportJob.Status.PENDING).update(
+            status=ExportJob.Status.RUNNING,
+            started_at=timezone.now(),
+        )
+    )
+
+
+def run_export_job(job_id):
+    """Выполняет задание, если удалось его захватить. Возвращает задание или None."""
+    if not claim_export_job(job_id):
+        return None
+
+    job = ExportJob.objects.select_related('requested_by').get(pk=job_id)
+    try:
+        _build_export_file(job)
+    except Exception as exc:
+        logger.exception('Фоновая выгрузка #%s завершилась ошибкой', job.pk)
+        now = timezone.now()
+        ExportJob.objects.filter(pk=job.pk).update(
+            status=ExportJob.Status.FAILED,
+            error=str(exc) or exc.__class__.__name__,
+            finished_at=now,
+            expires_at=now + _ttl(),
+        )
+        job.refresh_from_db()
+        return job
+
+    now = timezone.now()
+    job.status = ExportJob.Status.DONE
+    job.finished_at = now
+    job.expires_at = now + _ttl()
+    if job.total is None:
+        job.total = job.progress
+    job.save(update_fields=['file', 'filename', 'status', 'progress', 'total', 'finished_at', 'expires_at'])
+    return job
+
+
+def _ttl():
+    return timedelta(minutes=settings.EXPORT_JOB_TTL_MINUTES)
+
+
+def _build_export_file(job):
+    view_class = export_view_class(job.kind, job.object_id)
+    plan = view_class.build_export(job.requested_by, QueryDict(job.query_string), job.object_id)
+
+    last_saved = {'progress': -PROGRESS_SAVE_STEP}
+
+    def update_progress(processed, total):
+        job.progress = processed
+        job.total = total
+        if processed - last_saved['progress'] >= PROGRESS_SAVE_STEP or processed == total:
+            ExportJob.objects.filter(pk=job.pk).update(progress=processed, total=total)
+            last_saved['progress'] = processed
+
+    with report_progress(update_progress), tempfile.TemporaryFile() as buffer:
+        plan.write(job.export_format, buffer)
+        buffer.seek(0)
+        job.filename = plan.full_filename(job.export_format)
+        job.file.save(job.filename, File(buffer), save=False)
+
+
+def purge_expired_export_jobs(now=None):
+    """
+    Удаляет истёкшие задания вместе с файлами и помечает ошибкой зависшие (выполняются дольше TTL).
+    Возвращает число удалённых заданий.
+    """
+    now = now or timezone.now()
+    ExportJob.objects.filter(status=ExportJob.Status.RUNNING, started_at__lt=now - _ttl()).update(
+        status=ExportJob.Status.FAILED,
+        error='Выгрузка прервана.',
+        finished_at=now,
+        expires_at=now,
+    )
+    expired = list(ExportJob.objects.expired(now))
+    for job in expired:
+        if job.file:
+            job.file.delete(save=False)
+    ExportJob.objects.filter(pk__in=[job.pk for job in expired]).delete()
+    return len(expired)
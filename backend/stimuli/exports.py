@@ -0,0 +1,383 @@
+"""
+Потоковая выгрузка таблиц в Excel, CSV и NDJSON.
+
+Представления описывают столбцы парами (ключ, заголовок) и отдают строки «сырых» значений
+(datetime, Decimal, строки); приведение к виду конкретного формата делается здесь.
+
+CSV и NDJSON пишутся построчно прямо из итератора queryset в StreamingHttpResponse.
+Для Excel книга строится в режиме write_only: строки сразу уходят во временные файлы openpyxl,
+а не накапливаются в памяти. Ширина столбцов в этом режиме должна быть задана до первой
+строки листа, поэтому строки сначала проходят через временный буфер на диске, попутно
+измеряясь, и уже затем переписываются в лист. Готовый файл отдаётся через FileResponse
+блоками, так что пиковое потребление памяти не зависит от числа строк.
+"""
+import csv
+import io
+import json
+import pickle
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import QuerySet
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.filters import AutoFilter
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CSV_CONTENT_TYPE = 'text/csv; charset=utf-8'
+NDJSON_CONTENT_TYPE = 'application/x-ndjson; charset=utf-8'
+
+EXPORT_FORMAT_XLSX = 'xlsx'
+EXPORT_FORMAT_CSV = 'csv'
+EXPORT_FORMAT_NDJSON = 'ndjson'
+EXPORT_FORMATS = (EXPORT_FORMAT_XLSX, EXPORT_FORMAT_CSV, EXPORT_FORMAT_NDJSON)
+
+# Размер пачки при чтении queryset через .iterator()
+EXPORT_CHUNK_SIZE = 2000
+# Сколько строк сериализуется во временный буфер за один раз
+SPOOL_BATCH_SIZE = 500
+# До этого размера итоговый файл держится в памяти, дальше — на диске
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+
+_progress_state = threading.local()
+
+
+@contextmanager
+def report_progress(callback):
+    """
+    Включает отчёт о прогрессе для выгрузок в текущем потоке.
+    callback(processed, total) вызывается перед первой строкой, после каждой пачки и в конце.
+    """
+    _progress_state.callback = callback
+    try:
+        yield
+    finally:
+        _progress_state.callback = None
+
+
+def iterate_queryset(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Итерирует queryset пачками, не заполняя кеш результатов."""
+    callback = getattr(_progress_state, 'callback', None)
+    if callback is None:
+        return queryset.iterator(chunk_size=chunk_size)
+    return _iterate_with_progress(queryset, chunk_size, callback)
+
+
+def _iterate_with_progress(queryset, chunk_size, callback):
+    total = queryset.count()
+    processed = 0
+    callback(processed, total)
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        yield obj
+        processed += 1
+        if processed % chunk_size == 0:
+            callback(processed, total)
+    callback(processed, total)
+
+
+def get_export_format(request, default=EXPORT_FORMAT_XLSX):
+    """Формат выгрузки из параметра ?format=; неизвестные значения игнорируются."""
+    value = (request.GET.get('format') or '').strip().lower()
+    return value if value in EXPORT_FORMATS else default
+
+
+def _xlsx_value(value):
+    if isinstance(value, datetime):
+        return value.strftime('%d.%m.%Y %H:%M')
+    if isinstance(value, date):
+        return value.strftime('%d.%m.%Y')
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+class _Echo:
+    """Псевдофайл для csv.writer: writerow возвращает готовую строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def _streaming_response(chunks, content_type, filename):
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
+
+
+def csv_chunks(columns, rows):
+    """CSV построчно: строка заголовков, затем по строке на запись."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow([header for _, header in columns])
+    for row in rows:
+        yield writer.writerow([_csv_value(value) for value in row])
+
+
+def ndjson_chunks(columns, rows):
+    """NDJSON построчно: по JSON-объекту на строку, ключи — идентификаторы столбцов."""
+    keys = [key for key, _ in columns]
+    for row in rows:
+        yield json.dumps(dict(zip(keys, row)), ensure_ascii=False, cls=DjangoJSONEncoder) + '\n'
+
+
+def csv_response(columns, rows, filename):
+    """Потоковый CSV; filename указывается без расширения."""
+    return _streaming_response(csv_chunks(columns, rows), CSV_CONTENT_TYPE, f'{filename}.csv')
+
+
+def ndjson_response(columns, rows, filename):
+    """Потоковый NDJSON; filename указывается без расширения."""
+    return _streaming_response(ndjson_chunks(columns, rows), NDJSON_CONTENT_TYPE, f'{filename}.ndjson')
+
+
+def stream_response(export_format, columns, rows, filename):
+    """Ответ в построчном формате (CSV или NDJSON); filename указывается без расширения."""
+    if export_format == EXPORT_FORMAT_NDJSON:
+        return ndjson_response(columns, rows, filename)
+    return csv_response(columns, rows, filename)
+
+
+def _cell_length(value):
+    if value is None:
+        return 0
+    try:
+        return len(str(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+class XlsxExport:
+    """
+    Книга Excel для выгрузки: листы добавляются по очереди методом add_sheet,
+    ответ формируется методом response.
+    """
+
+    def __init__(self, header_color='366092'):
+        """header_color=None оставляет строку заголовков без оформления."""
+        self.workbook = Workbook(write_only=True)
+        self.header_font = Font(bold=True, color="FFFFFF")
+        self.header_fill = (
+            PatternFill(start_color=header_color, end_color=header_color, fill_type="solid") if header_color else None
+        )
+        self.header_alignment = Alignment(horizontal="center", vertical="center")
+
+    def add_sheet(self, title, headers, rows, *, min_width=0, max_width=60, freeze_header=False, auto_filter=False):
+        """
+        Записывает лист с заголовком и строками.
+
+        headers — список заголовков либо столбцов (ключ, заголовок). rows — любой итерируемый
+        объект последовательностей значений (в т.ч. генератор поверх queryset.iterator());
+        он читается ровно один раз. Даты и Decimal приводятся к виду, принятому в выгрузках.
+        """
+        headers = [header[1] if isinstance(header, tuple) else header for header in headers]
+        widths = [_cell_length(header) for header in headers]
+        row_count = 0
+
+        with tempfile.TemporaryFile() as spool:
+            batch = []
+            for row in rows:
+                row = [_xlsx_value(value) for value in row]
+                if len(row) > len(widths):
+                    widths.extend([0] * (len(row) - len(widths)))
+                for index, value in enumerate(row):
+                    length = _cell_length(value)
+                    if length > widths[index]:
+                        widths[index] = length
+                batch.append(row)
+                row_count += 1
+                if len(batch) >= SPOOL_BATCH_SIZE:
+                    pickle.dump(batch, spool, protocol=pickle.HIGHEST_PROTOCOL)
+                    batch = []
+            if batch:
+                pickle.dump(batch, spool, protocol=pickle.HIGHEST_PROTOCOL)
+            spool.seek(0)
+
+            worksheet = self.workbook.create_sheet(title)
+            for index, width in enumerate(widths, start=1):
+                if max_width is not None:
+                    width = min(width + 2, max_width)
+                else:
+                    width += 2
+                worksheet.column_dimensions[get_column_letter(index)].width = max(min_width, width)
+            if freeze_header:
+                worksheet.freeze_panes = 'A2'
+
+            worksheet.append([self._header_cell(worksheet, header) for header in headers])
+            while True:
+                try:
+                    batch = pickle.load(spool)
+                except EOFError:
+                    break
+                for row in batch:
+                    worksheet.append(row)
+
+        if auto_filter and widths:
+            last_cell = f'{get_column_letter(len(widths))}{row_count + 1}'
+            worksheet.auto_filter = AutoFilter(ref=f'A1:{last_cell}')
+        return worksheet
+
+    def add_filters_sheet(self, rows, title='Фильтры', max_width=60):
+        """Лист с описанием применённых фильтров: пары (поле, значение)."""
+        return self.add_sheet(title, ['Поле', 'Значение'], rows, max_width=max_width)
+
+    def save(self, output):
+        """Записывает книгу в файловый объект."""
+        self.workbook.save(output)
+
+    def content(self):
+        """Возвращает книгу целиком в виде байтов (например, для кеширования)."""
+        output = io.BytesIO()
+        self.workbook.save(output)
+        return output.getvalue()
+
+    def response(self, filename):
+        """Сохраняет книгу во временный файл и отдаёт его потоково; filename — без расширения."""
+        output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        self.workbook.save(output)
+        output.seek(0)
+        return FileResponse(
+            output,
+            as_attachment=True,
+            filename=f'{filename}.xlsx',
+            content_type=XLSX_CONTENT_TYPE,
+        )
+
+    def _header_cell(self, worksheet, value):
+        if self.header_fill is None:
+            return value
+        cell = WriteOnlyCell(worksheet, value=value)
+        cell.font = self.header_font
+        cell.fill = self.header_fill
+        cell.alignment = self.header_alignment
+        return cell
+
+
+class ExportPlan:
+    """
+    Выгрузка, готовая к записи в любом из форматов: имя файла (без расширения), столбцы,
+    строки и оформление листа Excel.
+
+    Строится функцией-построителем по пользователю и параметрам фильтров, без объекта
+    запроса, поэтому одна и та же выгрузка отдаётся представлением (response) и записывается
+    в файл фоновым заданием (write). rows читается один раз; filter_rows — функция,
+    возвращающая строки листа «Фильтры» (вызывается только для Excel).
+    """
+
+    def __init__(self, filename, columns, rows, *, sheet_title, header_color='366092', sheet_options=None,
+                 filter_rows=None, filters_max_width=60):
+        self.filename = filename
+        self.columns = columns
+        self.rows = rows
+        self.sheet_title = sheet_title
+        self.header_color = header_color
+        self.sheet_options = sheet_options or {}
+        self.filter_rows = filter_rows
+        self.filters_max_width = filters_max_width
+
+    def full_filename(self, export_format):
+        return f'{self.filename}.{export_format}'
+
+    def build_xlsx(self):
+        export = XlsxExport(header_color=self.header_color)
+        export.add_sheet(self.sheet_title, self.columns, self.rows, **self.sheet_options)
+        filter_rows = list(self.filter_rows()) if self.filter_rows else []
+        if filter_rows:
+            export.add_filters_sheet(filter_rows, max_width=self.filters_max_width)
+        return export
+
+    def response(self, export_format):
+        if export_format == EXPORT_FORMAT_XLSX:
+            return self.build_xlsx().response(self.filename)
+        return stream_response(export_format, self.columns, self.rows, self.filename)
+
+    def write(self, export_format, output):
+        """Записывает выгрузку в двоичный файловый объект."""
+        if export_format == EXPORT_FORMAT_XLSX:
+            self.build_xlsx().save(output)
+            return
+        chunks = ndjson_chunks if export_format == EXPORT_FORMAT_NDJSON else csv_chunks
+        for chunk in chunks(self.columns, self.rows):
+            output.write(chunk.encode('utf-8'))
+
+
+REQUEST_EXPORT_COLUMNS = [
+    ('id', "ID"),
+    ('created_at', "Создано"),
+    ('updated_at', "Обновлено"),
+    ('employee', "Сотрудник"),
+    ('campaign', "Кампания"),
+    ('amount', "Размер выплаты"),
+    ('status', "Статус"),
+    ('final_status', "Итоговый статус"),
+    ('requested_by', "Ответственный"),
+    ('justification', "Обоснование"),
+    ('admin_comment', "Комментарий администратора"),
+    ('archived_at', "В архиве с"),
+]
+
+
+def request_export_rows(queryset):
+    """
+    Строки выгрузки заявок в порядке REQUEST_EXPORT_COLUMNS.
+    Queryset должен подтягивать employee, requested_by и campaign через select_related.
+    """
+    for request_obj in iterate_queryset(queryset):
+        yield [
+            request_obj.pk,
+            request_obj.created_at,
+            request_obj.updated_at,
+            request_obj.employee.full_name,
+            request_obj.campaign.name if request_obj.campaign else '',
+            request_obj.amount,
+            request_obj.get_status_display(),
+            request_obj.final_status or '',
+            request_obj.requested_by.get_full_name() or request_obj.requested_by.username,
+            request_obj.justification,
+            request_obj.admin_comment,
+            request_obj.archived_at,
+        ]
+
+
+def filterset_rows(filterset):
+    """Возвращает пары (подпись, значение) для заполненных полей формы фильтров."""
+    form = filterset.form
+    form_is_valid = form.is_valid()
+
+    for field_name, field in form.fields.items():
+        if form_is_valid:
+            value = form.cleaned_data.get(field_name)
+        else:
+            value = form.data.get(field_name)
+
+        if value in (None, '', [], (), {}):
+            continue
+
+        if isinstance(value, QuerySet):
+            value = ', '.join(str(item) for item in value)
+        elif isinstance(value, (list, tuple, set)):
+            value = ', '.join(str(item) for item in value if item not in (None, ''))
+        elif hasattr(value, 'isoformat'):
+            try:
+                value = value.strftime('%d.%m.%Y')
+            except (TypeError, ValueError):
+                value = str(value)
+        else:
+            value = str(value)
+
+        yield field.label or field_name, value
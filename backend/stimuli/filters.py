@@ -4,10 +4,11 @@ from django.contrib.auth import get_user_model
 from one_time_payments.models import RequestCampaign
 from staffing.models import Division, Position
 from .models import Employee, StimulusRequest
+from .search import search_employees
 
 
 class EmployeeFilter(django_filters.FilterSet):
-    full_name = django_filters.CharFilter(label='ФИО', lookup_expr='icontains')
+    full_name = django_filters.CharFilter(label='ФИО', method='filter_full_name')
     division = django_filters.ModelChoiceFilter(label='Подразделение', queryset=Division.objects.none())
     position = django_filters.ModelChoiceFilter(label='Должность', queryset=Position.objects.none())
     category = django_filters.ChoiceFilter(label='Категория', choices=Employee.Category.choices)
@@ -27,6 +28,9 @@ class EmployeeFilter(django_filters.FilterSet):
         position_field.field.empty_label = 'Все должности'
         position_field.field.queryset = Position.objects.order_by('name')
 
+    def filter_full_name(self, queryset, name, value):
+        return search_employees(queryset, value, fields=('full_name',))
+
 
 class StimulusRequestFilter(django_filters.FilterSet):
     status = django_filters.MultipleChoiceFilter(
@@ -47,14 +51,16 @@ class StimulusRequestFilter(django_filters.FilterSet):
         model = StimulusRequest
         fields = ['status', 'campaign', 'requested_by']
 
-    def __init__(self, data=None, queryset=None, *, request=None, prefix=None):
+    def __init__(self, data=None, queryset=None, *, request=None, prefix=None, user=None):
         super().__init__(data, queryset, request=request, prefix=prefix)
         self.filters['campaign'].field.empty_label = 'Все кампании'
-        
+        # user передаётся напрямую, когда фильтры строятся без запроса (выгрузки)
+        user = user or getattr(request, 'user', None)
+
         # Ограничиваем выбор кампаний в зависимости от роли пользователя
-        if request and request.user.is_authenticated:
+        if user is not None and user.is_authenticated:
             from stimuli.permissions import is_employee, is_department_manager
-            if is_employee(request.user) or is_department_manager(request.user):
+            if is_employee(user) or is_department_manager(user):
                 # Сотрудники и руководители департамента видят только открытые кампании
                 self.filters['campaign'].field.queryset = RequestCampaign.objects.filter(
                     status=RequestCampaign.Status.OPEN
@@ -0,0 +1,15 @@
+"""
+Сигналы о массовых изменениях, которые проходят мимо post_save/post_delete (UPDATE, bulk_create).
+
+stimuli отправляет их сразу после такого изменения внутри той же транзакции, а приложения
+с производными данными (dashboard: помесячные факты, версия данных) подписываются на них
+в своих signals.py — так stimuli не зависит от этих приложений.
+"""
+from django.dispatch import Signal
+
+# Статусы заявок изменены одним UPDATE; аргумент employee_ids — сотрудники изменённых заявок
+requests_bulk_updated = Signal()
+
+# Сотрудники изменены UPDATE/bulk_update или созданы bulk_create; аргумент employee_ids —
+# изменённые сотрудники (у них могло смениться подразделение), созданные не перечисляются
+employees_bulk_updated = Signal()
@@ -0,0 +1,788 @@
+"""
+Импорт сотрудников из Excel через промежуточную таблицу.
+
+Книга читается в режиме read_only построчно (iter_rows(values_only=True)), проверенные строки
+пачками записываются в StagedEmployeeRow. Дальше всё делается запросами над множествами:
+сопоставление с сотрудниками по ФИО и сравнение полей — UPDATE с подзапросами, предпросмотр —
+аннотации и агрегаты, применение — один UPDATE для изменённых сотрудников, bulk_create для
+новых и один DELETE при полной синхронизации. Строки без изменений не трогаются, поэтому
+повторная загрузка того же файла ничего не пишет в таблицу сотрудников.
+
+Шаблон для загрузки (build_employee_template) строится в режиме write_only и кешируется по версии
+данных (employee_template_version), которая меняется при любом изменении сотрудников, совмещений,
+подразделений или должностей.
+
+Для команд импорта здесь же SpreadsheetReader: потоковое чтение всех листов книги с поиском
+столбцов по заголовкам, приведением типов и сбором ошибок по строкам. Строки отдаются пачками
+фиксированного размера, поэтому память не растёт с размером файла.
+"""
+from __future__ import annotations
+
+import hashlib
+import time
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from typing import Callable, Iterable, Iterator, Optional
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import BooleanField, Case, Count, F, Max, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from staffing.models import Division, Position
+
+from .exports import XlsxExport, iterate_queryset
+from .hooks import employees_bulk_updated
+from .models import Employee, EmployeeImport, InternalAssignment, StagedEmployeeRow
+
+# Размер пачки для bulk_create
+IMPORT_BATCH_SIZE = 500
+# Сколько строк каждого вида показывать в предпросмотре
+PREVIEW_ROW_LIMIT = 200
+# Неподтверждённые загрузки старше этого срока удаляются
+STAGED_IMPORT_TTL = timedelta(days=1)
+# Сколько текстов ошибок хранит SpreadsheetReader (счётчик ведётся по всем)
+MAX_STORED_ERRORS = 1000
+
+# Номера столбцов шаблона (с нуля); столбцы 6-10 вычисляемые и при импорте пропускаются
+COLUMN_FULL_NAME = 0
+COLUMN_DIVISION = 1
+COLUMN_POSITION = 2
+COLUMN_CATEGORY = 3
+COLUMN_RATE = 4
+COLUMN_ALLOWANCE_AMOUNT = 10
+COLUMN_ALLOWANCE_REASON = 11
+COLUMN_ALLOWANCE_UNTIL = 12
+COLUMN_PAYMENT = 13
+COLUMN_JUSTIFICATION = 14
+IMPORT_COLUMN_COUNT = 15
+
+# Заголовки шаблона; номера столбцов выше соответствуют этому порядку
+EMPLOYEE_TEMPLATE_HEADERS = [
+    'ФИО',
+    'Подразделение',
+    'Должность',
+    'Категория',
+    'Ставка',
+    'Оклад',
+    'Выплаты по ставке',
+    'Совмещения',
+    'Оклад совмещений',
+    'Итого базовых выплат',
+    'Надбавка',
+    'Основание надбавки',
+    'Срок надбавки',
+    'Выплата',
+    'Обоснование',
+    'Итого выплат',
+]
+# Меняется вместе с форматом шаблона, чтобы не отдавать файлы, собранные старым кодом
+EMPLOYEE_TEMPLATE_FORMAT = 1
+EMPLOYEE_TEMPLATE_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Поле сотрудника -> условие «значение в файле совпадает с текущим» (для строки StagedEmployeeRow)
+FIELD_MATCHES = {
+    'division': Q(employee__division__name=F('division_name')),
+    'position': Q(employee__position__name=F('position_name')),
+    'category': Q(employee__category=F('category')),
+    'rate': Q(employee__rate=F('rate')),
+    'allowance_amount': Q(employee__allowance_amount=F('allowance_amount')),
+    'allowance_reason': Q(employee__allowance_reason=F('allowance_reason')),
+    'allowance_until': (
+        Q(employee__allowance_until=F('allowance_until'))
+        | Q(employee__allowance_until__isnull=True, allowance_until__isnull=True)
+    ),
+    'payment': Q(employee__payment=F('payment')),
+    'justification': Q(employee__justification=F('justification')),
+}
+
+
+@dataclass
+class ParsedEmployeeRow:
+    row_num: int
+    full_name: str
+    division_name: str
+    position_name: str
+    category: str
+    rate: Decimal
+    allowance_amount: Decimal
+    allowance_reason: str
+    allowance_until: Optional[date]
+    payment: Decimal
+    justification: str
+
+
+@dataclass
+class FieldChange:
+    label: str
+    old: object
+    new: object
+
+
+def open_workbook(file):
+    """Открывает книгу в режиме read_only; битый или не-xlsx файл — ValueError."""
+    from zipfile import BadZipFile
+
+    from openpyxl import load_workbook
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    try:
+        return load_workbook(file, read_only=True)
+    except (BadZipFile, InvalidFileException) as exc:
+        raise ValueError('Файл не является книгой Excel (.xlsx)') from exc
+
+
+def read_workbook_rows(file, min_row: int = 2) -> Iterator[tuple]:
+    """Построчно читает активный лист книги: (номер строки, кортеж значений)."""
+    workbook = open_workbook(file)
+    try:
+        worksheet = workbook.active
+        for row_num, values in enumerate(worksheet.iter_rows(min_row=min_row, values_only=True), start=min_row):
+            yield row_num, values
+    finally:
+        workbook.close()
+
+
+def employee_template_version() -> str:
+    """
+    Версия данных шаблона: число записей и время последнего изменения сотрудников,
+    совмещений, подразделений и должностей. Число записей учитывает удаления.
+    """
+    parts = [EMPLOYEE_TEMPLATE_FORMAT]
+    for model in (Employee, InternalAssignment, Division, Position):
+        stats = model.objects.aggregate(count=Count('pk'), last=Max('updated_at'))
+        parts.append((stats['count'], stats['last'].isoformat() if stats['last'] else ''))
+    return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()[:32]
+
+
+def _employee_template_rows(employees) -> Iterator[list]:
+    for employee in iterate_queryset(employees):
+        assignments = employee.assignments.all()
+        assignments_list = []
+        for assignment in assignments:
+            assignment_desc = f"{assignment.position.name} ({assignment.rate})"
+            if assignment.allowance_amount:
+                assignment_desc += f" + надбавка {assignment.allowance_amount}"
+            assignments_list.append(assignment_desc)
+
+        yield [
+            employee.full_name,
+            employee.division.name if employee.division else '',
+            employee.position.name if employee.position else '',
+            employee.category,
+            float(employee.rate),
+            float(employee.position.base_salary) if employee.position else 0.0,
+            float(employee.salary_amount),
+            '; '.join(assignments_list),
+            float(employee.assignments_salary_amount),
+            float(employee.total_salary_amount),
+            float(employee.allowance_total),
+            employee.allowance_reason,
+            employee.allowance_until.strftime('%d.%m.%Y') if employee.allowance_until else '',
+            float(employee.payment),
+            employee.justification,
+            float(employee.total_payments),
+        ]
+
+
+def build_employee_template() -> bytes:
+    """Собирает книгу-шаблон: сотрудники и справочники подразделений, должностей и категорий."""
+    employees = (
+        Employee.objects.select_related('division', 'position')
+        .prefetch_related('assignments__position')
+        .with_compensation()
+        .order_by('full_name')
+    )
+    export = XlsxExport()
+    export.add_sheet('Сотрудники', EMPLOYEE_TEMPLATE_HEADERS, _employee_template_rows(employees), max_width=50)
+    export.add_sheet(
+        'Подразделения',
+        ['Название подразделения'],
+        Division.objects.order_by('name').values_list('name'),
+        max_width=50,
+    )
+    export.add_sheet(
+        'Должности',
+        ['Название должности', 'Оклад'],
+        ((name, float(base_salary)) for name, base_salary in Position.objects.order_by('name').values_list('name', 'base_salary')),
+        max_width=50,
+    )
+    export.add_sheet(
+        'Категории',
+        ['Код', 'Название'],
+        ((str(code), str(name)) for code, name in Employee.Category.choices),
+        max_width=50,
+    )
+    return export.content()
+
+
+def get_employee_template(version: str) -> bytes:
+    """Шаблон для версии данных version: из кеша или собранный заново."""
+    key = f'employee-template:{version}'
+    content = cache.get(key)
+    if content is None:
+        content = build_employee_template()
+        cache.set(key, content, EMPLOYEE_TEMPLATE_CACHE_TIMEOUT)
+    return content
+
+
+def _decimal_value(field_name: str, value, default: Decimal) -> Decimal:
+    if value is None:
+        return default
+    model_field = Employee._meta.get_field(field_name)
+    decimal_value = model_field.to_python(float(value))
+    decimal_value = decimal_value.quantize(Decimal(1).scaleb(-model_field.decimal_places))
+    model_field.run_validators(decimal_value)
+    return decimal_value
+
+
+def _date_value(value) -> Optional[date]:
+    if not value:
+        return None
+    if isinstance(value, str):
+        return datetime.strptime(value, '%d.%m.%Y').date()
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def category_codes() -> dict:
+    """Код категории по коду или отображаемому названию."""
+    codes = {}
+    for code, display_name in Employee.Category.choices:
+        codes[code] = code
+        codes[str(display_name)] = code
+    return codes
+
+
+def to_text(value) -> str:
+    return str(value).strip() if value is not None else ''
+
+
+def to_decimal(value) -> Optional[Decimal]:
+    """Число из ячейки; строки допускают пробелы между разрядами и запятую. Пустое значение — None."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, (int, float)):
+        return Decimal(str(value))
+    text = str(value).strip().replace('\xa0', '').replace(' ', '').replace(',', '.')
+    if not text:
+        return None
+    try:
+        return Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f"некорректное число '{value}'") from None
+
+
+def to_date(value) -> Optional[date]:
+    """Дата из ячейки (дата Excel или строка ДД.ММ.ГГГГ). Пустое значение — None."""
+    if isinstance(value, str):
+        value = value.strip()
+    try:
+        return _date_value(value)
+    except ValueError:
+        raise ValueError(f"некорректная дата '{value}', ожидается ДД.ММ.ГГГГ") from None
+
+
+def to_category(value) -> str:
+    """Код категории по коду или названию; неизвестное значение — ValueError."""
+    code = category_codes().get(to_text(value))
+    if code is None:
+        raise ValueError(f"неверная категория '{value}'")
+    return code
+
+
+class EmployeeRowParser:
+    """
+    Проверяет строки шаблона и приводит их к значениям полей.
+    Ошибки копятся в errors.
+    """
+
+    def __init__(self):
+        self.errors: list[str] = []
+        self.category_map = category_codes()
+
+    def parse(self, rows: Iterable[tuple]) -> Iterator[ParsedEmployeeRow]:
+        for row_num, values in rows:
+            values = tuple(values) + (None,) * (IMPORT_COLUMN_COUNT - len(values))
+            try:
+                parsed = self.parse_row(row_num, values)
+            except (ValueError, TypeError, AttributeError) as exc:
+                self.errors.append(f"Строка {row_num}: Ошибка обработки - {str(exc)}")
+                continue
+            if parsed is not None:
+                yield parsed
+
+    def parse_row(self, row_num: int, values: tuple) -> Optional[ParsedEmployeeRow]:
+        full_name = to_text(values[COLUMN_FULL_NAME])
+        if not full_name:
+            return None
+
+        division_name = to_text(values[COLUMN_DIVISION])
+        if not division_name:
+            self.errors.append(f"Строка {row_num}: Не указано подразделение")
+            return None
+
+        position_name = to_text(values[COLUMN_POSITION])
+        if not position_name:
+            self.errors.append(f"Строка {row_num}: Не указана должность")
+            return None
+
+        category_value = values[COLUMN_CATEGORY]
+        if not category_value or category_value not in self.category_map:
+            self.errors.append(f"Строка {row_num}: Неверная категория '{category_value}'")
+            return None
+
+        try:
+            rate = _decimal_value('rate', values[COLUMN_RATE], Decimal('1'))
+            allowance_amount = _decimal_value('allowance_amount', values[COLUMN_ALLOWANCE_AMOUNT], Decimal('0'))
+            payment = _decimal_value('payment', values[COLUMN_PAYMENT], Decimal('0'))
+        except (ValueError, TypeError, ValidationError) as exc:
+            message = '; '.join(exc.messages) if isinstance(exc, ValidationError) else str(exc)
+            self.errors.append(f"Строка {row_num}: Некорректные числовые значения - {message}")
+            return None
+
+        try:
+            allowance_until = _date_value(values[COLUMN_ALLOWANCE_UNTIL])
+        except ValueError:
+            self.errors.append(f"Строка {row_num}: Некорректный формат даты")
+            return None
+
+        return ParsedEmployeeRow(
+            row_num=row_num,
+            full_name=full_name,
+            division_name=division_name,
+            position_name=position_name,
+            category=self.category_map[category_value],
+            rate=rate,
+            allowance_amount=allowance_amount,
+            allowance_reason=to_text(values[COLUMN_ALLOWANCE_REASON]),
+            allowance_until=allowance_until,
+            payment=payment,
+            justification=to_text(values[COLUMN_JUSTIFICATION]),
+        )
+
+
+class EmployeeImportError(Exception):
+    pass
+
+
+def _chunks(items: list, size: int) -> Iterator[list]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def stage_employee_import(rows: Iterable[tuple], *, user, filename: str = '', full_sync: bool = False) -> EmployeeImport:
+    """
+    Разбирает строки файла (номер строки, значения), записывает их в промежуточную таблицу
+    и сравнивает с текущими сотрудниками. В таблицу сотрудников ничего не пишется.
+    """
+    parser = EmployeeRowParser()
+
+    # Повторная строка с тем же ФИО заменяет предыдущую
+    rows_by_name: dict[str, ParsedEmployeeRow] = {}
+    for row in parser.parse(rows):
+        previous = rows_by_name.get(row.full_name)
+        if previous is not None:
+            parser.errors.append(
+                f"Строка {row.row_num}: ФИО '{row.full_name}' уже указано в строке {previous.row_num}, "
+                f"используются данные строки {row.row_num}"
+            )
+        rows_by_name[row.full_name] = row
+
+    purge_stale_employee_imports()
+    with transaction.atomic():
+        employee_import = EmployeeImport.objects.create(
+            uploaded_by=user,
+            filename=filename[:255],
+            full_sync=full_sync,
+            errors=parser.errors,
+        )
+        staged_rows = [StagedEmployeeRow(employee_import=employee_import, **asdict(row)) for row in rows_by_name.values()]
+        for batch in _chunks(staged_rows, IMPORT_BATCH_SIZE):
+            StagedEmployeeRow.objects.bulk_create(batch)
+        compare_staged_rows(employee_import)
+    return employee_import
+
+
+def compare_staged_rows(employee_import: EmployeeImport) -> None:
+    """
+    Сопоставляет строки загрузки с сотрудниками по ФИО и проставляет действие каждой строке;
+    итоги сохраняются в счётчиках загрузки. Всё считается запросами UPDATE/COUNT над множеством строк.
+    """
+    rows = employee_import.rows.all()
+    matches = Employee.objects.filter(full_name=OuterRef('full_name')).order_by()
+    rows.update(
+        employee=Subquery(matches.order_by('pk').values('pk')[:1]),
+        match_count=Coalesce(Subquery(matches.values('full_name').annotate(total=Count('pk')).values('total')), 0),
+        action='',
+    )
+    rows.filter(match_count=0).update(action=StagedEmployeeRow.Action.CREATE)
+    rows.filter(match_count__gt=1).update(action=StagedEmployeeRow.Action.CONFLICT)
+    all_fields_match = Q()
+    for condition in FIELD_MATCHES.values():
+        all_fields_match &= condition
+    rows.filter(all_fields_match, match_count=1).update(action=StagedEmployeeRow.Action.UNCHANGED)
+    rows.filter(action='').update(action=StagedEmployeeRow.Action.UPDATE)
+
+    counts = dict(rows.order_by().values_list('action').annotate(total=Count('pk')))
+    employee_import.created_count = counts.get(StagedEmployeeRow.Action.CREATE, 0)
+    employee_import.updated_count = counts.get(StagedEmployeeRow.Action.UPDATE, 0)
+    employee_import.unchanged_count = counts.get(StagedEmployeeRow.Action.UNCHANGED, 0)
+    employee_import.conflict_count = counts.get(StagedEmployeeRow.Action.CONFLICT, 0)
+    employee_import.deleted_count = employees_to_delete(employee_import).count()
+    employee_import.save(update_fields=[
+        'created_count', 'updated_count', 'unchanged_count', 'conflict_count', 'deleted_count',
+    ])
+
+
+def employees_to_delete(employee_import: EmployeeImport):
+    """Сотрудники, отсутствующие в файле (только для полной синхронизации)."""
+    if not employee_import.full_sync:
+        return Employee.objects.none()
+    return Employee.objects.exclude(full_name__in=employee_import.rows.values('full_name'))
+
+
+def _with_field_matches(queryset):
+    return queryset.annotate(**{
+        f'same_{name}': Case(When(condition, then=Value(True)), default=Value(False), output_field=BooleanField())
+        for name, condition in FIELD_MATCHES.items()
+    })
+
+
+def _field_label(name: str) -> str:
+    return str(Employee._meta.get_field(name).verbose_name)
+
+
+def _field_values(row: StagedEmployeeRow, name: str) -> tuple:
+    employee = row.employee
+    if name == 'division':
+        return employee.division.name, row.division_name
+    if name == 'position':
+        return employee.position.name, row.position_name
+    if name == 'category':
+        return employee.get_category_display(), row.get_category_display()
+    return getattr(employee, name), getattr(row, name)
+
+
+def changed_rows(employee_import: EmployeeImport, limit: int = PREVIEW_ROW_LIMIT) -> list:
+    """Изменённые строки для предпросмотра: [(строка, [FieldChange, ...]), ...]."""
+    queryset = _with_field_matches(
+        employee_import.rows.filter(action=StagedEmployeeRow.Action.UPDATE)
+        .select_related('employee__division', 'employee__position')
+    )
+    result = []
+    for row in queryset[:limit]:
+        changes = []
+        for name in FIELD_MATCHES:
+            if not getattr(row, f'same_{name}'):
+                old, new = _field_values(row, name)
+                changes.append(FieldChange(_field_label(name), old, new))
+        result.append((row, changes))
+    return result
+
+
+def field_change_counts(employee_import: EmployeeImport) -> list:
+    """Сколько сотрудников меняется по каждому полю: [(подпись, число), ...] без нулевых."""
+    queryset = _with_field_matches(employee_import.rows.filter(action=StagedEmployeeRow.Action.UPDATE))
+    totals = queryset.aggregate(**{
+        name: Count('pk', filter=Q(**{f'same_{name}': False}))
+        for name in FIELD_MATCHES
+    })
+    return [(_field_label(name), totals[name]) for name in FIELD_MATCHES if totals[name]]
+
+
+def missing_reference_names(employee_import: EmployeeImport) -> tuple[list, list]:
+    """Подразделения и должности из файла, которые будут созданы при применении."""
+    rows = employee_import.rows.filter(
+        action__in=[StagedEmployeeRow.Action.CREATE, StagedEmployeeRow.Action.UPDATE]
+    ).order_by()
+    divisions = (
+        rows.exclude(division_name__in=Division.objects.values('name'))
+        .values_list('division_name', flat=True).distinct().order_by('division_name')
+    )
+    positions = (
+        rows.exclude(position_name__in=Position.objects.values('name'))
+        .values_list('position_name', flat=True).distinct().order_by('position_name')
+    )
+    return list(divisions), list(positions)
+
+
+def ensure_named_objects(model, names: set, defaults: Optional[dict] = None) -> tuple[dict, int]:
+    """Возвращает {название: объект}, создавая недостающие записи одной пачкой."""
+    existing = {obj.name: obj for obj in model.objects.filter(name__in=names)}
+    missing = sorted(names - existing.keys())
+    if missing:
+        model.objects.bulk_create(
+            [model(name=name, **(defaults or {})) for name in missing],
+            batch_size=IMPORT_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        existing.update({obj.name: obj for obj in model.objects.filter(name__in=missing)})
+    return existing, len(missing)
+
+
+def _merge_updated_rows(employee_import: EmployeeImport) -> int:
+    """Переносит значения изменённых строк в таблицу сотрудников одним UPDATE с подзапросами."""
+    staged = StagedEmployeeRow.objects.filter(
+        employee_import=employee_import,
+        action=StagedEmployeeRow.Action.UPDATE,
+        employee=OuterRef('pk'),
+    ).order_by()
+    values = {
+        name: Subquery(staged.values(name)[:1])
+        for name in FIELD_MATCHES
+        if name not in ('division', 'position')
+    }
+    values['division'] = Subquery(
+        staged.annotate(
+            division_pk=Subquery(Division.objects.filter(name=OuterRef('division_name')).values('pk')[:1])
+        ).values('division_pk')[:1]
+    )
+    values['position'] = Subquery(
+        staged.annotate(
+            position_pk=Subquery(Position.objects.filter(name=OuterRef('position_name')).values('pk')[:1])
+        ).values('position_pk')[:1]
+    )
+    updated_ids = employee_import.rows.filter(action=StagedEmployeeRow.Action.UPDATE).values('employee')
+    return Employee.objects.filter(pk__in=updated_ids).update(updated_at=timezone.now(), **values)
+
+
+def _insert_created_rows(employee_import: EmployeeImport, divisions: dict, positions: dict) -> int:
+    created = 0
+    batch = []
+    rows = employee_import.rows.filter(action=StagedEmployeeRow.Action.CREATE)
+    for row in rows.iterator(chunk_size=IMPORT_BATCH_SIZE):
+        batch.append(Employee(
+            full_name=row.full_name,
+            division=divisions[row.division_name],
+            position=positions[row.position_name],
+            category=row.category,
+            rate=row.rate,
+            allowance_amount=row.allowance_amount,
+            allowance_reason=row.allowance_reason,
+            allowance_until=row.allowance_until,
+            payment=row.payment,
+            justification=row.justification,
+        ))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            Employee.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+    if batch:
+        Employee.objects.bulk_create(batch)
+        created += len(batch)
+    return created
+
+
+def apply_employee_import(employee_import: EmployeeImport) -> EmployeeImport:
+    """
+    Применяет загрузку одной транзакцией. Сравнение пересчитывается, так как данные могли
+    измениться после предпросмотра; строки без изменений и с неоднозначным ФИО пропускаются.
+    """
+    with transaction.atomic():
+        claimed = EmployeeImport.objects.filter(
+            pk=employee_import.pk,
+            status=EmployeeImport.Status.STAGED,
+        ).update(status=EmployeeImport.Status.APPLIED, applied_at=timezone.now())
+        if not claimed:
+            raise EmployeeImportError('Загрузка уже применена или отменена.')
+        employee_import.refresh_from_db()
+
+        compare_staged_rows(employee_import)
+        changed = employee_import.rows.filter(
+            action__in=[StagedEmployeeRow.Action.CREATE, StagedEmployeeRow.Action.UPDATE]
+        ).order_by()
+        divisions, employee_import.auto_created_divisions = ensure_named_objects(
+            Division, set(changed.values_list('division_name', flat=True).distinct())
+        )
+        positions, employee_import.auto_created_positions = ensure_named_objects(
+            Position, set(changed.values_list('position_name', flat=True).distinct()), defaults={'base_salary': 0}
+        )
+
+        # Счётчики только что пересчитаны в этой транзакции: пустые шаги не выполняем вовсе
+        if employee_import.updated_count:
+            employee_import.updated_count = _merge_updated_rows(employee_import)
+        if employee_import.created_count:
+            employee_import.created_count = _insert_created_rows(employee_import, divisions, positions)
+        if employee_import.deleted_count:
+            _, deleted_by_model = employees_to_delete(employee_import).delete()
+            employee_import.deleted_count = deleted_by_model.get(Employee._meta.label, 0)
+        if employee_import.updated_count or employee_import.created_count:
+            # UPDATE и bulk_create не отправляют post_save: факты и версию данных обновляют
+            # подписчики employees_bulk_updated
+            employees_bulk_updated.send(
+                sender=Employee,
+                employee_ids=list(
+                    employee_import.rows.filter(action=StagedEmployeeRow.Action.UPDATE)
+                    .values_list('employee', flat=True)
+                ),
+            )
+
+        employee_import.save(update_fields=[
+            'created_count', 'updated_count', 'deleted_count', 'auto_created_divisions', 'auto_created_positions',
+        ])
+    return employee_import
+
+
+def discard_employee_import(employee_import: EmployeeImport) -> bool:
+    """Отменяет неподтверждённую загрузку и удаляет её строки."""
+    with transaction.atomic():
+        discarded = EmployeeImport.objects.filter(
+            pk=employee_import.pk,
+            status=EmployeeImport.Status.STAGED,
+        ).update(status=EmployeeImport.Status.DISCARDED)
+        if discarded:
+            employee_import.rows.all().delete()
+    return bool(discarded)
+
+
+def purge_stale_employee_imports(now=None) -> None:
+    """Отменяет давно не подтверждённые загрузки и удаляет строки всех загрузок старше STAGED_IMPORT_TTL."""
+    cutoff = (now or timezone.now()) - STAGED_IMPORT_TTL
+    EmployeeImport.objects.filter(status=EmployeeImport.Status.STAGED, created_at__lt=cutoff).update(
+        status=EmployeeImport.Status.DISCARDED
+    )
+    StagedEmployeeRow.objects.filter(employee_import__created_at__lt=cutoff).delete()
+
+
+@dataclass(frozen=True)
+class SheetColumn:
+    """Столбец листа: ключ записи, допустимые заголовки и приведение значения ячейки."""
+    key: str
+    headers: tuple
+    coerce: Callable = to_text
+    required: bool = True
+
+
+@dataclass
+class SheetRecord:
+    sheet: str
+    row_num: int
+    values: dict
+
+
+@dataclass
+class SheetStats:
+    sheet: str
+    rows: int = 0
+    loaded: int = 0
+    skipped: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+class SpreadsheetReader:
+    """
+    Потоковое чтение книги Excel для команд импорта.
+
+    Первая строка каждого листа — заголовки; столбцы ищутся по названию, а не по букве.
+    Листы без обязательных столбцов пропускаются (см. skipped_sheets). batches() отдаёт
+    списки SheetRecord не длиннее batch_size; строки с ошибками приведения в пачки не попадают,
+    а описываются в errors. Время в stats включает обработку пачек вызывающим кодом,
+    т.е. это пропускная способность всего импорта.
+    """
+
+    def __init__(self, path, columns, *, batch_size=IMPORT_BATCH_SIZE, sheet_names=None, skip_row=None):
+        self.path = path
+        self.columns = list(columns)
+        self.batch_size = batch_size
+        self.sheet_names = set(sheet_names or ())
+        self.skip_row = skip_row
+        self.errors: list[str] = []
+        self.error_count = 0
+        self.stats: list[SheetStats] = []
+        self.skipped_sheets: list[tuple] = []
+
+    def batches(self) -> Iterator[list]:
+        workbook = open_workbook(self.path)
+        try:
+            for worksheet in workbook.worksheets:
+                if self.sheet_names and worksheet.title not in self.sheet_names:
+                    continue
+                yield from self._read_sheet(worksheet)
+        finally:
+            workbook.close()
+
+    def _read_sheet(self, worksheet) -> Iterator[list]:
+        rows = worksheet.iter_rows(values_only=True)
+        indexes, missing = self._map_headers(next(rows, None) or ())
+        if missing:
+            self.skipped_sheets.append((worksheet.title, missing))
+            return
+
+        stats = SheetStats(worksheet.title)
+        self.stats.append(stats)
+        started = time.monotonic()
+        batch = []
+        for row_num, values in enumerate(rows, start=2):
+            stats.rows += 1
+            record = self._read_row(worksheet.title, row_num, values, indexes, stats)
+            if record is None:
+                continue
+            batch.append(record)
+            stats.loaded += 1
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+        stats.seconds = time.monotonic() - started
+
+    def _map_headers(self, header_row) -> tuple[dict, list]:
+        positions = {}
+        for index, title in enumerate(header_row):
+            title = to_text(title)
+            if title and title not in positions:
+                positions[title] = index
+        indexes = {}
+        missing = []
+        for column in self.columns:
+            index = next((positions[title] for title in column.headers if title in positions), None)
+            if index is not None:
+                indexes[column.key] = index
+            elif column.required:
+                missing.append(column.headers[0])
+        return indexes, missing
+
+    def _read_row(self, sheet, row_num, values, indexes, stats) -> Optional[SheetRecord]:
+        raw = {
+            key: values[index] if index < len(values) else None
+            for key, index in indexes.items()
+        }
+        if all(value in (None, '') for value in raw.values()) or (self.skip_row and self.skip_row(raw)):
+            stats.skipped += 1
+            return None
+
+        record = {}
+        for column in self.columns:
+            try:
+                record[column.key] = column.coerce(raw.get(column.key))
+            except (ValueError, TypeError, ValidationError) as exc:
+                message = '; '.join(exc.messages) if isinstance(exc, ValidationError) else str(exc)
+                self.add_error(f"Лист «{sheet}», строка {row_num}, столбец «{column.headers[0]}»: {message}")
+                stats.errors += 1
+                return None
+        return SheetRecord(sheet, row_num, record)
+
+    def add_error(self, message: str) -> None:
+        self.error_count += 1
+        if len(self.errors) < MAX_STORED_ERRORS:
+            self.errors.append(message)
+
+    @property
+    def total_rows(self) -> int:
+        return sum(stats.rows for stats in self.stats)
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(stats.seconds for stats in self.stats)
@@ -1,6 +1,8 @@
 from pathlib import Path
 from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from staffing.models import Division, Position
+from stimuli.imports import IMPORT_BATCH_SIZE, SheetColumn, SpreadsheetReader
 
 
 class Command(BaseCommand):
@@ -13,96 +15,85 @@ class Command(BaseCommand):
             action='store_true',
             help='Показать что будет создано без фактического создания'
         )
+        parser.add_argument(
+            '--sheet',
+            action='append',
+            dest='sheets',
+            help='Читать только указанный лист (можно повторять). По умолчанию — все листы с нужными колонками'
+        )
 
     def handle(self, *args, **options):
         xlsx_path = Path(options['xlsx_path']).expanduser()
         if not xlsx_path.exists():
             raise CommandError(f'Файл {xlsx_path} не найден')
 
-        try:
-            from openpyxl import load_workbook
-        except ImportError as exc:
-            raise CommandError('Для импорта требуется установить пакет openpyxl') from exc
-
         dry_run = options['dry_run']
-        
-        wb = load_workbook(filename=xlsx_path, read_only=True)
-        ws = wb.active
 
-        # Получаем заголовки
-        headers = []
-        for cell in ws[1]:
-            headers.append((cell.column_letter, (cell.value or '').strip()))
+        # Собираем уникальные подразделения и должности со всех листов
+        reader = SpreadsheetReader(
+            xlsx_path,
+            [SheetColumn('division', ('Подразделение',)), SheetColumn('position', ('Должность',))],
+            sheet_names=options['sheets'],
+        )
+        divisions = set()
+        positions = set()
 
-        # Находим колонки с подразделениями и должностями
-        division_col = None
-        position_col = None
-        
-        for letter, title in headers:
-            if title == 'Подразделение':
-                division_col = letter
-            elif title == 'Должность':
-                position_col = letter
+        try:
+            for batch in reader.batches():
+                for record in batch:
+                    division_name = record.values['division']
+                    position_name = record.values['position']
 
-        if not division_col:
-            raise CommandError('В файле не найдена колонка "Подразделение"')
-        if not position_col:
-            raise CommandError('В файле не найдена колонка "Должность"')
+                    if division_name and division_name.upper() != 'ВСЕГО':
+                        divisions.add(division_name)
 
-        # Собираем уникальные подразделения и должности
-        divisions = set()
-        positions = set()
-        
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            row_data = {headers[idx][1]: value for idx, value in enumerate(row) if idx < len(headers)}
-            
-            division_name = (row_data.get('Подразделение') or '').strip()
-            position_name = (row_data.get('Должность') or '').strip()
-            
-            if division_name and division_name.upper() != 'ВСЕГО':
-                divisions.add(division_name)
-            
-            if position_name and position_name.upper() != 'ВСЕГО':
-                positions.add(position_name)
+                    if position_name and position_name.upper() != 'ВСЕГО':
+                        positions.add(position_name)
+        except ValueError as exc:
+            raise CommandError(str(exc)) from exc
+
+        if not reader.stats:
+            raise CommandError('В файле не найдены колонки "Подразделение" и "Должность"')
+        for stats in reader.stats:
+            self.stdout.write(
+                f'Лист «{stats.sheet}»: строк {stats.rows}; {stats.seconds:.1f} с, {stats.rows_per_second:.0f} строк/с'
+            )
 
-        wb.close()
+        existing_divisions = set(Division.objects.filter(name__in=divisions).values_list('name', flat=True))
+        existing_positions = set(Position.objects.filter(name__in=positions).values_list('name', flat=True))
+        created_divisions = sorted(divisions - existing_divisions)
+        created_positions = sorted(positions - existing_positions)
 
-        # Создаем подразделения
-        created_divisions = []
+        if not dry_run:
+            with transaction.atomic():
+                Division.objects.bulk_create(
+                    [Division(name=name) for name in created_divisions],
+                    batch_size=IMPORT_BATCH_SIZE,
+                    ignore_conflicts=True,
+                )
+                Position.objects.bulk_create(
+                    [Position(name=name, base_salary=0) for name in created_positions],
+                    batch_size=IMPORT_BATCH_SIZE,
+                    ignore_conflicts=True,
+                )
+
+        # Подразделения
         for division_name in sorted(divisions):
-            if dry_run:
-                if not Division.objects.filter(name=division_name).exists():
-                    created_divisions.append(division_name)
-                    self.stdout.write(f'[DRY RUN] Будет создано подразделение: {division_name}')
-                else:
-                    self.stdout.write(f'Подразделение уже существует: {division_name}')
+            if division_name in existing_divisions:
+                self.stdout.write(f'Подразделение уже существует: {division_name}')
+            elif dry_run:
+                self.stdout.write(f'[DRY RUN] Будет создано подразделение: {division_name}')
             else:
-                division_obj, created = Division.objects.get_or_create(name=division_name)  # noqa: E501
-                if created:
-                    created_divisions.append(division_name)
-                    self.stdout.write(self.style.SUCCESS(f'✓ Создано подразделение: {division_name}'))  # noqa: E501
-                else:
-                    self.stdout.write(f'Подразделение уже существует: {division_name}')
+                self.stdout.write(self.style.SUCCESS(f'✓ Создано подразделение: {division_name}'))
 
-        # Создаем должности
-        created_positions = []
+        # Должности
         for position_name in sorted(positions):
-            if dry_run:
-                if not Position.objects.filter(name=position_name).exists():
-                    created_positions.append(position_name)
-                    self.stdout.write(f'[DRY RUN] Будет создана должность: {position_name}')
-                else:
-                    self.stdout.write(f'Должность уже существует: {position_name}')
+            if position_name in existing_positions:
+                self.stdout.write(f'Должность уже существует: {position_name}')
+            elif dry_run:
+                self.stdout.write(f'[DRY RUN] Будет создана должность: {position_name}')
             else:
-                position_obj, created = Position.objects.get_or_create(  # noqa: E501
-                    name=position_name,
-                    defaults={'base_salary': 0}
-                )
-                if created:
-                    created_positions.append(position_name)
-                    self.stdout.write(self.style.SUCCESS(f'✓ Создана должность: {position_name}'))  # noqa: E501
-                else:
-                    self.stdout.write(f'Должность уже существует: {position_name}')
+                self.stdout.write(self.style.SUCCESS(f'✓ Создана должность: {position_name}'))
 
         # Итоговая статистика
         if dry_run:
@@ -0,0 +1,106 @@
+"""
+Команда для проверки планов выполнения ключевых запросов.
+Показывает EXPLAIN (на PostgreSQL — с опцией ANALYZE) для списков заявок,
+карточки кампании, дэшборда и выгрузок, чтобы убедиться, что планировщик использует индексы.
+"""
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from one_time_payments.models import RequestCampaign
+from stimuli.models import Employee, StimulusRequest
+from stimuli.search import search_employees
+
+
+class Command(BaseCommand):
+    help = 'Выводит планы выполнения (EXPLAIN) ключевых запросов к заявкам и сотрудникам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--analyze',
+            action='store_true',
+            help='Выполнить запросы и показать фактическое время (EXPLAIN ANALYZE, только PostgreSQL)',
+        )
+        parser.add_argument(
+            '--only',
+            action='append',
+            default=[],
+            help='Показать только запросы с указанным ключом (можно указать несколько раз)',
+        )
+
+    def handle(self, *args, **options):
+        explain_options = {}
+        if options['analyze']:
+            if connection.vendor != 'postgresql':
+                self.stdout.write(self.style.WARNING('ANALYZE поддерживается только на PostgreSQL, опция пропущена.'))
+            else:
+                explain_options = {'analyze': True, 'buffers': True}
+
+        queries = self._build_queries()
+        selected = set(options['only'])
+        if selected:
+            unknown = selected - {key for key, _, _ in queries}
+            for key in sorted(unknown):
+                self.stdout.write(self.style.WARNING(f'Неизвестный ключ запроса: {key}'))
+            queries = [item for item in queries if item[0] in selected]
+
+        self.stdout.write(f'База данных: {connection.vendor}')
+        for key, title, queryset in queries:
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n[{key}] {title}'))
+            try:
+                plan = queryset.explain(**explain_options)
+            except Exception as exc:
+                self.stdout.write(self.style.ERROR(f'  Ошибка: {exc}'))
+                continue
+            for line in plan.splitlines():
+                self.stdout.write(f'  {line}')
+
+    def _build_queries(self):
+        campaign_id = (
+            RequestCampaign.objects.order_by('-opens_at').values_list('pk', flat=True).first() or 0
+        )
+        sample = StimulusRequest.objects.order_by('-created_at').values('employee_id', 'requested_by_id').first() or {}
+        employee_id = sample.get('employee_id') or 0
+        requested_by_id = sample.get('requested_by_id') or 0
+        pending = StimulusRequest.Status.PENDING
+        employee_name = Employee.objects.filter(pk=employee_id).values_list('full_name', flat=True).first() or ''
+        employee_query = employee_name.split()[0] if employee_name.strip() else 'Иванов'
+        requests = StimulusRequest.objects.select_related('employee', 'requested_by', 'campaign')
+
+        return [
+            (
+                'campaign_status',
+                'Заявки кампании по статусу (карточка кампании, выгрузки)',
+                requests.filter(campaign_id=campaign_id, status=pending).order_by('employee__full_name', 'pk'),
+            ),
+            (
+                'campaign_summary',
+                'Сводка по кампании (условная агрегация)',
+                StimulusRequest.objects.filter(campaign_id=campaign_id).approved().order_by().values('campaign_id'),
+            ),
+            (
+                'employee_status',
+                'Одобренные заявки сотрудника (пересчёт итогов)',
+                StimulusRequest.objects.filter(employee_id=employee_id, status=StimulusRequest.Status.APPROVED)
+                .order_by().values('employee_id'),
+            ),
+            (
+                'requester_status',
+                'Заявки ответственного по статусу (список заявок)',
+                requests.filter(requested_by_id=requested_by_id, status=pending).order_by('-created_at'),
+            ),
+            (
+                'status_created',
+                'Заявки по статусу с сортировкой по дате (список заявок, дэшборд)',
+                requests.filter(status=StimulusRequest.Status.APPROVED).order_by('-created_at')[:25],
+            ),
+            (
+                'employee_list',
+                'Список сотрудников с сортировкой по ФИО',
+                Employee.objects.select_related('division', 'position').order_by('full_name')[:25],
+            ),
+            (
+                'employee_search',
+                'Поиск сотрудников по ФИО и обоснованию (фильтр списка, API, админка)',
+                search_employees(Employee.objects.all(), employee_query)[:25],
+            ),
+        ]
@@ -2,10 +2,53 @@ from decimal import Decimal
 from pathlib import Path
 
 from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
 
 from staffing.models import Division, Position
+from stimuli.imports import (
+    IMPORT_BATCH_SIZE,
+    SheetColumn,
+    SpreadsheetReader,
+    category_codes,
+    ensure_named_objects,
+    to_decimal,
+    to_text,
+)
+from stimuli.hooks import employees_bulk_updated
 from stimuli.models import Employee
 
+# Поля, которые команда перезаписывает у существующих сотрудников
+UPDATE_FIELDS = [
+    'division',
+    'position',
+    'category',
+    'rate',
+    'allowance_amount',
+    'allowance_reason',
+    'payment',
+    'justification',
+    'updated_at',
+]
+
+
+def _category_or_other(value):
+    return category_codes().get(to_text(value), Employee.Category.OTHER)
+
+
+def _is_total_row(raw):
+    return to_text(raw.get('full_name')).upper() in ('', 'ВСЕГО')
+
+
+COLUMNS = [
+    SheetColumn('full_name', ('ФИО',)),
+    SheetColumn('division', ('Подразделение',), coerce=lambda value: to_text(value) or 'Не указано'),
+    SheetColumn('position', ('Должность',), coerce=lambda value: to_text(value) or 'Без должности'),
+    SheetColumn('category', ('Категория (АУП/ППС)', 'Категория'), coerce=_category_or_other),
+    SheetColumn('payment', ('Выплаты', 'Выплата'), coerce=lambda value: to_decimal(value) or Decimal('0')),
+    SheetColumn('justification', ('Обоснование',)),
+]
+
 
 class Command(BaseCommand):
     help = 'Импортировать сотрудников из Excel-файла, экспортированного из таблицы стимулирующих выплат.'
@@ -17,99 +60,139 @@ class Command(BaseCommand):
             action='store_true',
             help='Удалить существующих сотрудников перед импортом'
         )
+        parser.add_argument(
+            '--sheet',
+            action='append',
+            dest='sheets',
+            help='Импортировать только указанный лист (можно повторять). По умолчанию — все листы с нужными столбцами'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help=f'Размер пачки записи в БД (по умолчанию {IMPORT_BATCH_SIZE})'
+        )
 
     def handle(self, *args, **options):
         xlsx_path = Path(options['xlsx_path']).expanduser()
         if not xlsx_path.exists():
             raise CommandError(f'Файл {xlsx_path} не найден')
 
-        try:
-            from openpyxl import load_workbook
-        except ImportError as exc:
-            raise CommandError('Для импорта требуется установить пакет openpyxl') from exc
-
-        if options['truncate']:
-            deleted_count, _ = Employee.objects.all().delete()
-            self.stdout.write(self.style.WARNING(f'Удалено записей сотрудников: {deleted_count}'))
-
-        wb = load_workbook(filename=xlsx_path, read_only=True)
-        ws = wb.active
-
-        headers = []
-        for cell in ws[1]:
-            headers.append((cell.column_letter, (cell.value or '').strip()))
-
-        column_map = {}
-        expected = {
-            'ФИО': 'full_name',
-            'Подразделение': 'division',
-            'Должность': 'position',
-            'Категория (АУП/ППС)': 'category',
-            'Выплаты': 'payment',
-            'Обоснование': 'justification',
-        }
-
-        for letter, title in headers:
-            if title in expected:
-                column_map[expected[title]] = letter
-
-        missing = [field for field in expected.values() if field not in column_map]
-        if missing:
-            raise CommandError(f'В файле отсутствуют требуемые столбцы: {", ".join(missing)}')
-
-        created = 0
-        updated = 0
-        skipped = 0
+        reader = SpreadsheetReader(
+            xlsx_path,
+            COLUMNS,
+            batch_size=max(1, options['batch_size']),
+            sheet_names=options['sheets'],
+            skip_row=_is_total_row,
+        )
+        self.divisions = {}
+        self.positions = {}
+        self.created = 0
+        self.updated = 0
 
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            row_data = {headers[idx][1]: value for idx, value in enumerate(row) if idx < len(headers)}
-            full_name = (row_data.get('ФИО') or '').strip()
+        try:
+            with transaction.atomic():
+                if options['truncate']:
+                    deleted_count, _ = Employee.objects.all().delete()
+                    self.stdout.write(self.style.WARNING(f'Удалено записей сотрудников: {deleted_count}'))
+
+                for batch in reader.batches():
+                    self._write_batch(batch, reader)
+                    if options['verbosity'] >= 2:
+                        self.stdout.write(f'  обработано строк: {reader.total_rows}')
+
+                if not reader.stats:
+                    missing = '; '.join(f'«{sheet}»: {", ".join(columns)}' for sheet, columns in reader.skipped_sheets)
+                    raise CommandError(f'В файле отсутствуют требуемые столбцы: {missing}')
+        except ValueError as exc:
+            raise CommandError(str(exc)) from exc
+
+        self._report(reader)
+
+    def _write_batch(self, batch, reader):
+        # Повторная строка с тем же ФИО перезаписывает предыдущую
+        records = {}
+        repeated = 0
+        for record in batch:
+            if record.values['full_name'] in records:
+                repeated += 1
+            records[record.values['full_name']] = record
+
+        self._resolve(Division, self.divisions, {record.values['division'] for record in records.values()})
+        self._resolve(
+            Position,
+            self.positions,
+            {record.values['position'] for record in records.values()},
+            defaults={'base_salary': 0},
+        )
 
-            if not full_name or full_name.upper() == 'ВСЕГО':
-                skipped += 1
+        existing = {}
+        for employee in Employee.objects.filter(full_name__in=list(records)):
+            existing.setdefault(employee.full_name, []).append(employee)
+
+        to_create = []
+        to_update = []
+        now = timezone.now()
+        for full_name, record in records.items():
+            matches = existing.get(full_name, [])
+            if len(matches) > 1:
+                reader.add_error(
+                    f"Лист «{record.sheet}», строка {record.row_num}: найдено несколько сотрудников "
+                    f"с ФИО '{full_name}', строка пропущена"
+                )
                 continue
-
-            division_name = (row_data.get('Подразделение') or '').strip() or 'Не указано'
-            division_obj, _ = Division.objects.get_or_create(name=division_name)
-            position_name = (row_data.get('Должность') or '').strip() or 'Без должности'
-            position_obj, _ = Position.objects.get_or_create(name=position_name)
-            category = (row_data.get('Категория (АУП/ППС)') or '').strip() or Employee.Category.OTHER
-
-            if category not in dict(Employee.Category.choices):
-                category = Employee.Category.OTHER
-
-            payment_value = row_data.get('Выплаты')
-            payment = Decimal('0')
-            if payment_value not in (None, ''):
-                try:
-                    payment = Decimal(str(payment_value).replace(' ', '').replace(',', '.'))
-                except Exception:
-                    self.stdout.write(self.style.WARNING(
-                        f'Не удалось преобразовать сумму "{payment_value}" для {full_name}. Установлен 0.'
-                    ))
-
-            justification = (row_data.get('Обоснование') or '').strip()
-
-            obj, created_flag = Employee.objects.update_or_create(
-                full_name=full_name,
-                defaults={
-                    'division': division_obj,
-                    'position': position_obj,
-                    'category': category,
-                    'rate': 1,
-                    'allowance_amount': Decimal('0'),
-                    'allowance_reason': '',
-                    'payment': payment,
-                    'justification': justification,
-                },
+            employee = matches[0] if matches else Employee(full_name=full_name)
+            employee.division = self.divisions[record.values['division']]
+            employee.position = self.positions[record.values['position']]
+            employee.category = record.values['category']
+            employee.rate = 1
+            employee.allowance_amount = Decimal('0')
+            employee.allowance_reason = ''
+            employee.payment = record.values['payment']
+            employee.justification = record.values['justification']
+            if employee.pk is None:
+                to_create.append(employee)
+            else:
+                employee.updated_at = now
+                to_update.append(employee)
+
+        Employee.objects.bulk_create(to_create)
+        Employee.objects.bulk_update(to_update, UPDATE_FIELDS)
+        if to_create or to_update:
+            # bulk_create и bulk_update не отправляют post_save
+            employees_bulk_updated.send(sender=Employee, employee_ids=[employee.pk for employee in to_update])
+        self.created += len(to_create)
+        self.updated += len(to_update) + repeated
+
+    def _resolve(self, model, cache, names, defaults=None):
+        missing = names - cache.keys()
+        if missing:
+            objects, _ = ensure_named_objects(model, missing, defaults=defaults)
+            cache.update(objects)
+
+    def _report(self, reader):
+        for sheet, columns in reader.skipped_sheets:
+            self.stdout.write(self.style.WARNING(
+                f'Лист «{sheet}» пропущен: нет столбцов {", ".join(columns)}'
+            ))
+        for stats in reader.stats:
+            self.stdout.write(
+                f'Лист «{stats.sheet}»: строк {stats.rows}, загружено {stats.loaded}, '
+                f'пропущено {stats.skipped}, ошибок {stats.errors}; '
+                f'{stats.seconds:.1f} с, {stats.rows_per_second:.0f} строк/с'
             )
 
-            if created_flag:
-                created += 1
-            else:
-                updated += 1
+        if reader.errors:
+            self.stdout.write(self.style.WARNING(f'Ошибки ({reader.error_count}):'))
+            for error in reader.errors[:20]:
+                self.stdout.write(f'  {error}')
+            if reader.error_count > 20:
+                self.stdout.write(f'  ... и еще {reader.error_count - 20}')
 
+        skipped = sum(stats.skipped for stats in reader.stats)
+        total_seconds = reader.total_seconds
+        rate = reader.total_rows / total_seconds if total_seconds else 0
         self.stdout.write(self.style.SUCCESS(
-            f'Импорт завершён. Создано: {created}, обновлено: {updated}, пропущено: {skipped}'
+            f'Импорт завершён. Создано: {self.created}, обновлено: {self.updated}, пропущено: {skipped}, '
+            f'ошибок: {reader.error_count}. Строк: {reader.total_rows} за {total_seconds:.1f} с ({rate:.0f} строк/с)'
         ))
-        wb.close()
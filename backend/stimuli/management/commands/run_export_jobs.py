@@ -0,0 +1,68 @@
+"""
+Обработчик фоновых выгрузок вне веб-процесса.
+Запускайте с --loop отдельным процессом либо периодически через cron
+(при EXPORT_JOBS_RUN_IN_PROCESS=0 это единственный обработчик).
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from stimuli.export_jobs import purge_expired_export_jobs, run_export_job
+from stimuli.models import ExportJob
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые выгрузки из очереди и удаляет истёкшие файлы'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Работать непрерывно, опрашивая очередь',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2.0,
+            help='Пауза между опросами очереди в режиме --loop, секунд (по умолчанию 2)',
+        )
+        parser.add_argument(
+            '--purge-only',
+            action='store_true',
+            help='Только удалить истёкшие выгрузки',
+        )
+
+    def handle(self, *args, **options):
+        if options['purge_only']:
+            purged = purge_expired_export_jobs()
+            self.stdout.write(self.style.SUCCESS(f'Удалено истёкших выгрузок: {purged}'))
+            return
+
+        while True:
+            processed = self._process_pending()
+            purged = purge_expired_export_jobs()
+            if purged:
+                self.stdout.write(f'Удалено истёкших выгрузок: {purged}')
+            if not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'Обработано выгрузок: {processed}'))
+                return
+            if not processed:
+                time.sleep(options['interval'])
+
+    def _process_pending(self):
+        processed = 0
+        pending_ids = list(
+            ExportJob.objects.filter(status=ExportJob.Status.PENDING)
+            .order_by('created_at')
+            .values_list('pk', flat=True)
+        )
+        for job_id in pending_ids:
+            job = run_export_job(job_id)
+            if job is None:
+                continue
+            processed += 1
+            if job.status == ExportJob.Status.DONE:
+                self.stdout.write(f'Выгрузка #{job.pk} готова: {job.filename} ({job.progress} строк)')
+            else:
+                self.stdout.write(self.style.ERROR(f'Выгрузка #{job.pk} завершилась ошибкой: {job.error}'))
+        return processed
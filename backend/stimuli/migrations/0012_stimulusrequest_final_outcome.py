@@ -0,0 +1,36 @@
+# Generated manually
+
+from django.db import migrations, models
+
+
+def backfill_final_outcome(apps, schema_editor):
+    StimulusRequest = apps.get_model('stimuli', 'StimulusRequest')
+    archived = StimulusRequest.objects.filter(status='archived')
+    archived.filter(final_status__icontains='Одобрено').update(final_outcome='approved')
+    archived.filter(final_status__icontains='Отклонено').update(final_outcome='rejected')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stimuli', '0011_add_can_view_own_requests_to_userdivision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stimulusrequest',
+            name='final_outcome',
+            field=models.CharField(
+                blank=True,
+                choices=[('approved', 'Одобрено'), ('rejected', 'Отклонено')],
+                help_text='Решение по заявке на момент архивирования кампании',
+                max_length=16,
+                verbose_name='Итог рассмотрения',
+            ),
+        ),
+        migrations.RunPython(backfill_final_outcome, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='stimulusrequest',
+            index=models.Index(fields=['campaign', 'status', 'final_outcome'], name='stimreq_campaign_outcome_idx'),
+        ),
+    ]
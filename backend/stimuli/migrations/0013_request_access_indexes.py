@@ -0,0 +1,49 @@
+# Generated manually
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stimuli', '0012_stimulusrequest_final_outcome'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['full_name'], name='employee_full_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['division', 'full_name'], name='employee_division_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stimulusrequest',
+            index=models.Index(fields=['employee', 'status', 'amount'], name='stimreq_employee_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stimulusrequest',
+            index=models.Index(fields=['requested_by', 'status', '-created_at'], name='stimreq_requester_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stimulusrequest',
+            index=models.Index(fields=['status', '-created_at'], name='stimreq_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stimulusrequest',
+            index=models.Index(
+                condition=models.Q(status='pending'),
+                fields=['campaign', 'employee'],
+                name='stimreq_pending_campaign_idx',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='stimulusrequest',
+            index=models.Index(
+                condition=models.Q(status='pending'),
+                fields=['requested_by', '-created_at'],
+                name='stimreq_pending_requester_idx',
+            ),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated manually
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('stimuli', '0013_request_access_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('requests', 'Заявки'), ('campaign_requests', 'Заявки кампании'), ('campaign_approved', 'Одобренные заявки кампании'), ('position_quotas', 'Штатное расписание')], max_length=32, verbose_name='Тип выгрузки')),
+                ('export_format', models.CharField(default='xlsx', max_length=16, verbose_name='Формат')),
+                ('object_id', models.PositiveIntegerField(blank=True, null=True, verbose_name='Объект')),
+                ('query_string', models.TextField(blank=True, verbose_name='Параметры фильтров')),
+                ('params_hash', models.CharField(max_length=64, verbose_name='Ключ параметров')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка')], default='pending', max_length=16, verbose_name='Статус')),
+                ('progress', models.PositiveIntegerField(default=0, verbose_name='Обработано строк')),
+                ('total', models.PositiveIntegerField(blank=True, null=True, verbose_name='Всего строк')),
+                ('file', models.FileField(blank=True, upload_to='exports/%Y/%m/', verbose_name='Файл')),
+                ('filename', models.CharField(blank=True, max_length=255, verbose_name='Имя файла')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Начато')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершено')),
+                ('expires_at', models.DateTimeField(blank=True, null=True, verbose_name='Хранится до')),
+                ('requested_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Фоновая выгрузка',
+                'verbose_name_plural': 'Фоновые выгрузки',
+                'ordering': ['-created_at'],
+                'indexes': [
+                    models.Index(fields=['params_hash', 'status'], name='exportjob_params_status_idx'),
+                    models.Index(fields=['expires_at'], name='exportjob_expires_idx'),
+                ],
+            },
+        ),
+    ]
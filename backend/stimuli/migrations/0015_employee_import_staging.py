@@ -0,0 +1,69 @@
+# Generated manually
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('stimuli', '0014_exportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmployeeImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filename', models.CharField(blank=True, max_length=255, verbose_name='Файл')),
+                ('full_sync', models.BooleanField(default=False, verbose_name='Полная синхронизация')),
+                ('status', models.CharField(choices=[('staged', 'Ожидает подтверждения'), ('applied', 'Применена'), ('discarded', 'Отменена')], default='staged', max_length=16, verbose_name='Статус')),
+                ('errors', models.JSONField(blank=True, default=list, verbose_name='Ошибки строк')),
+                ('created_count', models.PositiveIntegerField(default=0, verbose_name='Создано')),
+                ('updated_count', models.PositiveIntegerField(default=0, verbose_name='Обновлено')),
+                ('unchanged_count', models.PositiveIntegerField(default=0, verbose_name='Без изменений')),
+                ('deleted_count', models.PositiveIntegerField(default=0, verbose_name='Удалено')),
+                ('conflict_count', models.PositiveIntegerField(default=0, verbose_name='Неоднозначных ФИО')),
+                ('auto_created_divisions', models.PositiveIntegerField(default=0, verbose_name='Создано подразделений')),
+                ('auto_created_positions', models.PositiveIntegerField(default=0, verbose_name='Создано должностей')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Загружено')),
+                ('applied_at', models.DateTimeField(blank=True, null=True, verbose_name='Применено')),
+                ('uploaded_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='employee_imports', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Загрузка сотрудников',
+                'verbose_name_plural': 'Загрузки сотрудников',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StagedEmployeeRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row_num', models.PositiveIntegerField(verbose_name='Строка файла')),
+                ('full_name', models.CharField(max_length=255, verbose_name='ФИО')),
+                ('division_name', models.CharField(max_length=255, verbose_name='Подразделение')),
+                ('position_name', models.CharField(max_length=255, verbose_name='Должность')),
+                ('category', models.CharField(choices=[('АУП', 'Административно-управленческий персонал'), ('ППС', 'Профессорско-преподавательский состав'), ('Другое', 'Другое')], max_length=32, verbose_name='Категория')),
+                ('rate', models.DecimalField(decimal_places=3, default=1, max_digits=6, verbose_name='Ставка')),
+                ('allowance_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Надбавка')),
+                ('allowance_reason', models.CharField(blank=True, max_length=255, verbose_name='Основание надбавки')),
+                ('allowance_until', models.DateField(blank=True, null=True, verbose_name='Срок надбавки')),
+                ('payment', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Выплата')),
+                ('justification', models.TextField(blank=True, verbose_name='Обоснование')),
+                ('match_count', models.PositiveIntegerField(default=0, verbose_name='Найдено сотрудников')),
+                ('action', models.CharField(blank=True, choices=[('create', 'Новый сотрудник'), ('update', 'Изменения'), ('unchanged', 'Без изменений'), ('conflict', 'Несколько сотрудников с таким ФИО')], max_length=16, verbose_name='Действие')),
+                ('employee', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='stimuli.employee', verbose_name='Сотрудник')),
+                ('employee_import', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rows', to='stimuli.employeeimport', verbose_name='Загрузка')),
+            ],
+            options={
+                'verbose_name': 'Строка загрузки сотрудников',
+                'verbose_name_plural': 'Строки загрузки сотрудников',
+                'ordering': ['row_num'],
+                'constraints': [models.UniqueConstraint(fields=('employee_import', 'full_name'), name='staged_employee_unique_name')],
+                'indexes': [models.Index(fields=['employee_import', 'action'], name='staged_employee_action_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated manually
+
+from django.db import migrations
+
+# DDL зафиксирован здесь, а не импортирован из stimuli.search: миграция не должна меняться
+# вместе с текущим кодом приложения. stimuli.search.ensure_search_index строит те же объекты
+# и вызывается после migrate (stimuli.signals), чтобы восстановить триггеры SQLite.
+
+POSTGRES_INDEX_SQL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS employee_full_name_trgm_idx ON stimuli_employee '
+    'USING gin (UPPER(full_name::text) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS employee_justification_fts_idx ON stimuli_employee '
+    "USING gin (to_tsvector('russian'::regconfig, COALESCE(justification, '')))",
+]
+POSTGRES_DROP_SQL = [
+    'DROP INDEX IF EXISTS employee_full_name_trgm_idx',
+    'DROP INDEX IF EXISTS employee_justification_fts_idx',
+]
+
+SQLITE_INDEX_SQL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS stimuli_employee_fts USING fts5("
+    "full_name, justification, content='stimuli_employee', content_rowid='id', tokenize='trigram')",
+    """
+    CREATE TRIGGER IF NOT EXISTS stimuli_employee_fts_ai AFTER INSERT ON stimuli_employee BEGIN
+        INSERT INTO stimuli_employee_fts(rowid, full_name, justification)
+        VALUES (new.id, new.full_name, new.justification);
+    END""",
+    """
+    CREATE TRIGGER IF NOT EXISTS stimuli_employee_fts_ad AFTER DELETE ON stimuli_employee BEGIN
+        INSERT INTO stimuli_employee_fts(stimuli_employee_fts, rowid, full_name, justification)
+        VALUES ('delete', old.id, old.full_name, old.justification);
+    END""",
+    """
+    CREATE TRIGGER IF NOT EXISTS stimuli_employee_fts_au AFTER UPDATE OF full_name, justification ON stimuli_employee BEGIN
+        INSERT INTO stimuli_employee_fts(stimuli_employee_fts, rowid, full_name, justification)
+        VALUES ('delete', old.id, old.full_name, old.justification);
+        INSERT INTO stimuli_employee_fts(rowid, full_name, justification)
+        VALUES (new.id, new.full_name, new.justification);
+    END""",
+    "INSERT INTO stimuli_employee_fts(stimuli_employee_fts) VALUES ('rebuild')",
+]
+SQLITE_DROP_SQL = [
+    'DROP TRIGGER IF EXISTS stimuli_employee_fts_ai',
+    'DROP TRIGGER IF EXISTS stimuli_employee_fts_ad',
+    'DROP TRIGGER IF EXISTS stimuli_employee_fts_au',
+    'DROP TABLE IF EXISTS stimuli_employee_fts',
+]
+
+
+def _execute(schema_editor, statements_by_vendor):
+    for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    _execute(schema_editor, {'postgresql': POSTGRES_INDEX_SQL, 'sqlite': SQLITE_INDEX_SQL})
+
+
+def remove_search_index(apps, schema_editor):
+    _execute(schema_editor, {'postgresql': POSTGRES_DROP_SQL, 'sqlite': SQLITE_DROP_SQL})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stimuli', '0015_employee_import_staging'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, remove_search_index),
+    ]
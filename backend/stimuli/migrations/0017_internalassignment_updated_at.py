@@ -0,0 +1,20 @@
+# Generated manually
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stimuli', '0016_employee_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='internalassignment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Обновлено'),
+            preserve_default=False,
+        ),
+    ]
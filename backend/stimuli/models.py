@@ -2,10 +2,73 @@ from decimal import Decimal
 
 from django.conf import settings
 from django.db import models
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 
+SALARY_OUTPUT_FIELD = DecimalField(max_digits=20, decimal_places=5)
+AMOUNT_OUTPUT_FIELD = DecimalField(max_digits=14, decimal_places=2)
+
+
+# Аннотации with_compensation; total_payments складывается из остальных
+COMPENSATION_ANNOTATIONS = ('salary', 'assignments_salary', 'allowance_total', 'total_payments')
+
+
+class EmployeeQuerySet(models.QuerySet):
+    def with_compensation(self, *names):
+        """
+        Аннотирует оклад, оклад совмещений, надбавки и итог выплат на уровне SQL.
+        Свойства модели (salary_amount, allowance_total и т.д.) используют эти значения,
+        если они присутствуют, вместо запросов по каждому сотруднику.
+
+        names ограничивает набор аннотаций (см. COMPENSATION_ANNOTATIONS), по умолчанию — все.
+        """
+        names = set(names or COMPENSATION_ANNOTATIONS)
+        if 'total_payments' in names:
+            names.update(COMPENSATION_ANNOTATIONS)
+
+        assignments = InternalAssignment.objects.filter(employee=OuterRef('pk')).order_by().values('employee')
+        annotations = {}
+        if 'salary' in names:
+            annotations['annotated_salary_amount'] = ExpressionWrapper(
+                Coalesce(F('position__base_salary'), Value(Decimal('0'))) * Coalesce(F('rate'), Value(Decimal('0'))),
+                output_field=SALARY_OUTPUT_FIELD,
+            )
+        if 'assignments_salary' in names:
+            assignments_salary = assignments.annotate(
+                total=Sum(F('position__base_salary') * F('rate'), output_field=SALARY_OUTPUT_FIELD)
+            ).values('total')
+            annotations['annotated_assignments_salary_amount'] = Coalesce(
+                Subquery(assignments_salary, output_field=SALARY_OUTPUT_FIELD),
+                Value(Decimal('0')),
+                output_field=SALARY_OUTPUT_FIELD,
+            )
+        if 'allowance_total' in names:
+            assignments_allowance = assignments.annotate(
+                total=Sum('allowance_amount', output_field=AMOUNT_OUTPUT_FIELD)
+            ).values('total')
+            annotations['annotated_allowance_total'] = ExpressionWrapper(
+                Coalesce(F('allowance_amount'), Value(Decimal('0')))
+                + Coalesce(Subquery(assignments_allowance, output_field=AMOUNT_OUTPUT_FIELD), Value(Decimal('0'))),
+                output_field=AMOUNT_OUTPUT_FIELD,
+            )
+
+        qs = self.annotate(**annotations) if annotations else self
+        if 'total_payments' not in names:
+            return qs
+        return qs.annotate(
+            annotated_total_payments=ExpressionWrapper(
+                F('annotated_salary_amount')
+                + F('annotated_assignments_salary_amount')
+                + F('annotated_allowance_total')
+                + Coalesce(F('payment'), Value(Decimal('0'))),
+                output_field=SALARY_OUTPUT_FIELD,
+            ),
+        )
+
+
 class Employee(models.Model):
     class Category(models.TextChoices):
         AUP = 'АУП', _('Административно-управленческий персонал')
@@ -34,24 +97,39 @@ class Employee(models.Model):
     created_at = models.DateTimeField('Создано', auto_now_add=True)
     updated_at = models.DateTimeField('Обновлено', auto_now=True)
 
+    objects = EmployeeQuerySet.as_manager()
+
     class Meta:
         ordering = ['full_name']
+        indexes = [
+            models.Index(fields=['full_name'], name='employee_full_name_idx'),
+            models.Index(fields=['division', 'full_name'], name='employee_division_name_idx'),
+        ]
         verbose_name = 'Сотрудник'
         verbose_name_plural = 'Сотрудники'
 
     def __str__(self):
         return self.full_name
 
+    def _prefetched_assignments(self):
+        if 'assignments' in getattr(self, '_prefetched_objects_cache', {}):
+            return self.assignments.all()
+        return self.assignments.select_related('position').all()
+
     @property
     def salary_amount(self):
+        if hasattr(self, 'annotated_salary_amount'):
+            return self.annotated_salary_amount
         base = self.position.base_salary if self.position else Decimal('0')
         rate = self.rate or Decimal('0')
         return base * rate
 
     @property
     def assignments_salary_amount(self):
+        if hasattr(self, 'annotated_assignments_salary_amount'):
+            return self.annotated_assignments_salary_amount
         total = Decimal('0')
-        for assignment in self.assignments.select_related('position').all():
+        for assignment in self._prefetched_assignments():
             base = assignment.position.base_salary if assignment.position else Decimal('0')
             rate = assignment.rate or Decimal('0')
             total += base * rate
@@ -63,6 +141,8 @@ class Employee(models.Model):
 
     @property
     def allowance_total(self):
+        if hasattr(self, 'annotated_allowance_total'):
+            return self.annotated_allowance_total
         total = self.allowance_amount or Decimal('0')
         for assignment in self.assignments.all():
             total += assignment.allowance_amount or Decimal('0')
@@ -70,6 +150,8 @@ class Employee(models.Model):
 
     @property
     def total_payments(self):
+        if hasattr(self, 'annotated_total_payments'):
+            return self.annotated_total_payments
         payment = self.payment or Decimal('0')
         return self.total_salary_amount + self.allowance_total + payment
 
@@ -81,6 +163,7 @@ class InternalAssignment(models.Model):
     allowance_amount = models.DecimalField('Надбавка', max_digits=12, decimal_places=2, default=0)
     allowance_reason = models.CharField('Основание надбавки', max_length=255, blank=True)
     allowance_until = models.DateField('Срок надбавки', blank=True, null=True)
+    updated_at = models.DateTimeField('Обновлено', auto_now=True)
 
     class Meta:
         verbose_name = 'Внутреннее совмещение'
@@ -100,6 +183,55 @@ class StimulusRequestQuerySet(models.QuerySet):
     def for_campaign(self, campaign_id):
         return self.filter(campaign_id=campaign_id)
 
+    @staticmethod
+    def approved_q(prefix: str = ''):
+        """Одобренные заявки: текущие и архивированные с итогом «Одобрено»."""
+        Status = StimulusRequest.Status
+        return models.Q(**{f'{prefix}status': Status.APPROVED}) | models.Q(**{
+            f'{prefix}status': Status.ARCHIVED,
+            f'{prefix}final_outcome': StimulusRequest.Outcome.APPROVED,
+        })
+
+    @staticmethod
+    def rejected_q(prefix: str = ''):
+        """Отклонённые заявки: текущие и архивированные с итогом «Отклонено»."""
+        Status = StimulusRequest.Status
+        return models.Q(**{f'{prefix}status': Status.REJECTED}) | models.Q(**{
+            f'{prefix}status': Status.ARCHIVED,
+            f'{prefix}final_outcome': StimulusRequest.Outcome.REJECTED,
+        })
+
+    @staticmethod
+    def summary_conditions(prefix: str = '') -> dict:
+        """Условия для корзин сводки по статусам; None означает «все заявки»."""
+        return {
+            'pending': models.Q(**{f'{prefix}status': StimulusRequest.Status.PENDING}),
+            'approved': StimulusRequestQuerySet.approved_q(prefix),
+            'rejected': StimulusRequestQuerySet.rejected_q(prefix),
+            'total': None,
+        }
+
+    def approved(self):
+        return self.filter(self.approved_q())
+
+    def rejected(self):
+        return self.filter(self.rejected_q())
+
+    def amounts_summary(self) -> dict:
+        """Количество и сумма заявок по каждой корзине статусов одним aggregate()."""
+        aggregates = {}
+        for bucket, condition in self.summary_conditions().items():
+            aggregates[f'{bucket}_amount'] = Sum('amount', filter=condition)
+            aggregates[f'{bucket}_count'] = models.Count('pk', filter=condition)
+        result = self.order_by().aggregate(**aggregates)
+        return {
+            bucket: {
+                'amount': result[f'{bucket}_amount'] or Decimal('0'),
+                'count': result[f'{bucket}_count'],
+            }
+            for bucket in self.summary_conditions()
+        }
+
 
 class StimulusRequest(models.Model):
     class Status(models.TextChoices):
@@ -108,6 +240,10 @@ class StimulusRequest(models.Model):
         REJECTED = 'rejected', _('Отклонено')
         ARCHIVED = 'archived', _('Архив')
 
+    class Outcome(models.TextChoices):
+        APPROVED = 'approved', _('Одобрено')
+        REJECTED = 'rejected', _('Отклонено')
+
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='requests', verbose_name='Сотрудник')
     requested_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -125,6 +261,13 @@ class StimulusRequest(models.Model):
     justification = models.TextField('Обоснование')
     status = models.CharField('Статус', max_length=16, choices=Status.choices, default=Status.PENDING)
     final_status = models.CharField('Итоговый статус', max_length=32, blank=True, help_text='Статус на момент архивирования кампании')
+    final_outcome = models.CharField(
+        'Итог рассмотрения',
+        max_length=16,
+        choices=Outcome.choices,
+        blank=True,
+        help_text='Решение по заявке на момент архивирования кампании',
+    )
     admin_comment = models.TextField('Комментарий администратора', blank=True)
     archived_at = models.DateTimeField('В архиве с', blank=True, null=True)
     created_at = models.DateTimeField('Создано', auto_now_add=True)
@@ -138,6 +281,25 @@ class StimulusRequest(models.Model):
             ('view_all_requests', 'Может видеть все заявки'),
             ('edit_pending_requests', 'Может редактировать заявки на рассмотрении'),
         ]
+        indexes = [
+            # Индекс (campaign, status, ...) также обслуживает фильтры по (campaign, status)
+            models.Index(fields=['campaign', 'status', 'final_outcome'], name='stimreq_campaign_outcome_idx'),
+            # amount в конце ключа делает индекс покрывающим для агрегатов по сотруднику
+            models.Index(fields=['employee', 'status', 'amount'], name='stimreq_employee_status_idx'),
+            models.Index(fields=['requested_by', 'status', '-created_at'], name='stimreq_requester_status_idx'),
+            models.Index(fields=['status', '-created_at'], name='stimreq_status_created_idx'),
+            # Частичные индексы по заявкам на рассмотрении (PostgreSQL и SQLite)
+            models.Index(
+                fields=['campaign', 'employee'],
+                condition=models.Q(status='pending'),
+                name='stimreq_pending_campaign_idx',
+            ),
+            models.Index(
+                fields=['requested_by', '-created_at'],
+                condition=models.Q(status='pending'),
+                name='stimreq_pending_requester_idx',
+            ),
+        ]
         verbose_name = 'Заявка на стимулирование'
         verbose_name_plural = 'Заявки на стимулирование'
 
@@ -207,3 +369,173 @@ class UserDivision(models.Model):
         if self.division:
             return f"{self.user.username} — {self.division.name}"
         return f"{self.user.username} — без подразделения"
+
+
+class ExportJobQuerySet(models.QuerySet):
+    def reusable(self, now=None):
+        """Задания, результат которых ещё можно отдать повторно: в работе или готовые и не истёкшие."""
+        now = now or timezone.now()
+        return self.filter(
+            models.Q(status__in=[ExportJob.Status.PENDING, ExportJob.Status.RUNNING])
+            | models.Q(status=ExportJob.Status.DONE, expires_at__gt=now)
+        )
+
+    def expired(self, now=None):
+        now = now or timezone.now()
+        return self.filter(expires_at__lte=now)
+
+
+class ExportJob(models.Model):
+    """Фоновая выгрузка: параметры, прогресс и готовый файл с ограниченным сроком хранения"""
+
+    class Kind(models.TextChoices):
+        REQUESTS = 'requests', _('Заявки')
+        CAMPAIGN_REQUESTS = 'campaign_requests', _('Заявки кампании')
+        CAMPAIGN_APPROVED = 'campaign_approved', _('Одобренные заявки кампании')
+        POSITION_QUOTAS = 'position_quotas', _('Штатное расписание')
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', _('В очереди')
+        RUNNING = 'running', _('Выполняется')
+        DONE = 'done', _('Готово')
+        FAILED = 'failed', _('Ошибка')
+
+    kind = models.CharField('Тип выгрузки', max_length=32, choices=Kind.choices)
+    export_format = models.CharField('Формат', max_length=16, default='xlsx')
+    object_id = models.PositiveIntegerField('Объект', null=True, blank=True)
+    query_string = models.TextField('Параметры фильтров', blank=True)
+    params_hash = models.CharField('Ключ параметров', max_length=64)
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='export_jobs',
+        verbose_name='Пользователь',
+    )
+    status = models.CharField('Статус', max_length=16, choices=Status.choices, default=Status.PENDING)
+    progress = models.PositiveIntegerField('Обработано строк', default=0)
+    total = models.PositiveIntegerField('Всего строк', null=True, blank=True)
+    file = models.FileField('Файл', upload_to='exports/%Y/%m/', blank=True)
+    filename = models.CharField('Имя файла', max_length=255, blank=True)
+    error = models.TextField('Ошибка', blank=True)
+    created_at = models.DateTimeField('Создано', auto_now_add=True)
+    started_at = models.DateTimeField('Начато', null=True, blank=True)
+    finished_at = models.DateTimeField('Завершено', null=True, blank=True)
+    expires_at = models.DateTimeField('Хранится до', null=True, blank=True)
+
+    objects = ExportJobQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Фоновая выгрузка'
+        verbose_name_plural = 'Фоновые выгрузки'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['params_hash', 'status'], name='exportjob_params_status_idx'),
+            models.Index(fields=['expires_at'], name='exportjob_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} ({self.get_status_display()})"
+
+    @property
+    def percent(self):
+        if self.status == self.Status.DONE:
+            return 100
+        if not self.total:
+            return 0
+        return min(99, int(self.progress * 100 / self.total))
+
+
+class EmployeeImport(models.Model):
+    """
+    Загрузка сотрудников из Excel: строки файла сначала попадают в промежуточную таблицу
+    (StagedEmployeeRow), сравниваются с текущими данными и применяются после подтверждения
+    """
+
+    class Status(models.TextChoices):
+        STAGED = 'staged', _('Ожидает подтверждения')
+        APPLIED = 'applied', _('Применена')
+        DISCARDED = 'discarded', _('Отменена')
+
+    uploaded_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='employee_imports',
+        verbose_name='Пользователь',
+    )
+    filename = models.CharField('Файл', max_length=255, blank=True)
+    full_sync = models.BooleanField('Полная синхронизация', default=False)
+    status = models.CharField('Статус', max_length=16, choices=Status.choices, default=Status.STAGED)
+    errors = models.JSONField('Ошибки строк', default=list, blank=True)
+    created_count = models.PositiveIntegerField('Создано', default=0)
+    updated_count = models.PositiveIntegerField('Обновлено', default=0)
+    unchanged_count = models.PositiveIntegerField('Без изменений', default=0)
+    deleted_count = models.PositiveIntegerField('Удалено', default=0)
+    conflict_count = models.PositiveIntegerField('Неоднозначных ФИО', default=0)
+    auto_created_divisions = models.PositiveIntegerField('Создано подразделений', default=0)
+    auto_created_positions = models.PositiveIntegerField('Создано должностей', default=0)
+    created_at = models.DateTimeField('Загружено', auto_now_add=True)
+    applied_at = models.DateTimeField('Применено', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Загрузка сотрудников'
+        verbose_name_plural = 'Загрузки сотрудников'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.filename or 'Загрузка'} #{self.pk} ({self.get_status_display()})"
+
+    @property
+    def has_changes(self):
+        return bool(self.created_count or self.updated_count or self.deleted_count)
+
+
+class StagedEmployeeRow(models.Model):
+    """Строка загружаемого файла и результат её сравнения с таблицей сотрудников"""
+
+    class Action(models.TextChoices):
+        CREATE = 'create', _('Новый сотрудник')
+        UPDATE = 'update', _('Изменения')
+        UNCHANGED = 'unchanged', _('Без изменений')
+        CONFLICT = 'conflict', _('Несколько сотрудников с таким ФИО')
+
+    employee_import = models.ForeignKey(
+        EmployeeImport,
+        on_delete=models.CASCADE,
+        related_name='rows',
+        verbose_name='Загрузка',
+    )
+    row_num = models.PositiveIntegerField('Строка файла')
+    full_name = models.CharField('ФИО', max_length=255)
+    division_name = models.CharField('Подразделение', max_length=255)
+    position_name = models.CharField('Должность', max_length=255)
+    category = models.CharField('Категория', max_length=32, choices=Employee.Category.choices)
+    rate = models.DecimalField('Ставка', max_digits=6, decimal_places=3, default=1)
+    allowance_amount = models.DecimalField('Надбавка', max_digits=12, decimal_places=2, default=0)
+    allowance_reason = models.CharField('Основание надбавки', max_length=255, blank=True)
+    allowance_until = models.DateField('Срок надбавки', blank=True, null=True)
+    payment = models.DecimalField('Выплата', max_digits=12, decimal_places=2, default=0)
+    justification = models.TextField('Обоснование', blank=True)
+    employee = models.ForeignKey(
+        Employee,
+        on_delete=models.SET_NULL,
+        related_name='+',
+        verbose_name='Сотрудник',
+        null=True,
+        blank=True,
+    )
+    match_count = models.PositiveIntegerField('Найдено сотрудников', default=0)
+    action = models.CharField('Действие', max_length=16, choices=Action.choices, blank=True)
+
+    class Meta:
+        verbose_name = 'Строка загрузки сотрудников'
+        verbose_name_plural = 'Строки загрузки сотрудников'
+        ordering = ['row_num']
+        constraints = [
+            models.UniqueConstraint(fields=['employee_import', 'full_name'], name='staged_employee_unique_name'),
+        ]
+        indexes = [
+            models.Index(fields=['employee_import', 'action'], name='staged_employee_action_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.full_name} (строка {self.row_num})"
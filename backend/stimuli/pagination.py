@@ -0,0 +1,221 @@
+"""
+Постраничный вывод по ключу сортировки (keyset/seek).
+
+Вместо OFFSET страница выбирается условием «строки после последней показанной» по тем же
+полям, по которым отсортирован список (последним всегда идёт pk), поэтому любая страница
+стоит столько же, сколько первая. Ссылки «Вперёд»/«Назад» несут курсор — подписанный список
+значений ключа сортировки крайней строки страницы (?after=… / ?before=…).
+
+NULL считается больше любого значения: при сортировке по возрастанию такие строки идут в
+конце, по убыванию — в начале, одинаково в PostgreSQL и SQLite.
+
+Общее число записей считается отдельным COUNT и кешируется по тексту запроса и версии
+данных (dashboard.versioning) на KEYSET_COUNT_CACHE_TIMEOUT секунд, так что переход по
+страницам его не повторяет, а любое изменение сотрудников или заявок сбрасывает кеш.
+"""
+import hashlib
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+
+CURSOR_AFTER_PARAM = 'after'
+CURSOR_BEFORE_PARAM = 'before'
+CURSOR_PARAMS = (CURSOR_AFTER_PARAM, CURSOR_BEFORE_PARAM)
+
+KEYSET_COUNT_CACHE_TIMEOUT = 60
+
+_CURSOR_SALT = 'stimuli.pagination.cursor'
+
+
+def _cursor_value(value):
+    # Поля модели сами разбирают строковое представление при сравнении
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class KeysetPage:
+    """Страница списка: совместима с page_obj в шаблонах по has_next/has_previous."""
+
+    def __init__(self, paginator, object_list, next_cursor, previous_cursor):
+        self.paginator = paginator
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    ordering — поля сортировки в формате order_by ('-amount', 'employee__full_name', 'pk').
+    Если pk в нём нет, он добавляется в конец, чтобы ключ был уникальным.
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.fields = []
+        for name in ordering:
+            if not isinstance(name, str) or name == '?':
+                raise ImproperlyConfigured(f'Keyset-пагинация поддерживает только сортировку по полям, а не {name!r}.')
+            self.fields.append((name.lstrip('-'), name.startswith('-')))
+        if not any(field in ('pk', 'id') for field, _ in self.fields):
+            descending = self.fields[-1][1] if self.fields else False
+            self.fields.append(('pk', descending))
+
+    @cached_property
+    def count(self):
+        # Импорт внутри функции: dashboard сам зависит от моделей stimuli
+        from dashboard.versioning import get_data_version
+
+        queryset = self.queryset.order_by()
+        try:
+            sql = str(queryset.query)
+        except Exception:
+            return queryset.count()
+        digest = hashlib.sha256(sql.encode('utf-8')).hexdigest()
+        key = f'keyset-count:{get_data_version()}:{digest}'
+        total = cache.get(key)
+        if total is None:
+            total = queryset.count()
+            cache.set(key, total, KEYSET_COUNT_CACHE_TIMEOUT)
+        return total
+
+    def encode_cursor(self, obj):
+        values = [_cursor_value(getattr(obj, self._alias(index))) for index in range(len(self.fields))]
+        return signing.dumps(values, salt=_CURSOR_SALT, compress=True)
+
+    def decode_cursor(self, cursor):
+        """Значения ключа из курсора; None, если курсор повреждён или от другой сортировки."""
+        if not cursor:
+            return None
+        try:
+            values = signing.loads(cursor, salt=_CURSOR_SALT)
+        except signing.BadSignature:
+            return None
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            return None
+        return values
+
+    def page(self, after=None, before=None):
+        """Первая страница, страница после курсора after или перед курсором before."""
+        after_values = self.decode_cursor(after)
+        before_values = None if after_values is not None else self.decode_cursor(before)
+
+        if before_values is not None:
+            rows = list(self._ordered(reverse=True).filter(self._beyond(before_values, reverse=True))[:self.per_page + 1])
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            next_cursor = self.encode_cursor(rows[-1]) if rows else before
+            previous_cursor = self.encode_cursor(rows[0]) if rows and has_more else None
+            return KeysetPage(self, rows, next_cursor, previous_cursor)
+
+        queryset = self._ordered()
+        if after_values is not None:
+            queryset = queryset.filter(self._beyond(after_values))
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        next_cursor = self.encode_cursor(rows[-1]) if rows and has_more else None
+        previous_cursor = None
+        if after_values is not None:
+            previous_cursor = self.encode_cursor(rows[0]) if rows else after
+        return KeysetPage(self, rows, next_cursor, previous_cursor)
+
+    def _alias(self, index):
+        return f'keyset_{index}'
+
+    def _ordered(self, reverse=False):
+        order_by = []
+        for field, descending in self.fields:
+            expression = F(field)
+            if descending != reverse:
+                order_by.append(expression.desc(nulls_first=True))
+            else:
+                order_by.append(expression.asc(nulls_last=True))
+        aliases = {self._alias(index): F(field) for index, (field, _) in enumerate(self.fields)}
+        return self.queryset.annotate(**aliases).order_by(*order_by)
+
+    def _beyond(self, values, reverse=False):
+        """Условие «строка идёт после ключа values» в порядке сортировки (обратном при reverse)."""
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (field, descending), value in zip(self.fields, values):
+            if descending == reverse:
+                # По возрастанию: больше значения, NULL — в самом конце
+                if value is None:
+                    step = Q(pk__in=[])
+                else:
+                    step = Q(**{f'{field}__gt': value}) | Q(**{f'{field}__isnull': True})
+            else:
+                # По убыванию: меньше значения, все непустые идут после NULL
+                if value is None:
+                    step = Q(**{f'{field}__isnull': False})
+                else:
+                    step = Q(**{f'{field}__lt': value})
+            condition |= equal & step
+            equal &= Q(**{f'{field}__isnull': True}) if value is None else Q(**{field: value})
+        return condition
+
+
+class KeysetPaginationMixin:
+    """
+    Для ListView: paginate_queryset выбирает страницу по курсору вместо номера страницы.
+    Ключ сортировки берётся из order_by queryset (как его задал SortingMixin) или из Meta.ordering.
+    """
+
+    paginator_class = KeysetPaginator
+
+    def get_keyset_ordering(self, queryset):
+        if queryset.query.order_by:
+            return list(queryset.query.order_by)
+        return list(queryset.model._meta.ordering)
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = self.paginator_class(queryset, self.get_keyset_ordering(queryset), page_size)
+        page = paginator.page(
+            after=self.request.GET.get(CURSOR_AFTER_PARAM),
+            before=self.request.GET.get(CURSOR_BEFORE_PARAM),
+        )
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        page = context.get('page_obj')
+        if isinstance(page, KeysetPage):
+            context.update({
+                'first_page_url': self._cursor_url(),
+                'next_page_url': self._cursor_url(after=page.next_cursor) if page.has_next() else '',
+                'previous_page_url': self._cursor_url(before=page.previous_cursor) if page.has_previous() else '',
+            })
+        return context
+
+    def _cursor_url(self, **cursor):
+        params = self.request.GET.copy()
+        for key in CURSOR_PARAMS + ('page',):
+            params.pop(key, None)
+        for key, value in cursor.items():
+            params[key] = value
+        encoded = params.urlencode()
+        return '?' + encoded if encoded else '?'
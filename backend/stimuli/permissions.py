@@ -1,66 +1,114 @@
+from dataclasses import dataclass, field
+from typing import Optional
+
 from .models import UserDivision
 
+DEPARTMENT_MANAGER_GROUP = 'Руководитель департамента'
+INSTITUTE_LEADERSHIP_GROUP = 'Руководство института'
+EMPLOYEE_GROUP = 'Сотрудник'
+
+
+@dataclass(frozen=True)
+class PermissionContext:
+    """
+    Снимок данных о правах пользователя: группы, подразделение и флаги UserDivision.
+    Строится один раз на объект пользователя (т.е. на запрос) и используется всеми помощниками ниже.
+    """
+    group_names: frozenset = field(default_factory=frozenset)
+    division: Optional[object] = None
+    can_view_all: bool = False
+    can_view_own_requests: bool = False
+
+    @classmethod
+    def for_user(cls, user) -> 'PermissionContext':
+        if user is None or not user.is_authenticated:
+            return cls()
+
+        group_names = frozenset(user.groups.values_list('name', flat=True))
+        user_division_obj = UserDivision.objects.select_related('division').filter(user_id=user.pk).first()
+        if user_division_obj is None:
+            return cls(group_names=group_names)
+        return cls(
+            group_names=group_names,
+            division=user_division_obj.division,
+            can_view_all=user_division_obj.can_view_all,
+            can_view_own_requests=user_division_obj.can_view_own_requests,
+        )
+
+    def in_group(self, *names) -> bool:
+        return not self.group_names.isdisjoint(names)
+
+
+def get_permission_context(user) -> PermissionContext:
+    """Возвращает контекст прав, закешированный на объекте пользователя."""
+    context = getattr(user, '_permission_context', None)
+    if context is None:
+        context = PermissionContext.for_user(user)
+        if user is not None:
+            user._permission_context = context
+    return context
+
+
+def clear_permission_context(user) -> None:
+    """Сбрасывает закешированный контекст прав (например, после изменения групп пользователя)."""
+    try:
+        del user._permission_context
+    except AttributeError:
+        pass
+
 
 def is_department_manager(user):
     """Проверяет, является ли пользователь руководителем департамента или имеет доступ ко всем сотрудникам"""
+    context = get_permission_context(user)
     # Проверяем флаг can_view_all в UserDivision
-    try:
-        if user.user_division.can_view_all:
-            return True
-    except UserDivision.DoesNotExist:
-        pass
-    
+    if context.can_view_all:
+        return True
+
     # Также проверяем группы для обратной совместимости
-    return user.groups.filter(name__in=['Руководитель департамента', 'Руководство института']).exists()
+    return context.in_group(DEPARTMENT_MANAGER_GROUP, INSTITUTE_LEADERSHIP_GROUP)
+
+
+def is_institute_leadership(user):
+    """Проверяет, входит ли пользователь в группу «Руководство института»"""
+    return get_permission_context(user).in_group(INSTITUTE_LEADERSHIP_GROUP)
 
 
 def is_employee(user):
     """Проверяет, является ли пользователь сотрудником"""
-    return user.groups.filter(name='Сотрудник').exists()
+    return get_permission_context(user).in_group(EMPLOYEE_GROUP)
 
 
 def get_user_division(user):
     """Возвращает подразделение пользователя, если он руководитель департамента"""
-    try:
-        user_division_obj = user.user_division
-        # Если установлен флаг "доступ ко всем сотрудникам", возвращаем None (все сотрудники)
-        if user_division_obj.can_view_all:
-            return None
-        return user_division_obj.division
-    except UserDivision.DoesNotExist:
+    context = get_permission_context(user)
+    # Если установлен флаг "доступ ко всем сотрудникам", возвращаем None (все сотрудники)
+    if context.can_view_all:
         return None
+    return context.division
 
 
 def can_view_own_requests(user):
     """Проверяет, может ли пользователь видеть заявки на самого себя"""
-    try:
-        return user.user_division.can_view_own_requests
-    except UserDivision.DoesNotExist:
-        return False
+    return get_permission_context(user).can_view_own_requests
 
 
 def can_view_all_requests(user):
     """Проверяет, может ли пользователь видеть все заявки"""
+    context = get_permission_context(user)
     # Администраторы видят все заявки
     if user.is_staff:
         return True
-    
+
     # Группа "Руководство института" видит все заявки
-    if user.groups.filter(name='Руководство института').exists():
-        return True
-    
-    # Проверяем право видеть все заявки
-    if user.has_perm('stimuli.view_all_requests'):
+    if context.in_group(INSTITUTE_LEADERSHIP_GROUP):
         return True
-    
+
     # Любой пользователь с флагом can_view_all видит все заявки
-    try:
-        if user.user_division.can_view_all:
-            return True
-    except UserDivision.DoesNotExist:
-        pass
-    
-    return False
+    if context.can_view_all:
+        return True
+
+    # Проверяем право видеть все заявки (Django кеширует права на объекте пользователя)
+    return user.has_perm('stimuli.view_all_requests')
 
 
 def can_change_request_status(user, request_obj):
@@ -68,44 +116,44 @@ def can_change_request_status(user, request_obj):
     # Администраторы могут изменять статус всех заявок
     if user.is_staff:
         return True
-    
+
     # Руководители департамента НЕ могут изменять статус заявок
     # Сотрудники НЕ могут изменять статус заявок (даже своих)
     return False
 
 
+def can_modify_own_pending_requests(user):
+    """
+    Проверяет, распространяется ли на пользователя правило «свои заявки в статусе "На рассмотрении"».
+    Используется как для отдельных заявок, так и для аннотаций списка.
+    """
+    context = get_permission_context(user)
+    # Пользователи с can_view_own_requests могут изменять только свои заявки в статусе "На рассмотрении"
+    # (не могут изменять заявки на себя, поданные другими)
+    if context.can_view_own_requests:
+        return True
+
+    # Пользователи с can_view_all, руководители департамента и сотрудники
+    # могут изменять только свои заявки в статусе "На рассмотрении"
+    return context.can_view_all or is_department_manager(user) or is_employee(user)
+
+
+def _can_modify_own_request(user, request_obj):
+    """Общее правило для редактирования и удаления заявок пользователями без прав администратора"""
+    if not can_modify_own_pending_requests(user):
+        return False
+    return (
+        request_obj.requested_by_id == user.pk
+        and request_obj.status == request_obj.Status.PENDING
+    )
+
+
 def can_edit_request(user, request_obj):
     """Проверяет, может ли пользователь редактировать конкретную заявку"""
     # Администраторы могут редактировать все
     if user.is_staff:
         return True
-    
-    # Пользователи с can_view_own_requests могут редактировать только свои заявки в статусе "На рассмотрении"
-    # (не могут редактировать заявки на себя, поданные другими)
-    try:
-        if user.user_division.can_view_own_requests:
-            if request_obj.requested_by == user:
-                return request_obj.status == request_obj.Status.PENDING
-            return False
-    except UserDivision.DoesNotExist:
-        pass
-    
-    # Пользователи с can_view_all могут редактировать только свои заявки в статусе "На рассмотрении"
-    try:
-        if user.user_division.can_view_all and request_obj.requested_by == user:
-            return request_obj.status == request_obj.Status.PENDING
-    except UserDivision.DoesNotExist:
-        pass
-    
-    # Руководители департамента могут редактировать только свои заявки в статусе "На рассмотрении"
-    if is_department_manager(user) and request_obj.requested_by == user:
-        return request_obj.status == request_obj.Status.PENDING
-    
-    # Сотрудники могут редактировать только свои заявки в статусе "На рассмотрении"
-    if is_employee(user) and request_obj.requested_by == user:
-        return request_obj.status == request_obj.Status.PENDING
-    
-    return False
+    return _can_modify_own_request(user, request_obj)
 
 
 def can_delete_request(user, request_obj):
@@ -113,66 +161,30 @@ def can_delete_request(user, request_obj):
     # Администраторы могут удалять все
     if user.is_staff:
         return True
-    
-    # Пользователи с can_view_own_requests могут удалять только свои заявки в статусе "На рассмотрении"
-    # (не могут удалять заявки на себя, поданные другими)
-    try:
-        if user.user_division.can_view_own_requests:
-            if request_obj.requested_by == user:
-                return request_obj.status == request_obj.Status.PENDING
-            return False
-    except UserDivision.DoesNotExist:
-        pass
-    
-    # Пользователи с can_view_all могут удалять только свои заявки в статусе "На рассмотрении"
-    try:
-        if user.user_division.can_view_all and request_obj.requested_by == user:
-            return request_obj.status == request_obj.Status.PENDING
-    except UserDivision.DoesNotExist:
-        pass
-    
-    # Руководители департамента могут удалять только свои заявки в статусе "На рассмотрении"
-    if is_department_manager(user) and request_obj.requested_by == user:
-        return request_obj.status == request_obj.Status.PENDING
-    
-    # Сотрудники могут удалять только свои заявки в статусе "На рассмотрении"
-    if is_employee(user) and request_obj.requested_by == user:
-        return request_obj.status == request_obj.Status.PENDING
-    
-    return False
+    return _can_modify_own_request(user, request_obj)
 
 
 def get_accessible_employees(user):
     """Возвращает queryset сотрудников, к которым у пользователя есть доступ"""
     from .models import Employee
-    
+
     # Администраторы видят всех сотрудников
     if user.is_staff:
         return Employee.objects.all()
-    
+
+    context = get_permission_context(user)
     # Проверяем флаг can_view_all - если установлен, возвращаем всех сотрудников
-    try:
-        if user.user_division.can_view_all:
-            return Employee.objects.all()
-    except (UserDivision.DoesNotExist, AttributeError):
-        pass
-    
+    if context.can_view_all:
+        return Employee.objects.all()
+
     # Руководители департамента видят сотрудников своего подразделения
     if is_department_manager(user):
-        try:
-            user_division_obj = user.user_division
-            user_division = user_division_obj.division
-            if user_division:
-                return Employee.objects.filter(division=user_division)
-            return Employee.objects.none()
-        except (UserDivision.DoesNotExist, AttributeError):
-            return Employee.objects.none()
-    
+        if context.division:
+            return Employee.objects.filter(division=context.division)
+        return Employee.objects.none()
+
     # Сотрудники видят только себя
     if is_employee(user):
-        try:
-            return Employee.objects.filter(user=user)
-        except Exception:
-            return Employee.objects.none()
-    
+        return Employee.objects.filter(user=user)
+
     return Employee.objects.none()
@@ -0,0 +1,211 @@
+"""
+Поиск сотрудников по ФИО и обоснованию.
+
+PostgreSQL: ФИО ищется по подстроке (icontains) через GIN-индекс pg_trgm по UPPER(full_name)
+и ранжируется функцией similarity(); обоснование — полнотекстово (словарь russian) через
+GIN-индекс по to_tsvector, ранг — ts_rank.
+
+SQLite: теневая таблица FTS5 с токенизатором trigram (поиск подстроки без учёта регистра,
+в том числе для кириллицы). Таблица хранит только индекс, данные берутся из stimuli_employee,
+синхронизацию делают триггеры; ранг — bm25. SQLite пересоздаёт таблицу при изменении
+столбцов в миграциях и теряет при этом триггеры, поэтому после migrate индекс проверяется
+и при необходимости строится заново (ensure_search_index).
+
+Запросы короче трёх символов триграммы не покрывают — для них обычный icontains.
+Результат аннотирован рангом SEARCH_RANK и отсортирован по нему, затем по ФИО.
+"""
+from django.db import connection as default_connection, connections
+from django.db.models import BooleanField, F, FloatField, Func, Q, TextField, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Employee
+
+SEARCH_RANK = 'search_rank'
+EMPLOYEE_SEARCH_FIELDS = ('full_name', 'justification')
+MIN_INDEXED_QUERY_LENGTH = 3
+
+SQLITE_FTS_TABLE = 'stimuli_employee_fts'
+
+_EMPLOYEE_TABLE = Employee._meta.db_table
+
+POSTGRES_INDEX_SQL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    f'CREATE INDEX IF NOT EXISTS employee_full_name_trgm_idx ON {_EMPLOYEE_TABLE} '
+    'USING gin (UPPER(full_name::text) gin_trgm_ops)',
+    f'CREATE INDEX IF NOT EXISTS employee_justification_fts_idx ON {_EMPLOYEE_TABLE} '
+    "USING gin (to_tsvector('russian'::regconfig, COALESCE(justification, '')))",
+]
+POSTGRES_DROP_SQL = [
+    'DROP INDEX IF EXISTS employee_full_name_trgm_idx',
+    'DROP INDEX IF EXISTS employee_justification_fts_idx',
+]
+
+_SQLITE_TRIGGERS = {
+    f'{SQLITE_FTS_TABLE}_ai': f"""
+        CREATE TRIGGER {SQLITE_FTS_TABLE}_ai AFTER INSERT ON {_EMPLOYEE_TABLE} BEGIN
+            INSERT INTO {SQLITE_FTS_TABLE}(rowid, full_name, justification)
+            VALUES (new.id, new.full_name, new.justification);
+        END""",
+    f'{SQLITE_FTS_TABLE}_ad': f"""
+        CREATE TRIGGER {SQLITE_FTS_TABLE}_ad AFTER DELETE ON {_EMPLOYEE_TABLE} BEGIN
+            INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, full_name, justification)
+            VALUES ('delete', old.id, old.full_name, old.justification);
+        END""",
+    f'{SQLITE_FTS_TABLE}_au': f"""
+        CREATE TRIGGER {SQLITE_FTS_TABLE}_au AFTER UPDATE OF full_name, justification ON {_EMPLOYEE_TABLE} BEGIN
+            INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, full_name, justification)
+            VALUES ('delete', old.id, old.full_name, old.justification);
+            INSERT INTO {SQLITE_FTS_TABLE}(rowid, full_name, justification)
+            VALUES (new.id, new.full_name, new.justification);
+        END""",
+}
+
+
+def ensure_search_index(connection=None):
+    """
+    Создаёт поисковые индексы для текущей СУБД, если их нет. На SQLite при отсутствии
+    таблицы FTS5 или любого из триггеров индекс перестраивается целиком.
+    """
+    connection = connection or default_connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for statement in POSTGRES_INDEX_SQL:
+                cursor.execute(statement)
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE name = %s OR (type = 'trigger' AND tbl_name = %s)",
+                [SQLITE_FTS_TABLE, _EMPLOYEE_TABLE],
+            )
+            existing = {row[0] for row in cursor.fetchall()}
+            if existing >= {SQLITE_FTS_TABLE, *_SQLITE_TRIGGERS}:
+                return
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} USING fts5('
+                f"full_name, justification, content='{_EMPLOYEE_TABLE}', content_rowid='id', tokenize='trigram')"
+            )
+            for name, statement in _SQLITE_TRIGGERS.items():
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+                cursor.execute(statement)
+            cursor.execute(f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')")
+
+
+def drop_search_index(connection=None):
+    connection = connection or default_connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for statement in POSTGRES_DROP_SQL:
+                cursor.execute(statement)
+        elif connection.vendor == 'sqlite':
+            for name in _SQLITE_TRIGGERS:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(f'DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}')
+
+
+class _RussianTsVector(Func):
+    # Выражение должно совпадать с employee_justification_fts_idx, иначе индекс не используется
+    template = "to_tsvector('russian'::regconfig, COALESCE(%(expressions)s, ''))"
+    output_field = TextField()
+
+
+class _RussianTsQuery(Func):
+    template = "plainto_tsquery('russian'::regconfig, %(expressions)s)"
+    output_field = TextField()
+
+
+class _TsMatch(Func):
+    template = '%(expressions)s'
+    arg_joiner = ' @@ '
+    output_field = BooleanField()
+
+
+class _SqliteFtsRank(Func):
+    """-bm25() строки сотрудника для запроса FTS5 (чем больше, тем релевантнее)."""
+
+    output_field = FloatField()
+
+    def __init__(self, match):
+        super().__init__(F('pk'), Value(match))
+
+    def as_sql(self, compiler, connection, **extra_context):
+        pk, match = self.get_source_expressions()
+        pk_sql, pk_params = compiler.compile(pk)
+        match_sql, match_params = compiler.compile(match)
+        sql = (
+            f'(SELECT -bm25({SQLITE_FTS_TABLE}) FROM {SQLITE_FTS_TABLE} '
+            f'WHERE {SQLITE_FTS_TABLE} MATCH {match_sql} AND rowid = {pk_sql})'
+        )
+        return sql, (*match_params, *pk_params)
+
+
+def _postgres_search(query, fields):
+    condition = Q()
+    ranks = []
+    if 'full_name' in fields:
+        condition |= Q(full_name__icontains=query)
+        ranks.append(Func(F('full_name'), Value(query), function='similarity', output_field=FloatField()))
+    if 'justification' in fields:
+        vector = _RussianTsVector(F('justification'))
+        tsquery = _RussianTsQuery(Value(query))
+        condition |= Q(_TsMatch(vector, tsquery))
+        ranks.append(Func(vector, tsquery, function='ts_rank', output_field=FloatField()))
+    rank = ranks[0]
+    for extra in ranks[1:]:
+        rank = rank + extra
+    return condition, rank
+
+
+def _sqlite_search(query, fields):
+    phrase = '"' + query.replace('"', '""') + '"'
+    match = '{' + ' '.join(fields) + '} : ' + phrase
+    ids = RawSQL(f'SELECT rowid FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH %s', (match,))
+    return Q(pk__in=ids), _SqliteFtsRank(match)
+
+
+def _plain_search(query, fields):
+    condition = Q()
+    for field in fields:
+        condition |= Q(**{f'{field}__icontains': query})
+    return condition, Value(0.0, output_field=FloatField())
+
+
+def search_employees(queryset, query, fields=EMPLOYEE_SEARCH_FIELDS):
+    """
+    Отбирает сотрудников queryset, у которых query встречается в одном из полей fields
+    (full_name и/или justification), и сортирует по рангу SEARCH_RANK, затем по ФИО.
+    """
+    query = (query or '').strip()
+    fields = [field for field in EMPLOYEE_SEARCH_FIELDS if field in fields]
+    if not query or not fields:
+        return queryset
+
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        condition, rank = _postgres_search(query, fields)
+    elif vendor == 'sqlite' and len(query) >= MIN_INDEXED_QUERY_LENGTH:
+        condition, rank = _sqlite_search(query, fields)
+    else:
+        condition, rank = _plain_search(query, fields)
+    return queryset.filter(condition).annotate(**{SEARCH_RANK: rank}).order_by(f'-{SEARCH_RANK}', 'full_name')
+
+
+class EmployeeSearchAdminMixin:
+    """
+    Для ModelAdmin: поиск по ФИО сотрудника идёт через search_employees, остальные
+    search_fields — стандартным поиском админки; результаты объединяются.
+    employee_search_path — путь от модели админки к сотруднику ('' — сама модель Employee).
+    """
+
+    employee_search_path = ''
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return super().get_search_results(request, queryset, search_term)
+
+        matched_ids = search_employees(Employee.objects.all(), search_term, fields=('full_name',)).values('pk')
+        lookup = f'{self.employee_search_path}__in' if self.employee_search_path else 'pk__in'
+        matched = queryset.filter(**{lookup: matched_ids})
+        if not self.get_search_fields(request):
+            return matched, False
+        others, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        return others | matched, may_have_duplicates
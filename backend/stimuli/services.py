@@ -1,41 +1,131 @@
 from __future__ import annotations
 
+from collections import defaultdict
 from decimal import Decimal
-from typing import Union
+from typing import Iterable, Union
 
 from django.db import transaction
 from django.db.models import Sum
+from django.utils import timezone
 
+from stimul_ico.transactions import defer_until_commit
+
+from .hooks import requests_bulk_updated
 from .models import Employee, StimulusRequest
 
+# Размер пакета для фильтров pk__in и bulk_update (ограничение числа параметров в SQLite)
+RECOMPUTE_BATCH_SIZE = 500
+
 
 def _as_employee_id(employee: Union[Employee, int]) -> int:
     return employee.pk if isinstance(employee, Employee) else int(employee)
 
 
+def _format_summary_line(index: int, request: StimulusRequest) -> str:
+    responsible = request.requested_by.get_full_name() or request.requested_by.username
+    justification = (request.justification or '').strip() or '—'
+    amount_display = f"{request.amount:.2f}".replace('.', ',')
+    return f"{index}. {amount_display} ₽ — {request.get_status_display()} ({responsible}) — {justification}"
+
+
 def recompute_employee_totals(employee: Union[Employee, int]) -> None:
-    employee_id = _as_employee_id(employee)
+    recompute_employee_totals_bulk([employee])
+
+
+def schedule_employee_totals_recompute(employees: Iterable[Union[Employee, int, None]]) -> None:
+    """
+    Помечает сотрудников как требующих пересчёта итогов.
+    Внутри транзакции все пометки объединяются и пересчитываются одним пакетом
+    после её фиксации; вне транзакции пересчёт выполняется сразу.
+    """
+    employee_ids = {_as_employee_id(employee) for employee in employees if employee is not None}
+    defer_until_commit('employee-totals-recompute', employee_ids, recompute_employee_totals_bulk)
+
+
+def recompute_employee_totals_bulk(employees: Iterable[Union[Employee, int]]) -> None:
+    """
+    Пересчитывает выплату и сводку обоснований сразу для набора сотрудников.
+    Блокировки берутся в порядке возрастания id, чтобы параллельные пакеты не взаимоблокировались.
+    """
+    employee_ids = sorted({_as_employee_id(employee) for employee in employees})
+    if not employee_ids:
+        return
 
     with transaction.atomic():
-        employee_obj = Employee.objects.select_for_update().get(pk=employee_id)
+        for start in range(0, len(employee_ids), RECOMPUTE_BATCH_SIZE):
+            _recompute_batch(employee_ids[start:start + RECOMPUTE_BATCH_SIZE])
+
 
-        approved_qs = StimulusRequest.objects.filter(
-            employee_id=employee_id,
+def _recompute_batch(employee_ids: list[int]) -> None:
+    employees = list(
+        Employee.objects.select_for_update()
+        .filter(pk__in=employee_ids)
+        .order_by('pk')
+        .only('pk', 'payment', 'justification', 'updated_at')
+    )
+    if not employees:
+        return
+
+    totals = dict(
+        StimulusRequest.objects.filter(
+            employee_id__in=employee_ids,
+            status=StimulusRequest.Status.APPROVED,
+        )
+        .order_by()
+        .values('employee_id')
+        .annotate(total=Sum('amount'))
+        .values_list('employee_id', 'total')
+    )
+
+    requests_qs = (
+        StimulusRequest.objects.filter(employee_id__in=employee_ids)
+        .select_related('requested_by')
+        .order_by('employee_id', '-created_at')
+    )
+    summary_lines: dict[int, list[str]] = defaultdict(list)
+    for request in requests_qs:
+        lines = summary_lines[request.employee_id]
+        lines.append(_format_summary_line(len(lines) + 1, request))
+
+    # Пишем только изменившихся сотрудников; updated_at отражает изменение итогов
+    # (по нему, в частности, определяется версия шаблона Excel)
+    now = timezone.now()
+    changed = []
+    for employee_obj in employees:
+        payment = totals.get(employee_obj.pk) or Decimal('0')
+        lines = summary_lines.get(employee_obj.pk)
+        justification = '\n'.join(lines) if lines else ''
+        if employee_obj.payment == payment and employee_obj.justification == justification:
+            continue
+        employee_obj.payment = payment
+        employee_obj.justification = justification
+        employee_obj.updated_at = now
+        changed.append(employee_obj)
+
+    if changed:
+        Employee.objects.bulk_update(changed, ['payment', 'justification', 'updated_at'])
+
+
+def approve_pending_requests(campaign) -> int:
+    """
+    Одобряет все заявки кампании на рассмотрении одним условным UPDATE
+    и планирует один пакетный пересчёт итогов затронутых сотрудников.
+    Возвращает количество одобренных заявок.
+    """
+    campaign_id = getattr(campaign, 'pk', campaign)
+    with transaction.atomic():
+        pending = StimulusRequest.objects.filter(campaign_id=campaign_id, status=StimulusRequest.Status.PENDING)
+        # FOR UPDATE несовместим с DISTINCT в PostgreSQL, поэтому повторы убираются в Python
+        employee_ids = set(pending.select_for_update().order_by().values_list('employee_id', flat=True))
+        if not employee_ids:
+            return 0
+        approved = pending.filter(employee_id__in=employee_ids).update(
             status=StimulusRequest.Status.APPROVED,
+            updated_at=timezone.now(),
         )
-        totals = approved_qs.aggregate(total=Sum('amount'))
-        employee_obj.payment = totals['total'] or Decimal('0')
-
-        requests_qs = StimulusRequest.objects.filter(employee_id=employee_id).select_related('requested_by').order_by('-created_at')
-
-        summary_lines: list[str] = []
-        for index, request in enumerate(requests_qs, start=1):
-            responsible = request.requested_by.get_full_name() or request.requested_by.username
-            justification = (request.justification or '').strip() or '—'
-            amount_display = f"{request.amount:.2f}".replace('.', ',')
-            summary_lines.append(
-                f"{index}. {amount_display} ₽ — {request.get_status_display()} ({responsible}) — {justification}"
-            )
-
-        employee_obj.justification = '\n'.join(summary_lines) if summary_lines else ''
-        employee_obj.save(update_fields=['payment', 'justification'])
+        # UPDATE не отправляет post_save заявок: итоги сотрудников пересчитываются здесь,
+        # а производные данные других приложений (факты и версия данных дэшборда) —
+        # подписчиками requests_bulk_updated
+        schedule_employee_totals_recompute(employee_ids)
+        requests_bulk_updated.send(sender=StimulusRequest, employee_ids=employee_ids)
+    return approved
@@ -1,15 +1,30 @@
-from django.db.models.signals import post_delete, post_save
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models.signals import post_delete, post_migrate, post_save
 from django.dispatch import receiver
 
 from .models import StimulusRequest
-from .services import recompute_employee_totals
+from .search import ensure_search_index
+from .services import schedule_employee_totals_recompute
 
 
 @receiver(post_save, sender=StimulusRequest)
 def handle_request_save(sender, instance: StimulusRequest, **kwargs):
-    recompute_employee_totals(instance.employee_id)
+    schedule_employee_totals_recompute([instance.employee_id])
 
 
 @receiver(post_delete, sender=StimulusRequest)
 def handle_request_delete(sender, instance: StimulusRequest, **kwargs):
-    recompute_employee_totals(instance.employee_id)
+    schedule_employee_totals_recompute([instance.employee_id])
+
+
+@receiver(post_migrate)
+def handle_post_migrate(sender, app_config, using, **kwargs):
+    # SQLite теряет триггеры поискового индекса, когда миграция пересоздаёт таблицу сотрудников
+    if app_config.label != 'stimuli':
+        return
+    connection = connections[using]
+    if connection.vendor == 'sqlite' and MigrationRecorder(connection).migration_qs.filter(
+        app='stimuli', name='0016_employee_search_index'
+    ).exists():
+        ensure_search_index(connection)
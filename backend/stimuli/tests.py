@@ -0,0 +1,598 @@
+import io
+import shutil
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from dashboard.versioning import bump_data_version
+
+from one_time_payments.models import RequestCampaign
+from staffing.models import Division, Position
+
+from .export_jobs import purge_expired_export_jobs, run_export_job, submit_export_job
+from .imports import (
+    EmployeeImportError,
+    apply_employee_import,
+    discard_employee_import,
+    stage_employee_import,
+)
+from .models import (
+    Employee, EmployeeImport, ExportJob, InternalAssignment, StagedEmployeeRow, StimulusRequest, UserDivision,
+)
+from .pagination import KeysetPaginator
+from .permissions import (
+    DEPARTMENT_MANAGER_GROUP,
+    EMPLOYEE_GROUP,
+    INSTITUTE_LEADERSHIP_GROUP,
+    can_delete_request,
+    can_edit_request,
+    clear_permission_context,
+    get_accessible_employees,
+    get_user_division,
+    is_department_manager,
+    is_employee,
+)
+from .services import approve_pending_requests, schedule_employee_totals_recompute
+from .views import StimulusRequestListView
+
+
+class EmployeeTotalsRecomputeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('manager')
+        cls.employee = Employee.objects.create(
+            full_name='Иванов',
+            division=Division.objects.create(name='Кафедра'),
+            position=Position.objects.create(name='Доцент', base_salary=Decimal('50000')),
+            category=Employee.Category.PPS,
+        )
+
+    @mock.patch('stimuli.services.recompute_employee_totals_bulk')
+    def test_marks_are_coalesced_into_one_flush_per_transaction(self, recompute):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            schedule_employee_totals_recompute([1, 2])
+            with transaction.atomic():
+                schedule_employee_totals_recompute([2, 3])
+            schedule_employee_totals_recompute([None, 4])
+            recompute.assert_not_called()
+        self.assertEqual(len(callbacks), 1)
+        recompute.assert_called_once_with({1, 2, 3, 4})
+
+    @mock.patch('stimuli.services.recompute_employee_totals_bulk')
+    def test_rolled_back_marks_are_dropped(self, recompute):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                schedule_employee_totals_recompute([1])
+                raise RuntimeError
+            # Набор отменённой точки сохранения не должен поглотить новые пометки
+            schedule_employee_totals_recompute([2])
+        self.assertEqual(len(callbacks), 1)
+        recompute.assert_called_once_with({2})
+
+    def test_totals_follow_request_changes_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for amount in (Decimal('100'), Decimal('50')):
+                StimulusRequest.objects.create(
+                    employee=self.employee,
+                    requested_by=self.user,
+                    amount=amount,
+                    justification='Обоснование',
+                    status=StimulusRequest.Status.APPROVED,
+                )
+            self.employee.refresh_from_db()
+            self.assertEqual(self.employee.payment, Decimal('0'))
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.payment, Decimal('150'))
+        self.assertEqual(len(self.employee.justification.splitlines()), 2)
+
+
+class CampaignApprovalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('manager')
+        division = Division.objects.create(name='Кафедра')
+        position = Position.objects.create(name='Доцент', base_salary=Decimal('50000'))
+        cls.employees = [
+            Employee.objects.create(
+                full_name=full_name, division=division, position=position, category=Employee.Category.PPS,
+            )
+            for full_name in ('Иванов', 'Петров')
+        ]
+        cls.campaign, cls.other_campaign = [
+            RequestCampaign.objects.create(name=name, status=RequestCampaign.Status.OPEN, opens_at=date(2026, 1, 1))
+            for name in ('Январь', 'Февраль')
+        ]
+        Pending, Rejected = StimulusRequest.Status.PENDING, StimulusRequest.Status.REJECTED
+        # Отложенные пересчёты выполняются здесь, а не остаются в транзакции класса до конца тестов
+        with cls.captureOnCommitCallbacks(execute=True):
+            for campaign, employee, amount, status in (
+                (cls.campaign, cls.employees[0], 100, Pending),
+                (cls.campaign, cls.employees[0], 50, Pending),
+                (cls.campaign, cls.employees[1], 70, Pending),
+                (cls.campaign, cls.employees[1], 30, Rejected),
+                (cls.other_campaign, cls.employees[1], 40, Pending),
+            ):
+                StimulusRequest.objects.create(
+                    campaign=campaign,
+                    employee=employee,
+                    requested_by=cls.user,
+                    amount=Decimal(amount),
+                    justification='Обоснование',
+                    status=status,
+                )
+
+    def test_approves_pending_requests_and_recomputes_totals(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(approve_pending_requests(self.campaign), 3)
+
+        statuses = sorted(self.campaign.stimulus_requests.values_list('amount', 'status'))
+        self.assertEqual(statuses, [
+            (Decimal('30'), StimulusRequest.Status.REJECTED),
+            (Decimal('50'), StimulusRequest.Status.APPROVED),
+            (Decimal('70'), StimulusRequest.Status.APPROVED),
+            (Decimal('100'), StimulusRequest.Status.APPROVED),
+        ])
+        self.assertEqual(
+            self.other_campaign.stimulus_requests.get().status, StimulusRequest.Status.PENDING,
+        )
+        payments = dict(Employee.objects.values_list('full_name', 'payment'))
+        self.assertEqual(payments, {'Иванов': Decimal('150'), 'Петров': Decimal('70')})
+
+    def test_nothing_to_approve(self):
+        approve_pending_requests(self.campaign)
+        self.assertEqual(approve_pending_requests(self.campaign), 0)
+
+
+class PermissionContextTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.division = Division.objects.create(name='Кафедра')
+        cls.user = get_user_model().objects.create_user('manager')
+        cls.user.groups.add(Group.objects.create(name=DEPARTMENT_MANAGER_GROUP))
+        UserDivision.objects.create(user=cls.user, division=cls.division)
+
+    def test_context_is_loaded_once_per_user_object(self):
+        user = get_user_model().objects.get(pk=self.user.pk)
+        # Группы и UserDivision
+        with self.assertNumQueries(2):
+            self.assertTrue(is_department_manager(user))
+            self.assertFalse(is_employee(user))
+            self.assertEqual(get_user_division(user), self.division)
+            get_accessible_employees(user)
+
+    def test_clear_reloads_context(self):
+        user = get_user_model().objects.get(pk=self.user.pk)
+        self.assertEqual(get_user_division(user), self.division)
+        UserDivision.objects.filter(user=user).update(can_view_all=True)
+        self.assertEqual(get_user_division(user), self.division)
+        clear_permission_context(user)
+        self.assertIsNone(get_user_division(user))
+
+
+class RequestListPermissionAnnotationTests(TestCase):
+    ROLES = ('staff', 'leadership', 'manager', 'employee', 'view_all', 'view_own', 'outsider')
+
+    @classmethod
+    def setUpTestData(cls):
+        division = Division.objects.create(name='Кафедра')
+        position = Position.objects.create(name='Доцент', base_salary=Decimal('50000'))
+        groups = {name: Group.objects.create(name=name)
+                  for name in (DEPARTMENT_MANAGER_GROUP, INSTITUTE_LEADERSHIP_GROUP, EMPLOYEE_GROUP)}
+        User = get_user_model()
+        cls.users = {role: User.objects.create_user(role, is_staff=role == 'staff') for role in cls.ROLES}
+        cls.users['leadership'].groups.add(groups[INSTITUTE_LEADERSHIP_GROUP])
+        cls.users['manager'].groups.add(groups[DEPARTMENT_MANAGER_GROUP])
+        cls.users['employee'].groups.add(groups[EMPLOYEE_GROUP])
+        UserDivision.objects.create(user=cls.users['manager'], division=division)
+        UserDivision.objects.create(user=cls.users['view_all'], division=division, can_view_all=True)
+        UserDivision.objects.create(user=cls.users['view_own'], division=division, can_view_own_requests=True)
+
+        employees = [
+            Employee.objects.create(
+                full_name=role, division=division, position=position, category=Employee.Category.PPS,
+                user=cls.users[role] if role in ('employee', 'view_own') else None,
+            )
+            for role in ('employee', 'view_own', 'other')
+        ]
+        campaign = RequestCampaign.objects.create(
+            name='Январь', status=RequestCampaign.Status.OPEN, opens_at=date(2026, 1, 1),
+        )
+        with cls.captureOnCommitCallbacks(execute=True):
+            for index, user in enumerate(cls.users.values()):
+                for status in (StimulusRequest.Status.PENDING, StimulusRequest.Status.APPROVED):
+                    StimulusRequest.objects.create(
+                        campaign=campaign,
+                        employee=employees[index % len(employees)],
+                        requested_by=user,
+                        amount=Decimal('100'),
+                        justification='Обоснование',
+                        status=status,
+                    )
+
+    def list_rows(self, user):
+        request = RequestFactory().get('/requests/')
+        request.user = user
+        view = StimulusRequestListView()
+        view.setup(request)
+        return list(view.get_queryset())
+
+    def test_annotations_match_permission_helpers(self):
+        for role in self.ROLES:
+            user = get_user_model().objects.get(username=role)
+            with self.subTest(role=role):
+                rows = self.list_rows(user)
+                if role != 'outsider':
+                    self.assertTrue(rows)
+                    # У каждой роли есть своя заявка на рассмотрении
+                    self.assertTrue(any(row.can_edit for row in rows))
+                for row in rows:
+                    self.assertEqual(row.can_edit, can_edit_request(user, row))
+                    self.assertEqual(row.can_delete, can_delete_request(user, row))
+                    self.assertEqual(row.can_change_status, user.is_staff)
+
+
+class RequestXlsxExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('admin', is_staff=True, is_superuser=True)
+        division = Division.objects.create(name='Кафедра')
+        position = Position.objects.create(name='Доцент', base_salary=Decimal('50000'))
+        employee = Employee.objects.create(
+            full_name='Иванов', division=division, position=position, category=Employee.Category.PPS,
+        )
+        campaign = RequestCampaign.objects.create(
+            name='Январь', status=RequestCampaign.Status.OPEN, opens_at=date(2026, 1, 1),
+        )
+        with cls.captureOnCommitCallbacks(execute=True):
+            for amount, status in ((100, StimulusRequest.Status.PENDING), (70, StimulusRequest.Status.APPROVED)):
+                StimulusRequest.objects.create(
+                    campaign=campaign,
+                    employee=employee,
+                    requested_by=cls.user,
+                    amount=Decimal(amount),
+                    justification='Обоснование',
+                    status=status,
+                )
+
+    def export_workbook(self, params=None):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('request-export'), params or {})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('.xlsx', response['Content-Disposition'])
+        return load_workbook(io.BytesIO(b''.join(response.streaming_content)))
+
+    def test_rows_and_header(self):
+        workbook = self.export_workbook()
+
+        self.assertEqual(workbook.sheetnames, ['Заявки'])
+        rows = list(workbook['Заявки'].iter_rows(values_only=True))
+        self.assertEqual(rows[0][:4], ('ID', 'Создано', 'Обновлено', 'Сотрудник'))
+        self.assertEqual(sorted(row[5] for row in rows[1:]), [70, 100])
+        self.assertEqual({row[3] for row in rows[1:]}, {'Иванов'})
+
+    def test_filters_sheet(self):
+        campaign = RequestCampaign.objects.get()
+        workbook = self.export_workbook({'campaign': campaign.pk, 'status': StimulusRequest.Status.APPROVED})
+
+        self.assertEqual(workbook.sheetnames, ['Заявки', 'Фильтры'])
+        rows = list(workbook['Заявки'].iter_rows(values_only=True))
+        self.assertEqual([row[5] for row in rows[1:]], [70])
+        filters = list(workbook['Фильтры'].iter_rows(values_only=True))
+        self.assertEqual(filters[0], ('Поле', 'Значение'))
+        self.assertIn(('Кампания', str(campaign)), filters[1:])
+
+
+class ExportJobTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('admin', is_staff=True, is_superuser=True)
+        # Версия данных должна увеличиться здесь, а не остаться в транзакции класса
+        with cls.captureOnCommitCallbacks(execute=True):
+            division = Division.objects.create(name='Кафедра')
+            position = Position.objects.create(name='Доцент', base_salary=Decimal('50000'))
+            employee = Employee.objects.create(
+                full_name='Иванов', division=division, position=position, category=Employee.Category.PPS,
+            )
+            campaign = RequestCampaign.objects.create(
+                name='Январь', status=RequestCampaign.Status.OPEN, opens_at=date(2026, 1, 1),
+            )
+            for amount, status in ((100, StimulusRequest.Status.PENDING), (70, StimulusRequest.Status.APPROVED)):
+                StimulusRequest.objects.create(
+                    campaign=campaign,
+                    employee=employee,
+                    requested_by=cls.user,
+                    amount=Decimal(amount),
+                    justification='Обоснование',
+                    status=status,
+                )
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root, EXPORT_JOBS_RUN_IN_PROCESS=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def submit(self, query_string='status=approved', export_format='csv'):
+        return submit_export_job(self.user, ExportJob.Kind.REQUESTS, export_format, query_string=query_string)
+
+    def test_same_params_reuse_job(self):
+        job, created = self.submit('status=approved&sort=amount')
+        self.assertTrue(created)
+        # Порядок и служебные параметры не влияют на ключ
+        same_job, created = self.submit('format=xlsx&sort=amount&status=approved&page=2')
+        self.assertFalse(created)
+        self.assertEqual(same_job.pk, job.pk)
+
+        _, created = self.submit('status=pending')
+        self.assertTrue(created)
+
+    def test_data_change_gives_new_job(self):
+        job, _ = self.submit()
+        run_export_job(job.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_data_version()
+
+        new_job, created = self.submit()
+        self.assertTrue(created)
+        self.assertNotEqual(new_job.params_hash, job.params_hash)
+
+    def test_run_builds_file_without_request(self):
+        job, _ = self.submit()
+
+        job = run_export_job(job.pk)
+
+        self.assertEqual(job.status, ExportJob.Status.DONE, job.error)
+        self.assertTrue(job.filename.startswith('stimulus_requests_'))
+        self.assertTrue(job.filename.endswith('.csv'))
+        self.assertEqual((job.progress, job.total), (1, 1))
+        with job.file.open('rb') as exported:
+            lines = exported.read().decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith('ID,Создано'))
+        self.assertIn('Иванов', lines[1])
+        self.assertIn('70', lines[1])
+        # Задание уже взято — повторный запуск ничего не делает
+        self.assertIsNone(run_export_job(job.pk))
+
+    def test_expired_jobs_are_purged(self):
+        job, _ = self.submit()
+        job = run_export_job(job.pk)
+        storage, name = job.file.storage, job.file.name
+        self.assertTrue(storage.exists(name))
+
+        self.assertEqual(purge_expired_export_jobs(), 0)
+        self.assertEqual(purge_expired_export_jobs(now=job.expires_at + timedelta(seconds=1)), 1)
+        self.assertFalse(ExportJob.objects.filter(pk=job.pk).exists())
+        self.assertFalse(storage.exists(name))
+
+    def test_expired_job_is_not_reused(self):
+        job, _ = self.submit()
+        run_export_job(job.pk)
+        ExportJob.objects.filter(pk=job.pk).update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        new_job, created = self.submit()
+        self.assertTrue(created)
+        self.assertNotEqual(new_job.pk, job.pk)
+
+
+class KeysetPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        division = Division.objects.create(name='Кафедра')
+        position = Position.objects.create(name='Доцент', base_salary=Decimal('50000'))
+        # Повторяющиеся даты и NULL проверяют добор ключа по pk и место пустых значений
+        until = [date(2026, 3, 1), None, date(2026, 1, 1), date(2026, 3, 1), None, date(2026, 2, 1), None,
+                 date(2026, 1, 1), date(2026, 3, 1)]
+        for index, value in enumerate(until):
+            Employee.objects.create(
+                full_name=f'Сотрудник {index}',
+                division=division,
+                position=position,
+                category=Employee.Category.PPS,
+                allowance_until=value,
+                payment=Decimal(index % 3),
+            )
+
+    def expected(self, ordering):
+        """Ожидаемый порядок pk: NULL — больше любого значения, последним ключом идёт pk."""
+        employees = list(Employee.objects.all())
+        fields = [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+        fields.append(('pk', fields[-1][1]))
+        for field, descending in reversed(fields):
+            employees.sort(
+                key=lambda obj: (getattr(obj, field) is None, getattr(obj, field) or 0),
+                reverse=descending,
+            )
+        return [obj.pk for obj in employees]
+
+    def walk_forward(self, paginator):
+        pages = []
+        page = paginator.page()
+        pages.append([obj.pk for obj in page])
+        while page.has_next():
+            page = paginator.page(after=page.next_cursor)
+            pages.append([obj.pk for obj in page])
+        return pages, page
+
+    def test_pages_follow_ordering_with_nulls(self):
+        for ordering in (['allowance_until'], ['-allowance_until'], ['-payment', 'allowance_until']):
+            with self.subTest(ordering=ordering):
+                paginator = KeysetPaginator(Employee.objects.all(), ordering, per_page=2)
+                pages, _ = self.walk_forward(paginator)
+                self.assertEqual([pk for chunk in pages for pk in chunk], self.expected(ordering))
+                self.assertTrue(all(len(chunk) == 2 for chunk in pages[:-1]))
+
+    def test_before_cursor_returns_previous_pages(self):
+        for ordering in (['allowance_until'], ['-allowance_until']):
+            with self.subTest(ordering=ordering):
+                paginator = KeysetPaginator(Employee.objects.all(), ordering, per_page=2)
+                pages, page = self.walk_forward(paginator)
+                self.assertFalse(page.has_next())
+                back = [[obj.pk for obj in page]]
+                while page.has_previous():
+                    page = paginator.page(before=page.previous_cursor)
+                    back.append([obj.pk for obj in page])
+                self.assertEqual(back[::-1], pages)
+                self.assertFalse(page.has_previous())
+
+    def test_beyond_selects_rows_after_key(self):
+        for ordering in (['allowance_until'], ['-allowance_until']):
+            expected = self.expected(ordering)
+            paginator = KeysetPaginator(Employee.objects.all(), ordering, per_page=2)
+            for position, pk in enumerate(expected):
+                with self.subTest(ordering=ordering, pk=pk):
+                    employee = Employee.objects.get(pk=pk)
+                    values = [employee.allowance_until, employee.pk]
+                    after = paginator._ordered().filter(paginator._beyond(values))
+                    self.assertEqual([obj.pk for obj in after], expected[position + 1:])
+                    before = paginator._ordered(reverse=True).filter(paginator._beyond(values, reverse=True))
+                    self.assertEqual([obj.pk for obj in before], expected[:position][::-1])
+
+    def test_invalid_cursor_opens_first_page(self):
+        paginator = KeysetPaginator(Employee.objects.all(), ['allowance_until'], per_page=2)
+        page = paginator.page(after='broken')
+        self.assertEqual([obj.pk for obj in page], self.expected(['allowance_until'])[:2])
+        self.assertFalse(page.has_previous())
+
+
+def template_row(full_name, division='Кафедра', position='Доцент', category='ППС', rate=1,
+                 allowance=0, reason='', until=None, payment=0, justification=''):
+    """Строка файла в порядке столбцов шаблона (вычисляемые столбцы пустые)."""
+    return (full_name, division, position, category, rate, None, None, None, None, None,
+            allowance, reason, until, payment, justification)
+
+
+class EmployeeImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('importer')
+        cls.division = Division.objects.create(name='Кафедра')
+        cls.position = Position.objects.create(name='Доцент', base_salary=Decimal('50000'))
+        for full_name, payment in (('Иванов', 100), ('Петров', 200)):
+            Employee.objects.create(
+                full_name=full_name,
+                division=cls.division,
+                position=cls.position,
+                category=Employee.Category.PPS,
+                payment=Decimal(payment),
+            )
+
+    def stage(self, rows, full_sync=False):
+        return stage_employee_import(enumerate(rows, start=2), user=self.user, full_sync=full_sync)
+
+    def test_stage_classifies_rows_without_touching_employees(self):
+        employee_import = self.stage([
+            template_row('Иванов', payment=100),
+            template_row('Петров', payment=250),
+            template_row('Сидоров', division='Новая кафедра'),
+        ])
+        actions = dict(employee_import.rows.values_list('full_name', 'action'))
+        self.assertEqual(actions, {
+            'Иванов': StagedEmployeeRow.Action.UNCHANGED,
+            'Петров': StagedEmployeeRow.Action.UPDATE,
+            'Сидоров': StagedEmployeeRow.Action.CREATE,
+        })
+        self.assertEqual(
+            (employee_import.created_count, employee_import.updated_count, employee_import.unchanged_count),
+            (1, 1, 1),
+        )
+        self.assertEqual(Employee.objects.get(full_name='Петров').payment, Decimal('200'))
+        self.assertFalse(Employee.objects.filter(full_name='Сидоров').exists())
+
+    def test_apply_creates_and_updates(self):
+        employee_import = self.stage([
+            template_row('Иванов', payment=100),
+            template_row('Петров', position='Профессор', payment=250, until=date(2026, 12, 31)),
+            template_row('Сидоров', division='Новая кафедра', category='АУП', payment=50),
+        ])
+        unchanged_updated_at = Employee.objects.get(full_name='Иванов').updated_at
+
+        apply_employee_import(employee_import)
+
+        employee_import.refresh_from_db()
+        self.assertEqual(employee_import.status, EmployeeImport.Status.APPLIED)
+        self.assertEqual((employee_import.created_count, employee_import.updated_count), (1, 1))
+        self.assertEqual((employee_import.auto_created_divisions, employee_import.auto_created_positions), (1, 1))
+
+        updated = Employee.objects.select_related('position').get(full_name='Петров')
+        self.assertEqual(updated.position.name, 'Профессор')
+        self.assertEqual(updated.payment, Decimal('250'))
+        self.assertEqual(updated.allowance_until, date(2026, 12, 31))
+
+        created = Employee.objects.select_related('division').get(full_name='Сидоров')
+        self.assertEqual(created.division.name, 'Новая кафедра')
+        self.assertEqual(created.category, Employee.Category.AUP)
+
+        self.assertEqual(Employee.objects.get(full_name='Иванов').updated_at, unchanged_updated_at)
+
+    def test_full_sync_deletes_missing_employees(self):
+        employee_import = self.stage([template_row('Иванов', payment=100)], full_sync=True)
+        self.assertEqual(employee_import.deleted_count, 1)
+        apply_employee_import(employee_import)
+        self.assertEqual(list(Employee.objects.values_list('full_name', flat=True)), ['Иванов'])
+
+    def test_apply_twice_is_rejected(self):
+        employee_import = self.stage([template_row('Петров', payment=300)])
+        apply_employee_import(employee_import)
+        with self.assertRaises(EmployeeImportError):
+            apply_employee_import(employee_import)
+
+    def test_discard_removes_rows_and_blocks_apply(self):
+        employee_import = self.stage([template_row('Петров', payment=300), template_row('Сидоров')])
+        self.assertTrue(discard_employee_import(employee_import))
+        self.assertFalse(employee_import.rows.exists())
+        with self.assertRaises(EmployeeImportError):
+            apply_employee_import(employee_import)
+        self.assertEqual(Employee.objects.get(full_name='Петров').payment, Decimal('200'))
+        self.assertFalse(Employee.objects.filter(full_name='Сидоров').exists())
+        self.assertFalse(discard_employee_import(employee_import))
+
+
+class EmployeeTemplateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('admin', is_staff=True, is_superuser=True)
+        division = Division.objects.create(name='Кафедра')
+        position = Position.objects.create(name='Доцент', base_salary=Decimal('50000'))
+        employee = Employee.objects.create(
+            full_name='Иванов', division=division, position=position, category=Employee.Category.PPS,
+        )
+        cls.assignment = InternalAssignment.objects.create(employee=employee, position=position, rate=Decimal('0.5'))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def download(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(reverse('employee-excel-template'), **headers)
+
+    def test_unchanged_data_answers_304(self):
+        response = self.download()
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        sheet = load_workbook(io.BytesIO(response.content))['Сотрудники']
+        self.assertEqual([row[0] for row in sheet.iter_rows(min_row=2, values_only=True)], ['Иванов'])
+
+        response = self.download(etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_assignment_change_gives_new_version(self):
+        etag = self.download()['ETag']
+
+        self.assignment.rate = Decimal('0.25')
+        self.assignment.save()
+
+        response = self.download(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
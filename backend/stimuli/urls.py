@@ -17,6 +17,7 @@ urlpatterns = [
     path('employees/<int:pk>/delete/', views.EmployeeDeleteView.as_view(), name='employee-delete'),
     path('employees/excel-template/', views.EmployeeExcelTemplateView.as_view(), name='employee-excel-template'),
     path('employees/excel-upload/', views.EmployeeExcelUploadView.as_view(), name='employee-excel-upload'),
+    path('employees/import/<int:pk>/', views.EmployeeImportPreviewView.as_view(), name='employee-import-preview'),
     path('requests/', views.StimulusRequestListView.as_view(), name='request-list'),
     path('requests/export/', views.StimulusRequestExportView.as_view(), name='request-export'),
     path('requests/new/', views.StimulusRequestCreateView.as_view(), name='request-create'),
@@ -25,4 +26,7 @@ urlpatterns = [
     path('requests/<int:pk>/update-status/', views.StimulusRequestStatusUpdateView.as_view(), name='request-status-update'),
     path('requests/<int:pk>/delete/', views.StimulusRequestDeleteView.as_view(), name='request-delete'),
     path('requests/bulk-delete/', views.StimulusRequestBulkDeleteView.as_view(), name='request-bulk-delete'),
+    path('exports/', views.ExportJobCreateView.as_view(), name='export-job-create'),
+    path('exports/<int:pk>/', views.ExportJobStatusView.as_view(), name='export-job-status'),
+    path('exports/<int:pk>/download/', views.ExportJobDownloadView.as_view(), name='export-job-download'),
 ]
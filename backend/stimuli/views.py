@@ -1,38 +1,61 @@
 from decimal import Decimal
-import io
 import logging
 from datetime import datetime
 
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.db import transaction
-from django.db.models import BooleanField, Case, Value, When, Q, QuerySet
-from django.http import Http404, QueryDict, HttpResponse
-from django.shortcuts import get_object_or_404, redirect
+from django.db.models import BooleanField, Case, Value, When, Q
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse, Http404, JsonResponse, QueryDict, HttpResponse
+from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse, reverse_lazy
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 from django.views import View, generic
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
-from openpyxl.utils import get_column_letter
 
 from .filters import EmployeeFilter, StimulusRequestFilter
 from .forms import EmployeeForm, InternalAssignmentFormSet, StimulusRequestForm, StimulusRequestStatusForm, EmployeeExcelUploadForm
 from .permissions import (
-    is_department_manager, is_employee, get_user_division,
-    can_view_all_requests, can_view_own_requests, can_edit_request, can_delete_request, can_change_request_status, get_accessible_employees
+    is_department_manager, is_employee, is_institute_leadership, get_user_division,
+    can_view_all_requests, can_view_own_requests, can_modify_own_pending_requests, can_change_request_status, get_accessible_employees
 )
 from one_time_payments.models import RequestCampaign
-from staffing.models import Division, Position
-from .models import Employee, StimulusRequest
-from .services import recompute_employee_totals
+from staffing.models import Division
+from .models import Employee, EmployeeImport, ExportJob, StagedEmployeeRow, StimulusRequest
+from .export_jobs import ExportJobError, submit_export_job
+from .imports import (
+    PREVIEW_ROW_LIMIT,
+    EmployeeImportError,
+    apply_employee_import,
+    changed_rows,
+    discard_employee_import,
+    employee_template_version,
+    employees_to_delete,
+    field_change_counts,
+    get_employee_template,
+    missing_reference_names,
+    read_workbook_rows,
+    stage_employee_import,
+)
+from .pagination import CURSOR_PARAMS, KeysetPaginationMixin
+from .exports import (
+    EXPORT_FORMAT_XLSX, REQUEST_EXPORT_COLUMNS, XLSX_CONTENT_TYPE, ExportPlan, filterset_rows, get_export_format,
+    request_export_rows,
+)
+from .services import schedule_employee_totals_recompute
 
 
 def resolve_sorting(request, sortable_fields, default_field='', default_direction='asc'):
-    sort_field = request.GET.get('sort') or default_field
+    return resolve_sorting_params(request.GET, sortable_fields, default_field, default_direction)
+
+
+def resolve_sorting_params(params, sortable_fields, default_field='', default_direction='asc'):
+    sort_field = params.get('sort') or default_field
     if sort_field not in sortable_fields:
         sort_field = default_field
 
-    sort_direction = request.GET.get('direction') or default_direction
+    sort_direction = params.get('direction') or default_direction
     if sort_direction not in ('asc', 'desc'):
         sort_direction = default_direction
 
@@ -61,7 +84,7 @@ class SortingMixin:
 
     def _build_sorting_context(self):
         base_params = self.request.GET.copy()
-        for key in ('page', 'sort', 'direction'):
+        for key in ('page', 'sort', 'direction') + CURSOR_PARAMS:
             base_params.pop(key, None)
 
         sorting = {}
@@ -89,11 +112,13 @@ class SortingMixin:
         return sorting
 
 
-class EmployeeListView(LoginRequiredMixin, PermissionRequiredMixin, generic.ListView):
+class EmployeeListView(KeysetPaginationMixin, LoginRequiredMixin, PermissionRequiredMixin, generic.ListView):
     model = Employee
     template_name = 'stimuli/employee_list.html'
     context_object_name = 'employees'
     paginate_by = 25
+    # «Весь список» тоже выводится по ключу, но крупными страницами
+    show_all_paginate_by = 500
     permission_required = 'stimuli.view_employee'
     AVAILABLE_COLUMNS = [
         ('division', 'Подразделение'),
@@ -130,14 +155,54 @@ class EmployeeListView(LoginRequiredMixin, PermissionRequiredMixin, generic.List
 
     def get_paginate_by(self, queryset):
         if self.request.GET.get('show') == 'all':
-            return None
+            return self.show_all_paginate_by
         return self.paginate_by
 
+    # Что нужно запросу для каждого столбца: поля для .only(), связи для select_related,
+    # аннотации with_compensation и prefetch
+    COLUMN_QUERY_PLAN = {
+        'division': {'fields': ['division__name'], 'related': ['division']},
+        'position': {'fields': ['position__name'], 'related': ['position']},
+        'base_salary': {'fields': ['position__base_salary'], 'related': ['position']},
+        'rate': {'fields': ['rate']},
+        'salary': {'annotations': ['salary']},
+        'assignments': {'prefetch': ['assignments__position']},
+        'assignments_salary': {'annotations': ['assignments_salary']},
+        'total_salary': {'annotations': ['salary', 'assignments_salary']},
+        'allowance_amount': {'annotations': ['allowance_total']},
+        'allowance_reason': {'fields': ['allowance_reason']},
+        'allowance_until': {'fields': ['allowance_until']},
+        'payment': {'fields': ['payment']},
+        'justification': {'fields': ['justification']},
+        'total_payments': {'annotations': ['total_payments']},
+    }
+
     def get_queryset(self):
-        qs = Employee.objects.select_related('division', 'position').prefetch_related('requests__requested_by', 'assignments__position')
+        qs = self.plan_queryset(Employee.objects.all(), self.get_selected_columns())
         self.filterset = EmployeeFilter(self.request.GET or None, queryset=qs)
         return self.filterset.qs
 
+    def plan_queryset(self, qs, columns):
+        """Загружает только то, что показывают выбранные столбцы"""
+        fields = ['full_name']
+        related = set()
+        annotations = set()
+        prefetch = set()
+        for key in columns:
+            plan = self.COLUMN_QUERY_PLAN.get(key, {})
+            fields.extend(plan.get('fields', ()))
+            related.update(plan.get('related', ()))
+            annotations.update(plan.get('annotations', ()))
+            prefetch.update(plan.get('prefetch', ()))
+
+        if related:
+            qs = qs.select_related(*sorted(related))
+        if annotations:
+            qs = qs.with_compensation(*sorted(annotations))
+        if prefetch:
+            qs = qs.prefetch_related(*sorted(prefetch))
+        return qs.only(*fields)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['filter'] = getattr(
@@ -152,8 +217,8 @@ class EmployeeListView(LoginRequiredMixin, PermissionRequiredMixin, generic.List
             'available_columns': self.AVAILABLE_COLUMNS,
             'selected_columns': selected_columns,
             'show_all': show_all,
-            'show_all_url': self._build_query(show='all'),
-            'paginate_url': self._build_query(show=None),
+            'show_all_url': self._build_query(show='all', after=None, before=None),
+            'paginate_url': self._build_query(show=None, after=None, before=None),
         })
         extra_cols = 1 + len(selected_columns)
         if user.has_perm('stimuli.change_employee'):
@@ -252,11 +317,13 @@ class EmployeeDeleteView(LoginRequiredMixin, PermissionRequiredMixin, generic.De
     success_url = reverse_lazy('employee-list')
 
 
-class StimulusRequestListView(SortingMixin, LoginRequiredMixin, generic.ListView):
-    model = StimulusRequest
-    template_name = 'stimuli/request_list.html'
-    context_object_name = 'requests'
-    paginate_by = 25
+class StimulusRequestListQuery:
+    """
+    Заявки, видимые пользователю, с фильтрами, сортировкой и аннотациями прав списка заявок.
+    Строится по пользователю и GET-параметрам без объекта запроса, поэтому его же используют
+    выгрузка списка и фоновые задания выгрузки. Кроме queryset заполняет варианты фильтров
+    (employee_options, campaign_options и т.д.) и выбранные значения для шаблона списка.
+    """
 
     SORTABLE_FIELDS = {
         'created': ('created_at',),
@@ -269,9 +336,14 @@ class StimulusRequestListView(SortingMixin, LoginRequiredMixin, generic.ListView
     DEFAULT_SORT_FIELD = 'employee'
     DEFAULT_SORT_DIRECTION = 'asc'
 
-    def get_queryset(self):
+    def __init__(self, user, params):
+        self.user = user
+        self.params = params
+        self.queryset = self._build()
+
+    def _build(self):
         qs = StimulusRequest.objects.select_related('employee', 'requested_by', 'campaign')
-        user = self.request.user
+        user = self.user
         
         # Определяем базовый queryset в зависимости от прав пользователя
         # ВАЖНО: Проверяем can_view_own_requests ПЕРВЫМ, чтобы он имел приоритет
@@ -289,7 +361,7 @@ class StimulusRequestListView(SortingMixin, LoginRequiredMixin, generic.ListView
                 base_qs = qs.filter(requested_by=user)
         elif can_view_all_requests(user):
             # Администраторы, руководство института и пользователи с can_view_all видят все заявки
-            if user.is_staff or user.groups.filter(name='Руководство института').exists():
+            if user.is_staff or is_institute_leadership(user):
                 base_qs = qs
             else:
                 # Пользователи с can_view_all (но не администраторы и не руководство института) видят только свои заявки
@@ -306,7 +378,7 @@ class StimulusRequestListView(SortingMixin, LoginRequiredMixin, generic.ListView
             base_qs = qs.none()
         
         # Обрабатываем параметры для filterset (только campaign и requested_by)
-        params = self.request.GET.copy()
+        params = self.params.copy()
         for key in ('requested_by',):
             values = [value for value in params.getlist(key) if value != '__all__']
             if values:
@@ -317,7 +389,7 @@ class StimulusRequestListView(SortingMixin, LoginRequiredMixin, generic.ListView
         # Убираем status из params для filterset - обработаем вручную
         params.pop('status', None)
 
-        self.filterset = StimulusRequestFilter(params or None, queryset=base_qs, request=self.request)
+        self.filterset = StimulusRequestFilter(params or None, queryset=base_qs, user=user)
         filtered_qs = self.filterset.qs
 
         base_for_options = self.filterset.queryset if hasattr(self.filterset, 'queryset') else base_qs
@@ -332,7 +404,7 @@ class StimulusRequestListView(SortingMixin, LoginRequiredMixin, generic.ListView
         self.employee_options = list(Employee.objects.filter(id__in=employee_ids).order_by('full_name'))
         self.division_options = list(Division.objects.filter(id__in=division_ids).order_by('name'))
 
-        raw_employee_values = self.request.GET.getlist('employees')
+        raw_employee_values = self.params.getlist('employees')
         selected_employee_ids = []
         for value in raw_employee_values:
             if value == '__all__':
@@ -344,7 +416,7 @@ class StimulusRequestListView(SortingMixin, LoginRequiredMixin, generic.ListView
         if selected_employee_ids:
             filtered_qs = filtered_qs.filter(employee_id__in=selected_employee_ids)
 
-        raw_division_values = self.request.GET.getlist('divisions')
+        raw_division_values = self.params.getlist('divisions')
         selected_division_ids = []
         for value in raw_division_values:
             if value == '__all__':
@@ -362,7 +434,7 @@ class StimulusRequestListView(SortingMixin, LoginRequiredMixin, generic.ListView
         # Обработка фильтра по статусу
         status_choices = list(StimulusRequest.Status.choices)
         valid_status_values = {choice[0] for choice in status_choices}
-        raw_status_values = self.request.GET.getlist('status')
+        raw_status_values = self.params.getlist('status')
         selected_statuses = []
         for value in raw_status_values:
             if value == '__all__':
@@ -379,7 +451,7 @@ class StimulusRequestListView(SortingMixin, LoginRequiredMixin, generic.ListView
 
         responsible_queryset = self.filterset.form.fields['requested_by'].queryset
         self.responsible_options = list(responsible_queryset)
-        raw_responsible_values = self.request.GET.getlist('requested_by')
+        raw_responsible_values = self.params.getlist('requested_by')
         selected_responsible_ids = []
         for value in raw_responsible_values:
             if value == '__all__':
@@ -392,7 +464,7 @@ class StimulusRequestListView(SortingMixin, LoginRequiredMixin, generic.ListView
 
         # Обработка фильтра кампаний
         from one_time_payments.models import RequestCampaign
-        if user.is_staff or user.groups.filter(name='Руководство института').exists():
+        if user.is_staff or is_institute_leadership(user):
             # Администраторы и руководство видят все кампании кроме черновиков
             campaign_queryset = RequestCampaign.objects.exclude(
                 status=RequestCampaign.Status.DRAFT
@@ -407,7 +479,7 @@ class StimulusRequestListView(SortingMixin, LoginRequiredMixin, generic.ListView
         campaign_ids_in_requests = base_for_options.values_list('campaign_id', flat=True).distinct()
         self.campaign_options = list(campaign_queryset.filter(id__in=campaign_ids_in_requests))
         
-        raw_campaign_values = self.request.GET.getlist('campaign')
+        raw_campaign_values = self.params.getlist('campaign')
         selected_campaign_ids = []
         for value in raw_campaign_values:
             if value == '__all__':
@@ -421,55 +493,62 @@ class StimulusRequestListView(SortingMixin, LoginRequiredMixin, generic.ListView
         
         self.selected_campaign_ids = selected_campaign_ids
 
-        self.sort_field, self.sort_direction, ordering = self._get_sorting_params()
+        self.sort_field, self.sort_direction, ordering = resolve_sorting_params(
+            self.params,
+            self.SORTABLE_FIELDS,
+            self.DEFAULT_SORT_FIELD,
+            self.DEFAULT_SORT_DIRECTION,
+        )
         ordered_qs = filtered_qs.order_by(*ordering)
         
         # Добавляем аннотации для определения прав редактирования и удаления
-        if can_view_all_requests(user) and user.is_staff:
+        if user.is_staff:
             # Администраторы имеют полный доступ
             return ordered_qs.annotate(
                 can_edit=Value(True, output_field=BooleanField()),
                 can_delete=Value(True, output_field=BooleanField()),
                 can_change_status=Value(True, output_field=BooleanField()),
             )
-        elif can_view_all_requests(user) and user.groups.filter(name='Руководство института').exists():
-            # Руководство института видит все заявки, но редактировать/удалять может только свои в статусе PENDING
-            return ordered_qs.annotate(
-                can_edit=Case(
-                    When(
-                        requested_by=user,
-                        status=StimulusRequest.Status.PENDING,
-                        then=Value(True)
-                    ),
-                    default=Value(False),
-                    output_field=BooleanField()
-                ),
-                can_delete=Case(
-                    When(
-                        requested_by=user,
-                        status=StimulusRequest.Status.PENDING,
-                        then=Value(True)
-                    ),
-                    default=Value(False),
-                    output_field=BooleanField()
+
+        # Остальные (руководство института, руководители департамента, сотрудники,
+        # пользователи с can_view_all/can_view_own_requests) редактируют и удаляют
+        # только свои заявки в статусе PENDING; статус не меняет никто из них.
+        # Правило вычисляется в SQL, поэтому стоит только запроса страницы.
+        if can_modify_own_pending_requests(user):
+            own_pending = Case(
+                When(
+                    requested_by=user,
+                    status=StimulusRequest.Status.PENDING,
+                    then=Value(True)
                 ),
-                can_change_status=Value(False, output_field=BooleanField()),
+                default=Value(False),
+                output_field=BooleanField()
             )
-
-        # Для остальных пользователей проверяем права для каждой заявки
-        annotated_qs = ordered_qs.annotate(
-            can_edit=Value(False, output_field=BooleanField()),
-            can_delete=Value(False, output_field=BooleanField()),
+        else:
+            own_pending = Value(False, output_field=BooleanField())
+        return ordered_qs.annotate(
+            can_edit=own_pending,
+            can_delete=own_pending,
             can_change_status=Value(False, output_field=BooleanField()),
         )
-        
-        # Обновляем аннотации для каждой заявки
-        for request_obj in annotated_qs:
-            request_obj.can_edit = can_edit_request(user, request_obj)
-            request_obj.can_delete = can_delete_request(user, request_obj)
-            request_obj.can_change_status = can_change_request_status(user, request_obj)
-        
-        return annotated_qs
+
+
+class StimulusRequestListView(KeysetPaginationMixin, SortingMixin, LoginRequiredMixin, generic.ListView):
+    model = StimulusRequest
+    template_name = 'stimuli/request_list.html'
+    context_object_name = 'requests'
+    paginate_by = 25
+
+    SORTABLE_FIELDS = StimulusRequestListQuery.SORTABLE_FIELDS
+    DEFAULT_SORT_FIELD = StimulusRequestListQuery.DEFAULT_SORT_FIELD
+    DEFAULT_SORT_DIRECTION = StimulusRequestListQuery.DEFAULT_SORT_DIRECTION
+
+    def get_queryset(self):
+        self.list_query = StimulusRequestListQuery(self.request.user, self.request.GET)
+        self.filterset = self.list_query.filterset
+        self.sort_field = self.list_query.sort_field
+        self.sort_direction = self.list_query.sort_direction
+        return self.list_query.queryset
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -497,7 +576,10 @@ class StimulusRequestListView(SortingMixin, LoginRequiredMixin, generic.ListView
         context['user_division'] = get_user_division(user)
         context['filter_form'] = self.filterset.form
         export_url = reverse('request-export')
-        query_string = self.request.GET.urlencode()
+        export_params = self.request.GET.copy()
+        for key in CURSOR_PARAMS:
+            export_params.pop(key, None)
+        query_string = export_params.urlencode()
         if query_string:
             export_url = f'{export_url}?{query_string}'
         context['export_url'] = export_url
@@ -509,151 +591,36 @@ class StimulusRequestListView(SortingMixin, LoginRequiredMixin, generic.ListView
             base_columns += 1
         context['table_colspan'] = base_columns
         context['sorting'] = self._build_sorting_context()
-        context['employee_options'] = getattr(self, 'employee_options', [])
-        context['division_options'] = getattr(self, 'division_options', [])
-        context['selected_employee_ids'] = getattr(self, 'selected_employee_ids', [])
-        context['selected_division_ids'] = getattr(self, 'selected_division_ids', [])
-        context['status_options'] = getattr(self, 'status_options', [])
-        context['selected_statuses'] = getattr(self, 'selected_statuses', [])
-        context['responsible_options'] = getattr(self, 'responsible_options', [])
-        context['selected_responsible_ids'] = getattr(self, 'selected_responsible_ids', [])
-        context['campaign_options'] = getattr(self, 'campaign_options', [])
-        context['selected_campaign_ids'] = getattr(self, 'selected_campaign_ids', [])
+        context['employee_options'] = self.list_query.employee_options
+        context['division_options'] = self.list_query.division_options
+        context['selected_employee_ids'] = self.list_query.selected_employee_ids
+        context['selected_division_ids'] = self.list_query.selected_division_ids
+        context['status_options'] = self.list_query.status_options
+        context['selected_statuses'] = self.list_query.selected_statuses
+        context['responsible_options'] = self.list_query.responsible_options
+        context['selected_responsible_ids'] = self.list_query.selected_responsible_ids
+        context['campaign_options'] = self.list_query.campaign_options
+        context['selected_campaign_ids'] = self.list_query.selected_campaign_ids
         return context
 
 
 class StimulusRequestExportView(LoginRequiredMixin, View):
-    """Экспорт заявок на стимулирование в Excel."""
-
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-    header_alignment = Alignment(horizontal="center", vertical="center")
-
-    def get(self, request, *args, **kwargs):
-        list_view = StimulusRequestListView()
-        list_view.setup(request, *args, **kwargs)
-        queryset = list_view.get_queryset()
-        filterset = getattr(list_view, 'filterset', None)
-
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Заявки"
-
-        headers = [
-            "ID",
-            "Создано",
-            "Обновлено",
-            "Сотрудник",
-            "Кампания",
-            "Размер выплаты",
-            "Статус",
-            "Итоговый статус",
-            "Ответственный",
-            "Обоснование",
-            "Комментарий администратора",
-            "В архиве с",
-        ]
-
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = self.header_font
-            cell.fill = self.header_fill
-            cell.alignment = self.header_alignment
-
-        for row_index, request_obj in enumerate(queryset, start=2):
-            created_at = request_obj.created_at.strftime('%d.%m.%Y %H:%M') if request_obj.created_at else ''
-            updated_at = request_obj.updated_at.strftime('%d.%m.%Y %H:%M') if request_obj.updated_at else ''
-            archived_at = request_obj.archived_at.strftime('%d.%m.%Y %H:%M') if request_obj.archived_at else ''
-            responsible = request_obj.requested_by.get_full_name() or request_obj.requested_by.username
-            row = [
-                request_obj.pk,
-                created_at,
-                updated_at,
-                request_obj.employee.full_name,
-                request_obj.campaign.name if request_obj.campaign else '',
-                float(request_obj.amount) if request_obj.amount is not None else None,
-                request_obj.get_status_display(),
-                request_obj.final_status or '',
-                responsible,
-                request_obj.justification,
-                request_obj.admin_comment,
-                archived_at,
-            ]
-            for col_index, value in enumerate(row, 1):
-                ws.cell(row=row_index, column=col_index, value=value)
-
-        self._autosize_columns(ws)
-
-        if filterset is not None and request.GET:
-            filters_sheet = wb.create_sheet("Фильтры")
-            self._write_filters_sheet(filters_sheet, filterset)
-
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-
-        filename = f"stimulus_requests_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        response = HttpResponse(
-            output.getvalue(),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    """Экспорт заявок на стимулирование в Excel, CSV (?format=csv) или NDJSON (?format=ndjson)."""
+
+    @classmethod
+    def build_export(cls, user, params, object_id=None):
+        """Выгрузка по фильтрам и сортировке списка заявок; используется и фоновыми заданиями."""
+        list_query = StimulusRequestListQuery(user, params)
+        return ExportPlan(
+            f"stimulus_requests_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+            REQUEST_EXPORT_COLUMNS,
+            request_export_rows(list_query.queryset),
+            sheet_title="Заявки",
+            filter_rows=(lambda: filterset_rows(list_query.filterset)) if params else None,
         )
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
-
-    def _autosize_columns(self, worksheet):
-        for column in worksheet.columns:
-            max_length = 0
-            column_letter = get_column_letter(column[0].column)
-            for cell in column:
-                if cell.value is None:
-                    continue
-                try:
-                    cell_length = len(str(cell.value))
-                except (TypeError, ValueError):
-                    cell_length = 0
-                if cell_length > max_length:
-                    max_length = cell_length
-            worksheet.column_dimensions[column_letter].width = min(max_length + 2, 60)
-
-    def _write_filters_sheet(self, worksheet, filterset):
-        worksheet.title = "Фильтры"
-        worksheet.cell(row=1, column=1, value="Поле").font = self.header_font
-        worksheet.cell(row=1, column=1).fill = self.header_fill
-        worksheet.cell(row=1, column=1).alignment = self.header_alignment
-        worksheet.cell(row=1, column=2, value="Значение").font = self.header_font
-        worksheet.cell(row=1, column=2).fill = self.header_fill
-        worksheet.cell(row=1, column=2).alignment = self.header_alignment
-
-        form = filterset.form
-        form_is_valid = form.is_valid()
-
-        row_index = 2
-        for field_name, field in form.fields.items():
-            if form_is_valid:
-                value = form.cleaned_data.get(field_name)
-            else:
-                value = form.data.get(field_name)
-
-            if value in (None, '', [], (), {}):
-                continue
-
-            if isinstance(value, QuerySet):
-                value = ', '.join(str(item) for item in value)
-            elif isinstance(value, (list, tuple, set)):
-                value = ', '.join(str(item) for item in value if item not in (None, ''))
-            elif hasattr(value, 'isoformat'):
-                try:
-                    value = value.strftime('%d.%m.%Y')
-                except (TypeError, ValueError):
-                    value = str(value)
-            else:
-                value = str(value)
 
-            worksheet.cell(row=row_index, column=1, value=field.label or field_name)
-            worksheet.cell(row=row_index, column=2, value=value)
-            row_index += 1
-
-        self._autosize_columns(worksheet)
+    def get(self, request, *args, **kwargs):
+        return self.build_export(request.user, request.GET).response(get_export_format(request))
 
 
 class StimulusRequestCreateView(LoginRequiredMixin, PermissionRequiredMixin, generic.CreateView):
@@ -671,7 +638,6 @@ class StimulusRequestCreateView(LoginRequiredMixin, PermissionRequiredMixin, gen
     def form_valid(self, form):
         form.instance.requested_by = self.request.user
         response = super().form_valid(form)
-        recompute_employee_totals(self.object.employee_id)
         messages.success(self.request, 'Заявка создана.')
         return response
 
@@ -690,10 +656,10 @@ class StimulusRequestUpdateView(LoginRequiredMixin, generic.UpdateView):
     def form_valid(self, form):
         instance = self.get_object()
         previous_employee_id = instance.employee_id
-        response = super().form_valid(form)
-        recompute_employee_totals(self.object.employee_id)
-        if previous_employee_id != self.object.employee_id:
-            recompute_employee_totals(previous_employee_id)
+        with transaction.atomic():
+            response = super().form_valid(form)
+            if previous_employee_id != self.object.employee_id:
+                schedule_employee_totals_recompute([previous_employee_id])
         messages.success(self.request, 'Заявка обновлена.')
         return response
 
@@ -753,9 +719,7 @@ class StimulusRequestStatusUpdateView(LoginRequiredMixin, PermissionRequiredMixi
         
         form = StimulusRequestStatusForm(request.POST, instance=instance)
         if form.is_valid():
-            with transaction.atomic():
-                updated_request = form.save()
-                recompute_employee_totals(updated_request.employee_id)
+            form.save()
             messages.success(request, 'Статус заявки обновлён.')
         else:
             messages.error(request, 'Не удалось обновить статус заявки. Проверьте корректность данных.')
@@ -779,9 +743,7 @@ class StimulusRequestDeleteView(LoginRequiredMixin, generic.DeleteView):
 
     def delete(self, request, *args, **kwargs):
         self.object = self.get_object()
-        employee_id = self.object.employee_id
         response = super().delete(request, *args, **kwargs)
-        recompute_employee_totals(employee_id)
         messages.success(request, 'Заявка удалена.')
         return response
 
@@ -842,11 +804,8 @@ class StimulusRequestBulkDeleteView(LoginRequiredMixin, View):
             messages.error(request, 'Нет прав на удаление выбранных заявок.')
             return redirect(self.success_url)
 
-        employees_to_update = list(deletable_qs.values_list('employee_id', flat=True))
-        deleted_count, _ = deletable_qs.delete()
-
-        for employee_id in set(employees_to_update):
-            recompute_employee_totals(employee_id)
+        with transaction.atomic():
+            deleted_count, _ = deletable_qs.delete()
 
         messages.success(request, f'Удалено заявок: {deleted_count}.')
         return redirect(self.success_url)
@@ -935,37 +894,34 @@ class StimulusRequestBulkCreateView(LoginRequiredMixin, PermissionRequiredMixin,
             return self.render_to_response(self._build_context(division_id, employees, request.POST, campaign_id=campaign_id))
 
         created = 0
-        affected_employees = []
-        for employee in employees:
-            amount_raw = request.POST.get(f'amount_{employee.id}', '').strip()
-            justification = request.POST.get(f'justification_{employee.id}', '').strip()
-            if not amount_raw:
-                continue
-            try:
-                amount = Decimal(amount_raw.replace(' ', '').replace(',', '.'))
-            except Exception:
-                messages.error(request, f'Некорректная сумма для {employee.full_name}.')
-                return self.render_to_response(self._build_context(division_id, employees, request.POST, campaign_id=campaign_id))
-
-            if amount <= 0:
-                continue
+        with transaction.atomic():
+            # Пересчёт итогов по сотрудникам выполнится одним пакетом после фиксации транзакции
+            for employee in employees:
+                amount_raw = request.POST.get(f'amount_{employee.id}', '').strip()
+                justification = request.POST.get(f'justification_{employee.id}', '').strip()
+                if not amount_raw:
+                    continue
+                try:
+                    amount = Decimal(amount_raw.replace(' ', '').replace(',', '.'))
+                except Exception:
+                    messages.error(request, f'Некорректная сумма для {employee.full_name}.')
+                    return self.render_to_response(self._build_context(division_id, employees, request.POST, campaign_id=campaign_id))
 
-            if not justification:
-                messages.error(request, f'Обоснование обязательно для {employee.full_name}.')
-                return self.render_to_response(self._build_context(division_id, employees, request.POST, campaign_id=campaign_id))
+                if amount <= 0:
+                    continue
 
-            StimulusRequest.objects.create(
-                employee=employee,
-                requested_by=request.user,
-                amount=amount,
-                justification=justification,
-                campaign=campaign,
-            )
-            created += 1
-            affected_employees.append(employee.id)
+                if not justification:
+                    messages.error(request, f'Обоснование обязательно для {employee.full_name}.')
+                    return self.render_to_response(self._build_context(division_id, employees, request.POST, campaign_id=campaign_id))
 
-        for employee_id in set(affected_employees):
-            recompute_employee_totals(employee_id)
+                StimulusRequest.objects.create(
+                    employee=employee,
+                    requested_by=request.user,
+                    amount=amount,
+                    justification=justification,
+                    campaign=campaign,
+                )
+                created += 1
 
         if created:
             messages.success(request, f'Создано заявок: {created}.')
@@ -1064,152 +1020,20 @@ class EmployeeExcelTemplateView(LoginRequiredMixin, PermissionRequiredMixin, Vie
 
     def get(self, request, *args, **kwargs):
         self.logger.info(f"User {request.user.username} downloading Excel template")
-        # Создаем новую рабочую книгу
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Сотрудники"
-
-        # Получаем все подразделения и должности для справочников
-        divisions = Division.objects.all().order_by('name')
-        positions = Position.objects.all().order_by('name')
-
-        # Создаем заголовки - включаем все доступные столбцы
-        headers = [
-            'ФИО',
-            'Подразделение',
-            'Должность', 
-            'Категория',
-            'Ставка',
-            'Оклад',
-            'Выплаты по ставке',
-            'Совмещения',
-            'Оклад совмещений',
-            'Итого базовых выплат',
-            'Надбавка',
-            'Основание надбавки',
-            'Срок надбавки',
-            'Выплата',
-            'Обоснование',
-            'Итого выплат'
-        ]
+        version = employee_template_version()
+        etag = quote_etag(version)
 
-        # Стили для заголовков
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        header_alignment = Alignment(horizontal="center", vertical="center")
+        # Данные не менялись с прошлой загрузки — браузеру достаточно 304
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            not_modified['ETag'] = etag
+            return not_modified
 
-        # Записываем заголовки
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-
-        # Получаем всех сотрудников с их данными
-        employees = Employee.objects.select_related('division', 'position').order_by('full_name')
-        
-        # Записываем данные сотрудников
-        for row, employee in enumerate(employees, 2):
-            col = 1
-            ws.cell(row=row, column=col, value=employee.full_name)
-            col += 1
-            ws.cell(row=row, column=col, value=employee.division.name if employee.division else '')
-            col += 1
-            ws.cell(row=row, column=col, value=employee.position.name if employee.position else '')
-            col += 1
-            ws.cell(row=row, column=col, value=employee.category)
-            col += 1
-            ws.cell(row=row, column=col, value=float(employee.rate))
-            col += 1
-            ws.cell(row=row, column=col, value=float(employee.position.base_salary) if employee.position else 0.0)
-            col += 1
-            ws.cell(row=row, column=col, value=float(employee.salary_amount))
-            col += 1
-            # Совмещения - текстовое описание
-            assignments_text = ''
-            if employee.assignments.exists():
-                assignments_list = []
-                for assignment in employee.assignments.all():
-                    assignment_desc = f"{assignment.position.name} ({assignment.rate})"
-                    if assignment.allowance_amount:
-                        assignment_desc += f" + надбавка {assignment.allowance_amount}"
-                    assignments_list.append(assignment_desc)
-                assignments_text = '; '.join(assignments_list)
-            ws.cell(row=row, column=col, value=assignments_text)
-            col += 1
-            ws.cell(row=row, column=col, value=float(employee.assignments_salary_amount))
-            col += 1
-            ws.cell(row=row, column=col, value=float(employee.total_salary_amount))
-            col += 1
-            ws.cell(row=row, column=col, value=float(employee.allowance_total))
-            col += 1
-            ws.cell(row=row, column=col, value=employee.allowance_reason)
-            col += 1
-            ws.cell(row=row, column=col, value=employee.allowance_until.strftime('%d.%m.%Y') if employee.allowance_until else '')
-            col += 1
-            ws.cell(row=row, column=col, value=float(employee.payment))
-            col += 1
-            ws.cell(row=row, column=col, value=employee.justification)
-            col += 1
-            ws.cell(row=row, column=col, value=float(employee.total_payments))
-
-        # Создаем лист со справочниками
-        ws_div = wb.create_sheet("Подразделения")
-        ws_div.cell(row=1, column=1, value="Название подразделения").font = header_font
-        ws_div.cell(row=1, column=1).fill = header_fill
-        
-        for row, division in enumerate(divisions, 2):
-            ws_div.cell(row=row, column=1, value=division.name)
-
-        ws_pos = wb.create_sheet("Должности")
-        ws_pos.cell(row=1, column=1, value="Название должности").font = header_font
-        ws_pos.cell(row=1, column=2, value="Оклад").font = header_font
-        ws_pos.cell(row=1, column=1).fill = header_fill
-        ws_pos.cell(row=1, column=2).fill = header_fill
-        
-        for row, position in enumerate(positions, 2):
-            ws_pos.cell(row=row, column=1, value=position.name)
-            ws_pos.cell(row=row, column=2, value=float(position.base_salary))
-
-        # Создаем лист с категориями
-        ws_cat = wb.create_sheet("Категории")
-        ws_cat.cell(row=1, column=1, value="Код").font = header_font
-        ws_cat.cell(row=1, column=2, value="Название").font = header_font
-        ws_cat.cell(row=1, column=1).fill = header_fill
-        ws_cat.cell(row=1, column=2).fill = header_fill
-        
-        categories = Employee.Category.choices
-        for row, (code, name) in enumerate(categories, 2):
-            ws_cat.cell(row=row, column=1, value=str(code))
-            ws_cat.cell(row=row, column=2, value=str(name))
-
-        # Настраиваем ширину колонок
-        for ws_sheet in [ws, ws_div, ws_pos, ws_cat]:
-            for column in ws_sheet.columns:
-                max_length = 0
-                column_letter = get_column_letter(column[0].column)
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except (TypeError, AttributeError):
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                ws_sheet.column_dimensions[column_letter].width = adjusted_width
-
-        # Сохраняем в память
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-
-        # Создаем HTTP ответ
-        response = HttpResponse(
-            output.getvalue(),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+        response = HttpResponse(get_employee_template(version), content_type=XLSX_CONTENT_TYPE)
         filename = f"employees_template_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
         return response
 
 
@@ -1234,181 +1058,153 @@ class EmployeeExcelUploadView(LoginRequiredMixin, PermissionRequiredMixin, View)
         self.logger.info(f"User {request.user.username} uploading Excel file: {excel_file.name}, sync_mode: {sync_mode}")
 
         try:
-            from openpyxl import load_workbook
-            
-            # Загружаем рабочую книгу
-            wb = load_workbook(excel_file)
-            ws = wb.active
-            
-            # Получаем справочники
-            divisions_dict = {d.name: d for d in Division.objects.all()}
-            positions_dict = {p.name: p for p in Position.objects.all()}
-            
-            # Счетчики для автоматически созданных записей
-            auto_created_divisions = 0
-            auto_created_positions = 0
-            
-            # Создаем словарь категорий для обработки как кодов, так и отображаемых названий
-            category_dict = {}
-            for code, display_name in Employee.Category.choices:
-                category_dict[code] = code  # Код категории
-                category_dict[display_name] = code  # Отображаемое название
-            
-            created_count = 0
-            updated_count = 0
-            deleted_count = 0
-            errors = []
-            processed_employee_names = set()  # Для отслеживания обработанных сотрудников
-
-            # Обрабатываем строки начиная со второй (пропускаем заголовки)
-            for row_num in range(2, ws.max_row + 1):
-                try:
-                    # Читаем данные из строки (только основные поля для редактирования)
-                    full_name = ws.cell(row=row_num, column=1).value
-                    if not full_name or not str(full_name).strip():
-                        continue
-                    
-                    division_name = ws.cell(row=row_num, column=2).value
-                    position_name = ws.cell(row=row_num, column=3).value
-                    category_code = ws.cell(row=row_num, column=4).value
-                    rate = ws.cell(row=row_num, column=5).value
-                    # Пропускаем столбцы 6-9 (вычисляемые поля)
-                    allowance_amount = ws.cell(row=row_num, column=11).value
-                    allowance_reason = ws.cell(row=row_num, column=12).value
-                    allowance_until = ws.cell(row=row_num, column=13).value
-                    payment = ws.cell(row=row_num, column=14).value
-                    justification = ws.cell(row=row_num, column=15).value
-
-                    # Валидация и автоматическое создание недостающих записей
-                    if not division_name:
-                        errors.append(f"Строка {row_num}: Не указано подразделение")
-                        continue
-                    
-                    # Автоматически создаем подразделение если его нет
-                    if division_name not in divisions_dict:
-                        division_obj, created = Division.objects.get_or_create(name=division_name)
-                        divisions_dict[division_name] = division_obj
-                        if created:
-                            auto_created_divisions += 1
-                    
-                    if not position_name:
-                        errors.append(f"Строка {row_num}: Не указана должность")
-                        continue
-                    
-                    # Автоматически создаем должность если её нет
-                    if position_name not in positions_dict:
-                        position_obj, created = Position.objects.get_or_create(
-                            name=position_name,
-                            defaults={'base_salary': 0}
-                        )
-                        positions_dict[position_name] = position_obj
-                        if created:
-                            auto_created_positions += 1
-                    
-                    if not category_code or category_code not in category_dict:
-                        errors.append(f"Строка {row_num}: Неверная категория '{category_code}'")
-                        continue
-                    
-                    # Получаем правильный код категории
-                    actual_category_code = category_dict[category_code]
-
-                    # Преобразуем числовые значения
-                    try:
-                        rate = float(rate) if rate is not None else 1.0
-                        allowance_amount = float(allowance_amount) if allowance_amount is not None else 0.0
-                        payment = float(payment) if payment is not None else 0.0
-                    except (ValueError, TypeError) as e:
-                        errors.append(f"Строка {row_num}: Некорректные числовые значения - {str(e)}")
-                        continue
-
-                    # Преобразуем дату
-                    allowance_until_date = None
-                    if allowance_until:
-                        try:
-                            if isinstance(allowance_until, str):
-                                allowance_until_date = datetime.strptime(allowance_until, '%d.%m.%Y').date()
-                            else:
-                                allowance_until_date = allowance_until.date() if hasattr(allowance_until, 'date') else allowance_until
-                        except ValueError:
-                            errors.append(f"Строка {row_num}: Некорректный формат даты")
-                            continue
-
-                    # Проверяем, существует ли сотрудник
-                    employee, created = Employee.objects.get_or_create(
-                        full_name=str(full_name).strip(),
-                        defaults={
-                            'division': divisions_dict[division_name],
-                            'position': positions_dict[position_name],
-                            'category': actual_category_code,
-                            'rate': rate,
-                            'allowance_amount': allowance_amount,
-                            'allowance_reason': str(allowance_reason).strip() if allowance_reason else '',
-                            'allowance_until': allowance_until_date,
-                            'payment': payment,
-                            'justification': str(justification).strip() if justification else '',
-                        }
-                    )
-                    
-                    if created:
-                        created_count += 1
-                    else:
-                        # Обновляем существующего сотрудника
-                        employee.division = divisions_dict[division_name]
-                        employee.position = positions_dict[position_name]
-                        employee.category = actual_category_code
-                        employee.rate = rate
-                        employee.allowance_amount = allowance_amount
-                        employee.allowance_reason = str(allowance_reason).strip() if allowance_reason else ''
-                        employee.allowance_until = allowance_until_date
-                        employee.payment = payment
-                        employee.justification = str(justification).strip() if justification else ''
-                        employee.save()
-                        updated_count += 1
-                    
-                    # Добавляем в список обработанных сотрудников
-                    processed_employee_names.add(str(full_name).strip())
-
-                except (ValueError, TypeError, AttributeError) as e:
-                    errors.append(f"Строка {row_num}: Ошибка обработки - {str(e)}")
-                    continue
-
-            # Если выбран режим полной синхронизации, удаляем сотрудников, которых нет в файле
-            if sync_mode == 'full_sync':
-                all_employees = Employee.objects.all()
-                for employee in all_employees:
-                    if employee.full_name not in processed_employee_names:
-                        employee.delete()
-                        deleted_count += 1
-
-            # Формируем сообщения для пользователя
-            if auto_created_divisions > 0:
-                messages.info(request, f'Автоматически создано подразделений: {auto_created_divisions}')
-            if auto_created_positions > 0:
-                messages.info(request, f'Автоматически создано должностей: {auto_created_positions}')
-            if created_count > 0:
-                messages.success(request, f'Создано новых сотрудников: {created_count}')
-            if updated_count > 0:
-                messages.success(request, f'Обновлено сотрудников: {updated_count}')
-            if deleted_count > 0:
-                messages.success(request, f'Удалено сотрудников: {deleted_count}')
-            
-            self.logger.info(f"Excel processing completed: created={created_count}, updated={updated_count}, deleted={deleted_count}, errors={len(errors)}")
-            
-            if errors:
-                error_message = 'Ошибки при обработке файла:\n' + '\n'.join(errors[:10])
-                if len(errors) > 10:
-                    error_message += f'\n... и еще {len(errors) - 10} ошибок'
-                messages.error(request, error_message)
-            
-            if created_count == 0 and updated_count == 0 and deleted_count == 0 and not errors:
-                messages.info(request, 'Не найдено данных для обработки.')
-
+            employee_import = stage_employee_import(
+                read_workbook_rows(excel_file),
+                user=request.user,
+                filename=excel_file.name,
+                full_sync=sync_mode == 'full_sync',
+            )
         except (ValueError, TypeError, AttributeError, IOError) as e:
             messages.error(request, f'Ошибка при обработке файла: {str(e)}')
+            return self.render_to_response({'form': form})
 
-        return self.render_to_response({'form': form})
+        self.logger.info(
+            f"Excel staged as import #{employee_import.pk}: create={employee_import.created_count}, "
+            f"update={employee_import.updated_count}, unchanged={employee_import.unchanged_count}, "
+            f"delete={employee_import.deleted_count}, errors={len(employee_import.errors)}"
+        )
+        return redirect('employee-import-preview', pk=employee_import.pk)
 
     def render_to_response(self, context):
         from django.shortcuts import render
         return render(self.request, self.template_name, context)
 
+
+class EmployeeImportPreviewView(LoginRequiredMixin, PermissionRequiredMixin, View):
+    """Предпросмотр загрузки сотрудников: что будет создано, изменено и удалено; применение или отмена"""
+    permission_required = 'stimuli.add_employee'
+    template_name = 'stimuli/employee_import_preview.html'
+    logger = logging.getLogger('stimuli')
+
+    def get_object(self):
+        return get_object_or_404(EmployeeImport, pk=self.kwargs['pk'], uploaded_by=self.request.user)
+
+    def get(self, request, *args, **kwargs):
+        employee_import = self.get_object()
+        context = {
+            'employee_import': employee_import,
+            'preview_limit': PREVIEW_ROW_LIMIT,
+        }
+        if employee_import.status == EmployeeImport.Status.STAGED:
+            new_divisions, new_positions = missing_reference_names(employee_import)
+            rows = employee_import.rows.all()
+            context.update({
+                'field_change_counts': field_change_counts(employee_import),
+                'changed_rows': changed_rows(employee_import),
+                'created_rows': rows.filter(action=StagedEmployeeRow.Action.CREATE)[:PREVIEW_ROW_LIMIT],
+                'conflict_rows': rows.filter(action=StagedEmployeeRow.Action.CONFLICT)[:PREVIEW_ROW_LIMIT],
+                'deleted_employees': employees_to_delete(employee_import).select_related('division', 'position')[:PREVIEW_ROW_LIMIT],
+                'new_divisions': new_divisions,
+                'new_positions': new_positions,
+            })
+        return render(request, self.template_name, context)
+
+    def post(self, request, *args, **kwargs):
+        employee_import = self.get_object()
+        if request.POST.get('action') == 'discard':
+            if discard_employee_import(employee_import):
+                messages.info(request, 'Загрузка отменена, данные сотрудников не изменены.')
+            return redirect('employee-excel-upload')
+
+        try:
+            apply_employee_import(employee_import)
+        except EmployeeImportError as e:
+            messages.error(request, str(e))
+            return redirect('employee-import-preview', pk=employee_import.pk)
+
+        # Формируем сообщения для пользователя
+        if employee_import.auto_created_divisions > 0:
+            messages.info(request, f'Автоматически создано подразделений: {employee_import.auto_created_divisions}')
+        if employee_import.auto_created_positions > 0:
+            messages.info(request, f'Автоматически создано должностей: {employee_import.auto_created_positions}')
+        if employee_import.created_count > 0:
+            messages.success(request, f'Создано новых сотрудников: {employee_import.created_count}')
+        if employee_import.updated_count > 0:
+            messages.success(request, f'Обновлено сотрудников: {employee_import.updated_count}')
+        if employee_import.deleted_count > 0:
+            messages.success(request, f'Удалено сотрудников: {employee_import.deleted_count}')
+        if not employee_import.has_changes:
+            messages.info(request, 'Изменений нет, данные сотрудников не изменены.')
+
+        self.logger.info(
+            f"Employee import #{employee_import.pk} applied by {request.user.username}: "
+            f"created={employee_import.created_count}, updated={employee_import.updated_count}, "
+            f"deleted={employee_import.deleted_count}"
+        )
+        return redirect('employee-list')
+
+
+def _export_job_payload(job):
+    is_done = job.status == ExportJob.Status.DONE
+    return {
+        'id': job.pk,
+        'kind': job.kind,
+        'format': job.export_format,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'progress': job.progress,
+        'total': job.total,
+        'percent': job.percent,
+        'error': job.error or None,
+        'status_url': reverse('export-job-status', args=[job.pk]),
+        'download_url': reverse('export-job-download', args=[job.pk]) if is_done else None,
+        'expires_at': job.expires_at.isoformat() if job.expires_at else None,
+    }
+
+
+class ExportJobCreateView(LoginRequiredMixin, View):
+    """Ставит выгрузку в очередь (или находит готовую с теми же фильтрами) и возвращает её состояние в JSON."""
+
+    def post(self, request, *args, **kwargs):
+        object_id = request.POST.get('object_id')
+        try:
+            object_id = int(object_id) if object_id else None
+        except (TypeError, ValueError):
+            object_id = None
+
+        try:
+            job, created = submit_export_job(
+                request.user,
+                request.POST.get('kind', ''),
+                export_format=(request.POST.get('format') or EXPORT_FORMAT_XLSX).lower(),
+                object_id=object_id,
+                query_string=request.POST.get('query', ''),
+            )
+        except ExportJobError as exc:
+            return JsonResponse({'error': str(exc)}, status=400)
+        except PermissionDenied as exc:
+            return JsonResponse({'error': str(exc)}, status=403)
+        return JsonResponse(_export_job_payload(job), status=202 if created else 200)
+
+
+class ExportJobStatusView(LoginRequiredMixin, View):
+    """Прогресс фоновой выгрузки."""
+
+    def get(self, request, pk, *args, **kwargs):
+        job = get_object_or_404(ExportJob, pk=pk, requested_by=request.user)
+        return JsonResponse(_export_job_payload(job))
+
+
+class ExportJobDownloadView(LoginRequiredMixin, View):
+    """Скачивание готового файла фоновой выгрузки."""
+
+    def get(self, request, pk, *args, **kwargs):
+        job = get_object_or_404(
+            ExportJob.objects.reusable(),
+            pk=pk,
+            requested_by=request.user,
+            status=ExportJob.Status.DONE,
+        )
+        if not job.file:
+            raise Http404('Файл выгрузки не найден')
+        return FileResponse(job.file.open('rb'), as_attachment=True, filename=job.filename)